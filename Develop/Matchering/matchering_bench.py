@@ -0,0 +1,573 @@
+# @noindex
+# MATCHERING WORKER BENCHMARK (runs outside REAPER, in any Python 3)
+# DESCRIPTION: Headless benchmark and regression harness for matchering_worker.py.
+# The worker's RPR_* functions are replaced by a recording fake REAPER, main_worker()
+# and its RPR_defer() poll loops are driven at REAPER's defer rate, and every job is
+# run by a stand-in for mg_cli.py / matchering_engine.py (this script, started by the
+# worker): it prints progress, waits a simulated processing time and copies the target
+# to the result. Only the worker's own costs are measured, not Matchering's DSP.
+#
+# Usage:
+#   python matchering_bench.py [--lengths 2,10,60] [--channels 1,2] [--formats wav,flac]
+#                              [--scenarios single,pool,cached] [--parallel 4]
+#                              [--cli {engine,mg_cli}] [--output FILE]
+#                              [--baseline FILE] [--max-regression 0.25]
+#   Writes the results to FILE (JSON, default matchering_bench.json) and, with --baseline,
+#   exits with code 1 when a metric regressed by more than --max-regression.
+#
+# Comparison of two result files:
+#   python matchering_bench.py compare baseline.json current.json [--max-regression 0.25]
+#
+# Scenarios: "single" runs the jobs one after another (main_worker + poll_process),
+# "pool" runs the whole list in Pool mode (poll_pool), "cached" re-runs the pool on a
+# project whose masters already exist (manifest hits, import only).
+#
+# FLAC fixtures need soundfile (and numpy); peak RSS needs psutil or Linux /proc.
+
+import time
+_PROCESS_START = time.time() # Stand-in: the interpreter is up (spawn latency ends here)
+
+import argparse
+import array
+import datetime
+import importlib
+import json
+import math
+import os
+import platform
+import random
+import re
+import shutil
+import sys
+import tempfile
+import threading
+import wave
+
+try:
+    import numpy as np
+    import soundfile as sf
+except ImportError:
+    np = None
+    sf = None
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# --- CONFIGURATION ---
+BENCH_FORMAT_VERSION = 1
+BENCH_ENV = "MATCHERING_BENCH" # Set for the stand-in processes: JSON {"style", "log_dir", "work_base", "work_ratio"}
+DEFAULT_OUTPUT = "matchering_bench.json"
+FIXTURE_RATE = 44100
+REFERENCE_SECONDS = 10
+DEFER_INTERVAL = 1 / 30 # REAPER runs deferred scripts about 30 times per second
+RSS_SAMPLE_INTERVAL = 0.05
+SCENARIO_TIMEOUT = 600 # Seconds before a scenario is cancelled through the GUI's Cancel command
+REGRESSION_METRICS = { # Metric: (better, absolute slack below which a difference is noise)
+    "jobs_per_minute": ("higher", 1.0),
+    "spawn_latency_ms.mean": ("lower", 5.0),
+    "job_overhead_ms.mean": ("lower", 10.0),
+    "job_overhead_ms.p95": ("lower", 20.0),
+    "main_thread_ms_per_job": ("lower", 1.0),
+    "max_tick_ms": ("lower", 5.0),
+    "extstate_writes_per_job": ("lower", 0.5),
+    "peak_rss_mb": ("lower", 5.0),
+}
+STAND_IN_STAGES = [ # (@progress stage, label, percent, Matchering message) printed by the stand-in
+    ("decode", "Decoding", 0, "Loading and analysis"),
+    ("analysis", "Analysis", 10, "Loading and analysis"),
+    ("matching", "Matching", 30, "Matching levels"),
+    ("matching", "Matching", 55, "Correcting levels"),
+    ("write", "Writing", 75, "Final processing and saving"),
+    ("write", "Writing", 100, "Exporting various audio formats"),
+]
+
+
+def log(msg):
+    print(msg, flush=True)
+
+
+# --- STAND-IN FOR mg_cli.py / matchering_engine.py ---
+
+def audio_duration(path):
+    """Duration of a fixture in seconds (WAV through the wave module, other formats through soundfile)."""
+    if path.lower().endswith(".wav"):
+        with wave.open(path, "rb") as f:
+            return f.getnframes() / f.getframerate()
+    if sf is not None:
+        return sf.info(path).duration
+    return os.path.getsize(path) / (FIXTURE_RATE * 4)
+
+def stand_in_main(argv, settings):
+    """Behaves like the engine (or mg_cli.py) from the worker's point of view."""
+    parser = argparse.ArgumentParser(description="Stand-in for matchering_engine.py / mg_cli.py")
+    parser.add_argument("target", type=str)
+    parser.add_argument("reference", type=str)
+    parser.add_argument("result", type=str)
+    parser.add_argument("-b", "--bit", type=int, choices=[16, 24, 32], default=16)
+    parser.add_argument("--no_limiter", dest="no_limiter", action="store_true")
+    parser.add_argument("--dont_normalize", dest="dont_normalize", action="store_true")
+    parser.add_argument("--cache-dir", dest="cache_dir", type=str, default="")
+    parser.add_argument("--no-cache", dest="no_cache", action="store_true")
+    parser.add_argument("--stream", choices=["auto", "on", "off"], default="auto")
+    parser.add_argument("--target-range", dest="target_range", type=str, default=None)
+    parser.add_argument("--reference-range", dest="reference_range", type=str, default=None)
+    parser.add_argument("--variant", dest="variants", nargs=2, action="append", default=[])
+    args = parser.parse_args(argv)
+
+    try:
+        work = settings["work_base"] + settings["work_ratio"] * audio_duration(args.target)
+    except Exception as e:
+        log(f"Error: {type(e).__name__}: {e}")
+        return 1
+    for stage, label, percent, message in STAND_IN_STAGES:
+        if settings["style"] == "engine":
+            log("@progress " + json.dumps({"stage": stage, "label": label, "percent": percent}))
+        else:
+            log(f"{message}...")
+        time.sleep(work / len(STAND_IN_STAGES))
+    for result_path in [args.result] + [result_path for _, result_path in args.variants]:
+        shutil.copyfile(args.target, result_path)
+
+    record = {"pid": os.getpid(), "result": os.path.abspath(args.result), "start": _PROCESS_START, "end": time.time()}
+    with open(os.path.join(settings["log_dir"], f"{os.getpid()}.json"), "w", encoding="utf-8") as f:
+        json.dump(record, f)
+    log("Done.")
+    return 0
+
+
+# --- FIXTURES ---
+
+def fixture_second(channels, seed):
+    """One second of 16-bit interleaved audio (sine + noise), different for every seed."""
+    rng = random.Random(seed)
+    frequency = 110.0 + 10.0 * seed
+    samples = array.array("h", (
+        int(8000 * math.sin(2 * math.pi * frequency * i / FIXTURE_RATE)) + rng.randint(-2000, 2000)
+        for i in range(FIXTURE_RATE) for _ in range(channels)
+    ))
+    if sys.byteorder == "big":
+        samples.byteswap() # WAV and soundfile's raw buffer are little-endian
+    return samples
+
+def write_fixture(path, seconds, channels, seed):
+    """Writes a 44.1 kHz 16-bit WAV or FLAC file, one second at a time (bounded memory)."""
+    second = fixture_second(channels, seed).tobytes()
+    whole, partial = int(seconds), int((seconds - int(seconds)) * FIXTURE_RATE) * channels * 2
+    blocks = [second] * whole + ([second[:partial]] if partial else [])
+    if path.lower().endswith(".wav"):
+        with wave.open(path, "wb") as f:
+            f.setnchannels(channels)
+            f.setsampwidth(2)
+            f.setframerate(FIXTURE_RATE)
+            for block in blocks:
+                f.writeframes(block)
+        return
+    with sf.SoundFile(path, "w", FIXTURE_RATE, channels, "PCM_16") as f:
+        for block in blocks:
+            f.write(np.frombuffer(block, dtype="<i2").reshape(-1, channels))
+
+def make_fixtures(folder, lengths, channel_counts, formats):
+    """Creates the reference and one target per (length, channels, format). Returns (reference, targets, skipped)."""
+    reference = os.path.join(folder, "reference.wav")
+    write_fixture(reference, REFERENCE_SECONDS, 2, 0)
+    targets, skipped = [], []
+    for extension in formats:
+        if extension != "wav" and sf is None:
+            skipped.append(f"{extension}: soundfile is not installed")
+            continue
+        for seconds in lengths:
+            for channels in channel_counts:
+                path = os.path.join(folder, f"target_{seconds:g}s_{channels}ch.{extension}")
+                write_fixture(path, seconds, channels, len(targets) + 1)
+                targets.append({"path": path, "seconds": seconds, "channels": channels, "format": extension})
+    return reference, targets, skipped
+
+
+# --- FAKE REAPER ---
+
+def process_rss(pid):
+    """Resident memory of a process in bytes, or None (no psutil and no /proc, or process gone)."""
+    if psutil is not None:
+        try:
+            return psutil.Process(pid).memory_info().rss
+        except psutil.Error:
+            return None
+    try:
+        with open(f"/proc/{pid}/status", "r") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError):
+        pass
+    return None
+
+class FakeReaper:
+    """Recording replacement for the worker's RPR_* functions.
+
+    ExtState lives in a dict, RPR_defer() queues the calls for run_deferred(), every
+    call is counted, and the time at which each result file is imported is recorded.
+    """
+
+    def __init__(self, project_dir):
+        self.project_dir = project_dir
+        self.ext = {}
+        self.calls = {}
+        self.deferred = []
+        self.imports = {} # Result path: time.time() of its import
+        self.launches = {} # PID: time.time() before the worker's Popen
+        self.ticks = [] # Seconds spent in each main_worker() / deferred call
+        self.tracks = 0
+
+    def install(self, worker):
+        overrides = {
+            "RPR_GetExtState": lambda section, key: self.ext.get(key, ""),
+            "RPR_SetExtState": lambda section, key, value, persist: self.ext.__setitem__(key, value),
+            "RPR_GetProjectPath": lambda buf, buf_sz: (self.project_dir, buf_sz),
+            "RPR_defer": self.deferred.append,
+            "RPR_InsertMedia": lambda path, mode: self._imported(path, 1),
+            "RPR_PCM_Source_CreateFromFile": lambda path: self._imported(path, "(PCM_source*)0x1"),
+            "RPR_CountTracks": lambda proj: self.tracks,
+            "RPR_InsertTrackAtIndex": lambda idx, want_defaults: setattr(self, "tracks", self.tracks + 1),
+            "RPR_GetTrack": lambda proj, idx: "(MediaTrack*)0x2",
+            "RPR_AddMediaItemToTrack": lambda track: "(MediaItem*)0x3",
+            "RPR_AddTakeToMediaItem": lambda item: "(MediaItem_Take*)0x4",
+            "RPR_SetMediaItemTake_Source": lambda take, source: True,
+            "RPR_GetMediaSourceLength": lambda source, length_is_qn: (10.0, source, False),
+        }
+        for name in [name for name in dir(worker) if name.startswith("RPR_")]:
+            setattr(worker, name, self._recorder(name, overrides.get(name, getattr(worker, name))))
+
+        original_launch = worker.launch_process
+        def launch_process(command_list, capture_output=False):
+            launched = time.time()
+            process = original_launch(command_list, capture_output)
+            self.launches[process.pid] = launched
+            return process
+        worker.launch_process = launch_process
+
+    def _recorder(self, name, function):
+        def call(*args):
+            self.calls[name] = self.calls.get(name, 0) + 1
+            return function(*args)
+        return call
+
+    def _imported(self, path, value):
+        self.imports[os.path.abspath(path)] = time.time()
+        return value
+
+    def run(self, worker, code):
+        """Runs one piece of worker code on the "main thread" and records how long it took."""
+        start = time.perf_counter()
+        eval(code, vars(worker))
+        self.ticks.append(time.perf_counter() - start)
+
+    def run_deferred(self, worker, deadline):
+        """Runs the RPR_defer() queue at REAPER's rate until it is empty (Cancel after the deadline)."""
+        timed_out = False
+        while self.deferred:
+            if not timed_out and time.time() > deadline:
+                timed_out = True
+                self.ext["Command"] = "Cancel"
+            time.sleep(DEFER_INTERVAL)
+            pending, self.deferred[:] = list(self.deferred), []
+            for code in pending:
+                self.run(worker, code)
+        return timed_out
+
+class RssSampler:
+    """Samples the resident memory of this process (the worker) and of the running jobs."""
+
+    def __init__(self, fake):
+        self.fake = fake
+        self.peak_self = None
+        self.peak_jobs = None
+        self.baseline = process_rss(os.getpid())
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while True:
+            own = process_rss(os.getpid())
+            if own is not None:
+                self.peak_self = max(self.peak_self or 0, own)
+            jobs = [process_rss(pid) for pid in list(self.fake.launches)]
+            jobs = [rss for rss in jobs if rss is not None]
+            if jobs:
+                self.peak_jobs = max(self.peak_jobs or 0, sum(jobs))
+            if self._stop.wait(RSS_SAMPLE_INTERVAL):
+                return
+
+
+# --- SCENARIOS ---
+
+def load_worker(fake, cli):
+    """(Re)imports matchering_worker.py with fresh globals, the fake REAPER and the stand-in."""
+    if SCRIPT_DIR not in sys.path:
+        sys.path.insert(0, SCRIPT_DIR)
+    worker = importlib.reload(sys.modules["matchering_worker"]) if "matchering_worker" in sys.modules \
+        else importlib.import_module("matchering_worker")
+    worker.PATH_TO_VENV_PYTHON = sys.executable
+    worker.PATH_TO_MG_ENGINE = os.path.abspath(__file__)
+    worker.PATH_TO_MG_CLI = os.path.abspath(__file__)
+    worker.USE_MG_ENGINE = cli == "engine"
+    worker.USE_MG_DAEMON = False # The stand-in replaces the engine's command line only
+    fake.install(worker)
+    return worker
+
+def summarize(seconds):
+    """{"mean", "p95", "max", "count"} of a list of durations, in milliseconds (None if empty)."""
+    if not seconds:
+        return None
+    values = sorted(value * 1000 for value in seconds)
+    return {
+        "mean": round(sum(values) / len(values), 2),
+        "p95": round(values[min(len(values) - 1, int(math.ceil(0.95 * len(values))) - 1)], 2),
+        "max": round(values[-1], 2),
+        "count": len(values),
+    }
+
+def read_stand_in_records(log_dir):
+    records = []
+    for name in os.listdir(log_dir):
+        with open(os.path.join(log_dir, name), "r", encoding="utf-8") as f:
+            records.append(json.load(f))
+    return records
+
+def job_lines(reference, targets):
+    """The "Jobs" ExtState of the Lua GUI: target, reference and reference name per line."""
+    return "\n".join(f"{target['path']}\t{reference}\tref" for target in targets)
+
+def run_scenario(name, reference, targets, args, log_dir):
+    """Runs one scenario in a fresh project folder and returns its metrics."""
+    project_dir = tempfile.mkdtemp(prefix=f"bench_{name}_")
+    try:
+        fake = FakeReaper(project_dir)
+        pool_ext = {"Mode": "Pool", "BitDepth": "-b24", "MaxJobs": str(args.parallel), "Command": "",
+                    "Jobs": job_lines(reference, targets)}
+        if name == "cached": # Warm-up run (not measured): every master is in the manifest afterwards
+            worker = load_worker(fake, args.cli)
+            fake.ext.update(pool_ext)
+            fake.run(worker, "main_worker()")
+            fake.run_deferred(worker, time.time() + SCENARIO_TIMEOUT)
+            fake = FakeReaper(project_dir)
+        for record in os.listdir(log_dir):
+            os.remove(os.path.join(log_dir, record))
+
+        worker = load_worker(fake, args.cli)
+        deadline = time.time() + SCENARIO_TIMEOUT
+        timed_out = False
+        with RssSampler(fake) as rss:
+            start = time.time()
+            if name == "single":
+                for target in targets:
+                    fake.ext.update({"Mode": "", "Target": target["path"], "Reference": reference,
+                                     "ReferenceName": "ref", "BitDepth": "-b24", "Command": ""})
+                    fake.run(worker, "main_worker()")
+                    timed_out = fake.run_deferred(worker, deadline) or timed_out
+            else:
+                fake.ext.update(pool_ext)
+                fake.run(worker, "main_worker()")
+                timed_out = fake.run_deferred(worker, deadline)
+            wall = time.time() - start
+
+        records = read_stand_in_records(log_dir)
+        spawn, overhead, exit_to_import = [], [], []
+        for record in records:
+            launched = fake.launches.get(record["pid"])
+            imported = fake.imports.get(record["result"])
+            if launched is None:
+                continue
+            spawn.append(record["start"] - launched)
+            if imported is not None:
+                overhead.append((imported - launched) - (record["end"] - record["start"]))
+                exit_to_import.append(imported - record["end"])
+
+        jobs = len(targets)
+        completed = len(fake.imports)
+        failed = sum(1 for key, value in fake.ext.items() if re.match(r"Status(_\d+)?$", key) and value.startswith("Error"))
+        writes = fake.calls.get("RPR_SetExtState", 0)
+        return {
+            "jobs": jobs,
+            "completed": completed,
+            "failed": failed,
+            "timed_out": timed_out,
+            "wall_seconds": round(wall, 3),
+            "jobs_per_minute": round(completed / wall * 60, 2) if wall > 0 else None,
+            "spawn_latency_ms": summarize(spawn),
+            "job_overhead_ms": summarize(overhead),
+            "exit_to_import_ms": summarize(exit_to_import),
+            "main_thread_ms_per_job": round(sum(fake.ticks) * 1000 / max(1, jobs), 3),
+            "max_tick_ms": round(max(fake.ticks) * 1000, 3) if fake.ticks else None,
+            "ticks": len(fake.ticks),
+            "extstate_writes_per_job": round(writes / max(1, jobs), 2),
+            "peak_rss_mb": round(rss.peak_self / 2**20, 1) if rss.peak_self else None,
+            "rss_growth_mb": round((rss.peak_self - rss.baseline) / 2**20, 1) if rss.peak_self and rss.baseline else None,
+            "peak_jobs_rss_mb": round(rss.peak_jobs / 2**20, 1) if rss.peak_jobs else None,
+            "api_calls": dict(sorted(fake.calls.items())),
+        }
+    finally:
+        shutil.rmtree(project_dir, ignore_errors=True)
+
+
+# --- REGRESSION CHECK ---
+
+def metric_value(scenario, path):
+    value = scenario
+    for part in path.split("."):
+        if not isinstance(value, dict):
+            return None
+        value = value.get(part)
+    return value
+
+def compare_results(baseline, current, max_regression):
+    """Returns the list of regressions (text) of `current` against `baseline`."""
+    regressions = []
+    for name, scenario in current.get("scenarios", {}).items():
+        base_scenario = baseline.get("scenarios", {}).get(name)
+        if not base_scenario:
+            continue
+        for path, (better, slack) in REGRESSION_METRICS.items():
+            old, new = metric_value(base_scenario, path), metric_value(scenario, path)
+            if old is None or new is None:
+                continue
+            worse = (old - new) if better == "higher" else (new - old)
+            if worse > max(abs(old) * max_regression, slack):
+                regressions.append(f"{name}: {path} {old} -> {new}")
+    return regressions
+
+def report_regressions(baseline_path, current, max_regression):
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    regressions = compare_results(baseline, current, max_regression)
+    for regression in regressions:
+        log(f"Regression: {regression}")
+    if regressions:
+        log(f"Error: {len(regressions)} metric(s) regressed by more than {max_regression:.0%} against {baseline_path}.")
+        return 1
+    log(f"No regression against {baseline_path} (threshold {max_regression:.0%}).")
+    return 0
+
+def compare_main(argv):
+    parser = argparse.ArgumentParser(description="Compare two matchering_bench.py result files")
+    parser.add_argument("baseline", type=str)
+    parser.add_argument("current", type=str)
+    parser.add_argument("--max-regression", dest="max_regression", type=float, default=0.25,
+                        help="Allowed relative regression of a metric (0.25 = 25%%)")
+    args = parser.parse_args(argv)
+    with open(args.current, "r", encoding="utf-8") as f:
+        current = json.load(f)
+    return report_regressions(args.baseline, current, args.max_regression)
+
+
+# --- COMMAND LINE ---
+
+def parse_list(text, convert=str):
+    return [convert(value) for value in text.split(",") if value.strip()]
+
+def worker_version():
+    with open(os.path.join(SCRIPT_DIR, "matchering_worker.py"), "r", encoding="utf-8") as f:
+        match = re.search(r"^# @version\s+(\S+)", f.read(), re.MULTILINE)
+    return match.group(1) if match else "unknown"
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Headless benchmark of matchering_worker.py")
+    parser.add_argument("--lengths", type=lambda text: parse_list(text, float), default=[2, 10, 60],
+                        help="Target lengths in seconds (comma separated)")
+    parser.add_argument("--channels", type=lambda text: parse_list(text, int), default=[1, 2],
+                        help="Target channel counts (comma separated)")
+    parser.add_argument("--formats", type=parse_list, default=["wav", "flac"],
+                        help="Target formats (comma separated: wav, flac)")
+    parser.add_argument("--scenarios", type=parse_list, default=["single", "pool", "cached"],
+                        help="Scenarios to run (comma separated: single, pool, cached)")
+    parser.add_argument("--parallel", type=int, default=4, help="MaxJobs of the pool scenarios")
+    parser.add_argument("--cli", choices=["engine", "mg_cli"], default="engine",
+                        help="Command line the worker builds (engine: @progress lines, mg_cli: Matchering messages)")
+    parser.add_argument("--work-base", dest="work_base", type=float, default=0.2,
+                        help="Simulated processing time of every job (seconds)")
+    parser.add_argument("--work-ratio", dest="work_ratio", type=float, default=0.02,
+                        help="Simulated processing time per second of target audio")
+    parser.add_argument("--output", type=str, default=DEFAULT_OUTPUT, help="Result file (JSON)")
+    parser.add_argument("--baseline", type=str, default=None, help="Result file to compare against")
+    parser.add_argument("--max-regression", dest="max_regression", type=float, default=0.25,
+                        help="Allowed relative regression of a metric (0.25 = 25%%)")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if os.environ.get(BENCH_ENV):
+        return stand_in_main(argv, json.loads(os.environ[BENCH_ENV]))
+    if argv and argv[0] == "compare":
+        return compare_main(argv[1:])
+
+    args = parse_args(argv)
+    unknown = [name for name in args.scenarios if name not in ("single", "pool", "cached")]
+    if unknown:
+        log(f"Error: unknown scenario(s): {', '.join(unknown)}")
+        return 2
+
+    with tempfile.TemporaryDirectory(prefix="matchering_bench_") as folder:
+        fixtures_dir = os.path.join(folder, "fixtures")
+        log_dir = os.path.join(folder, "stand_in")
+        os.makedirs(fixtures_dir)
+        os.makedirs(log_dir)
+        reference, targets, skipped = make_fixtures(fixtures_dir, args.lengths, args.channels, args.formats)
+        for reason in skipped:
+            log(f"Warning: fixtures skipped ({reason}).")
+        if not targets:
+            log("Error: no target fixture could be created.")
+            return 2
+        os.environ[BENCH_ENV] = json.dumps({
+            "style": args.cli, "log_dir": log_dir, "work_base": args.work_base, "work_ratio": args.work_ratio,
+        })
+
+        scenarios = {}
+        try:
+            for name in args.scenarios:
+                log(f"Running scenario '{name}' ({len(targets)} job(s))...")
+                scenarios[name] = run_scenario(name, reference, targets, args, log_dir)
+                metrics = scenarios[name]
+                spawn = (metrics["spawn_latency_ms"] or {}).get("mean")
+                overhead = (metrics["job_overhead_ms"] or {}).get("mean")
+                log(f"  {metrics['completed']}/{metrics['jobs']} imported in {metrics['wall_seconds']:.2f} s "
+                    f"({metrics['jobs_per_minute']} jobs/min), spawn {spawn} ms, overhead {overhead} ms, "
+                    f"main thread {metrics['main_thread_ms_per_job']} ms/job, peak RSS {metrics['peak_rss_mb']} MB")
+        finally:
+            del os.environ[BENCH_ENV]
+
+    results = {
+        "benchmark": "matchering_worker",
+        "format": BENCH_FORMAT_VERSION,
+        "worker_version": worker_version(),
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "settings": {
+            "cli": args.cli, "parallel": args.parallel, "work_base": args.work_base, "work_ratio": args.work_ratio,
+            "defer_interval": DEFER_INTERVAL,
+        },
+        "fixtures": [{k: v for k, v in target.items() if k != "path"} for target in targets],
+        "skipped_fixtures": skipped,
+        "scenarios": scenarios,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=1)
+    log(f"Results written to {args.output}.")
+
+    if args.baseline:
+        return report_regressions(args.baseline, results, args.max_regression)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
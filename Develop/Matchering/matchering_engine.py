@@ -0,0 +1,971 @@
+# @noindex
+# MATCHERING ENGINE (runs in the Matchering venv, NOT inside REAPER)
+# DESCRIPTION: Drop-in replacement for `mg_cli.py`, CALLED BY matchering_worker.py.
+# It runs the Matchering 2.0 pipeline through the library API and keeps a persistent
+# analysis cache, so a file that was already analyzed (the shared Reference of a
+# Multi-Target batch, the shared Target of a Multi-Reference batch) is not decoded
+# and analyzed again.
+#
+# Usage (same arguments as mg_cli.py):
+#   python matchering_engine.py [-b {16,24,32}] [--no_limiter] [--dont_normalize]
+#                               [--cache-dir DIR] [--no-cache] target reference result
+#   Extra: --target-range / --reference-range OFFSET:LENGTH:PLAYRATE (REAPER item values)
+#   decode only the part of the source used by the item.
+#   Extra: --stream {auto,on,off} processes long files with bounded memory (matchering_stream.py).
+#   Extra: --variant BIT[:nolimiter][:nonormalize] RESULT (repeatable) renders more outputs from
+#   the same analysis and matching, e.g. --variant 16 master_16.wav --variant 24:nolimiter raw.wav
+#
+# Check of the streaming mode against the in-memory path (short files, within STREAM_TOLERANCE):
+#   python matchering_engine.py verify-stream target reference
+#
+# Daemon mode (started once by the worker, fed with jobs over a local TCP socket):
+#   python matchering_engine.py serve [--workers N] [--idle-timeout S] [--cache-dir DIR]
+#
+# Progress: the command line prints `@progress {"stage": ..., "percent": ...}` lines, the
+# daemon sends {"event": "progress", ...} lines before the final "done" line of a job.
+
+import time
+_PROCESS_START = time.perf_counter() # Interpreter is up: everything below is import cost
+
+import argparse
+import hashlib
+import json
+import multiprocessing
+import os
+import secrets
+import socketserver
+import sys
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import numpy as np
+import soundfile as sf
+from scipy import signal
+
+import matchering as mg
+from matchering import Config, Result
+from matchering import stages as mg_stages
+from matchering.checker import check_equality
+from matchering.dsp import channel_count, size, lr_to_ms
+from matchering.log import Code, ModuleError
+from matchering.saver import save
+from matchering.stage_helpers import (
+    normalize_reference,
+    analyze_levels,
+    convolve,
+)
+from matchering.stage_helpers import match_frequencies as mg_match_frequencies
+from matchering.utils import get_temp_folder
+
+import matchering_stream
+
+_IMPORT_SECONDS = time.perf_counter() - _PROCESS_START
+_IMPORT_PID = os.getpid() # Forked pool processes inherit the imports for free
+
+# --- CONFIGURATION ---
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".hosi_matchering_cache")
+CACHE_MAX_BYTES = 512 * 1024 * 1024 # Size bound of the on-disk analysis cache
+CACHE_MEMORY_ENTRIES = 32 # Analyses kept in memory (long-lived processes)
+CACHE_LOCK_TIMEOUT = 600 # Seconds before a lock left by a crashed process is ignored
+BIT_TO_SUBTYPE = {16: "PCM_16", 24: "PCM_24", 32: "FLOAT"}
+WRITE_THREADS = 4 # In-memory results written at the same time (libsndfile converts outside the GIL)
+DAEMON_STATE_FILE = "daemon.json" # Inside the cache folder: port, pid and token of the daemon
+DAEMON_IDLE_TIMEOUT = 300 # Seconds without jobs before the daemon exits
+STREAM_THRESHOLD = 10 * 60 # Files longer than this (seconds) are streamed in --stream auto
+PROGRESS_STAGES = { # Stage: (first percent, last percent, label)
+    "decode": (0, 10, "Decoding"),
+    "analysis": (10, 30, "Analysis"),
+    "matching": (30, 75, "Matching"),
+    "write": (75, 100, "Writing"),
+}
+
+# Matchering's own stage functions (module level, so not name-mangled)
+_average_fft = getattr(mg_match_frequencies, "__average_fft")
+_smooth_exponentially = getattr(mg_match_frequencies, "__smooth_exponentially")
+_correct_levels = getattr(mg_stages, "__correct_levels")
+_finalize = getattr(mg_stages, "__finalize")
+
+
+def log(msg):
+    """Logs a message to stdout (read by the worker)."""
+    print(msg, flush=True)
+
+
+# --- PROGRESS ---
+
+_progress_handler = None # Callable(message dict) of the current process, None = silent
+_last_progress = (None, -1)
+
+def set_progress_handler(handler):
+    """Sets where progress messages go (and restarts the throttling for a new job)."""
+    global _progress_handler, _last_progress
+    _progress_handler = handler
+    _last_progress = (None, -1)
+
+def report_progress(stage, fraction=0.0):
+    """Reports the progress of the current job: `fraction` (0-1) of `stage`.
+
+    Only sent when the stage changes or the overall percentage grows by one,
+    so long loops can call it for every block.
+    """
+    global _last_progress
+    if _progress_handler is None:
+        return
+    first, last, label = PROGRESS_STAGES[stage]
+    percent = int(first + (last - first) * min(1.0, max(0.0, fraction)))
+    if (stage, percent) == _last_progress or (stage == _last_progress[0] and percent < _last_progress[1]):
+        return
+    _last_progress = (stage, percent)
+    _progress_handler({"event": "progress", "stage": stage, "label": label, "percent": percent})
+
+
+# --- ANALYSIS CACHE ---
+
+class AnalysisCache:
+    """Persistent cache of per-file Matchering analyses.
+
+    Entries are keyed by the file content hash, the role of the file (target or
+    reference) and the Matchering settings. They are stored as .npz files and
+    evicted least-recently-used first once the folder exceeds `max_bytes`.
+    Concurrent processes analyzing the same file wait for each other through a
+    lock file, so a batch analyzes each unique file only once.
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=CACHE_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.memory = {}
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(os.path.join(cache_dir, "analysis"), exist_ok=True)
+        self.hash_index_path = os.path.join(cache_dir, "file_hashes.json")
+
+    # File hashing (memoized by path, size and modification time)
+
+    def file_digest(self, path):
+        """Returns the SHA-256 of a file's content."""
+        stat = os.stat(path)
+        index_key = f"{os.path.abspath(path)}|{stat.st_size}|{stat.st_mtime_ns}"
+        index = self._read_json(self.hash_index_path)
+        if index_key in index:
+            return index[index_key]
+
+        sha = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1024 * 1024), b""):
+                sha.update(block)
+        digest = sha.hexdigest()
+
+        index = self._read_json(self.hash_index_path) # Re-read: other processes may have written
+        index[index_key] = digest
+        self._write_json(self.hash_index_path, index)
+        return digest
+
+    @staticmethod
+    def make_key(role, digest, config, extra=None):
+        """Builds the cache key of one analysis."""
+        settings = {k: v for k, v in vars(config).items() if k != "temp_folder"}
+        payload = json.dumps(
+            {"role": role, "file": digest, "matchering": mg.__version__, "config": settings, "extra": extra},
+            sort_keys=True,
+            default=vars,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    # Entries
+
+    def _entry_path(self, key):
+        return os.path.join(self.cache_dir, "analysis", key + ".npz")
+
+    def get(self, key):
+        """Returns the cached analysis (dict of arrays/scalars) or None."""
+        if key in self.memory:
+            self.hits += 1
+            return dict(self.memory[key])
+        path = self._entry_path(key)
+        try:
+            with np.load(path) as data:
+                entry = {name: data[name] for name in data.files}
+            os.utime(path) # LRU: refresh the access time
+        except (OSError, ValueError):
+            return None
+        self.hits += 1
+        self._remember(key, entry)
+        return dict(entry)
+
+    def put(self, key, entry):
+        """Stores an analysis atomically and evicts old entries if needed."""
+        path = self._entry_path(key)
+        tmp_path = f"{path}.{os.getpid()}.tmp.npz"
+        np.savez(tmp_path, **entry)
+        os.replace(tmp_path, path)
+        self._remember(key, entry)
+        self.evict()
+
+    def get_or_compute(self, key, compute):
+        """Returns the cached analysis, or runs compute() once across processes."""
+        entry = self.get(key)
+        if entry is not None:
+            return entry
+
+        lock_path = self._entry_path(key) + ".lock"
+        while True:
+            try:
+                fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+                os.close(fd)
+                break
+            except FileExistsError:
+                # Another process is analyzing the same file: wait for its result
+                entry = self.get(key)
+                if entry is not None:
+                    return entry
+                try:
+                    if time.time() - os.path.getmtime(lock_path) > CACHE_LOCK_TIMEOUT:
+                        os.remove(lock_path) # Stale lock
+                except OSError:
+                    pass
+                time.sleep(0.2)
+
+        try:
+            entry = self.get(key) # Written while we were waiting for the lock?
+            if entry is None:
+                self.misses += 1
+                entry = compute()
+                self.put(key, entry)
+            return entry
+        finally:
+            try:
+                os.remove(lock_path)
+            except OSError:
+                pass
+
+    def evict(self):
+        """Removes least-recently-used entries until the cache fits in max_bytes."""
+        folder = os.path.join(self.cache_dir, "analysis")
+        entries = []
+        for name in os.listdir(folder):
+            if not name.endswith(".npz") or ".tmp." in name:
+                continue
+            path = os.path.join(folder, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(e[1] for e in entries)
+        for _, entry_size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= entry_size
+            except OSError:
+                pass
+
+    def _remember(self, key, entry):
+        self.memory[key] = entry
+        while len(self.memory) > CACHE_MEMORY_ENTRIES:
+            self.memory.pop(next(iter(self.memory)))
+
+    @staticmethod
+    def _read_json(path):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    @staticmethod
+    def _write_json(path, data, mode=0o666):
+        """Writes JSON atomically; `mode` (before the umask) applies to a new file."""
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, mode)
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+
+
+# --- MATCHERING PIPELINE (library API) ---
+
+def parse_range(text):
+    """Parses "OFFSET:LENGTH:PLAYRATE" into a tuple of floats (None if empty)."""
+    if not text:
+        return None
+    offset, length, rate = (float(v) for v in text.split(":"))
+    if rate <= 0:
+        raise ValueError(f"Invalid playrate: {rate}")
+    return offset, length, rate
+
+def parse_variant(text):
+    """Parses "BIT[:nolimiter][:nonormalize]" (e.g. "24:nolimiter") into (subtype, use_limiter, normalize)."""
+    fields = text.strip().lower().split(":")
+    try:
+        subtype = BIT_TO_SUBTYPE[int(fields[0].lstrip("-b"))]
+    except (KeyError, ValueError):
+        raise argparse.ArgumentTypeError(f"invalid bit depth in variant {text!r} (16, 24 or 32)")
+    unknown = set(fields[1:]) - {"nolimiter", "nonormalize"}
+    if unknown:
+        raise argparse.ArgumentTypeError(f"unknown option(s) in variant {text!r}: {', '.join(sorted(unknown))}")
+    use_limiter = "nolimiter" not in fields
+    return subtype, use_limiter, use_limiter or "nonormalize" not in fields
+
+def save_results(results, result, result_no_limiter, result_no_limiter_normalized, sample_rate):
+    """Writes every Result from the matched buffers, up to WRITE_THREADS files at a time.
+
+    The buffers are only read, so the variants share them; each file is encoded to its
+    own subtype by libsndfile, which releases the GIL while it converts and writes.
+    """
+    def write(required_result):
+        if required_result.use_limiter:
+            correct_result = result
+        elif required_result.normalize:
+            correct_result = result_no_limiter_normalized
+        else:
+            correct_result = result_no_limiter
+        save(required_result.file, correct_result, sample_rate, required_result.subtype)
+
+    if len(results) == 1:
+        write(results[0])
+        report_progress("write", 1.0)
+        return
+    with ThreadPoolExecutor(max_workers=min(WRITE_THREADS, len(results))) as executor:
+        futures = [executor.submit(write, required_result) for required_result in results]
+        for number, future in enumerate(as_completed(futures), 1):
+            future.result()
+            report_progress("write", number / len(results))
+
+def load_range(path, name, file_range):
+    """Decodes only the part of a file used by a REAPER item.
+
+    `file_range` is (offset, length, playrate): offset in source seconds, length in
+    item (project) seconds, so length * playrate source seconds are read. Only those
+    frames are decoded (seek + read, no intermediate file). The playrate is applied
+    by reporting a sample rate of sample_rate * playrate: Matchering's resampler then
+    produces the audio as the item plays it (playrate without pitch preservation).
+    """
+    offset, length, rate = file_range
+    try:
+        with sf.SoundFile(path) as f:
+            start = min(max(0, int(round(offset * f.samplerate))), f.frames)
+            frames = f.frames - start
+            if length > 0:
+                frames = min(frames, int(round(length * rate * f.samplerate)))
+            f.seek(start)
+            array = f.read(frames, dtype="float64", always_2d=True)
+            sample_rate = f.samplerate if rate == 1 else f.samplerate * rate
+    except RuntimeError:
+        raise ModuleError(Code.ERROR_TARGET_LOADING if name == "target" else Code.ERROR_REFERENCE_LOADING)
+    return array, sample_rate
+
+def load_checked(path, name, config, temp_folder, file_range=None):
+    """Decodes a file (or the item's range of it) and applies Matchering's checks."""
+    if file_range is None:
+        array, sample_rate = mg.load(path, name, temp_folder)
+    else:
+        array, sample_rate = load_range(path, name, file_range)
+    return mg.check(array, sample_rate, config, name)
+
+def analyze_reference(reference, config):
+    """Reference analysis: normalization, loudest-piece RMS and average spectra."""
+    reference, final_amplitude_coefficient = normalize_reference(reference, config)
+    _, _, mid_loudest, side_loudest, match_rms, *_ = analyze_levels(reference, "reference", config)
+    return {
+        "final_amplitude_coefficient": np.float64(final_amplitude_coefficient),
+        "match_rms": np.float64(match_rms),
+        "mid_fft": _average_fft(mid_loudest, config.internal_sample_rate, config.fft_size),
+        "side_fft": _average_fft(side_loudest, config.internal_sample_rate, config.fft_size),
+        "size": np.int64(size(reference)),
+    }
+
+def analyze_target(target, config):
+    """Target analysis: loudest-piece RMS, piece layout and average spectra."""
+    _, _, mid_loudest, side_loudest, match_rms, divisions, piece_size = analyze_levels(target, "target", config)
+    return {
+        "match_rms": np.float64(match_rms),
+        "divisions": np.int64(divisions),
+        "piece_size": np.int64(piece_size),
+        "mid_fft": _average_fft(mid_loudest, config.internal_sample_rate, config.fft_size),
+        "side_fft": _average_fft(side_loudest, config.internal_sample_rate, config.fft_size),
+    }
+
+def compute_fir(target_fft, reference_fft, config):
+    """Same FIR as matchering's get_fir(), but from the (cached) average spectra."""
+    target_fft = np.maximum(config.min_value, target_fft)
+    matching_fft = reference_fft / target_fft
+    matching_fft_filtered = _smooth_exponentially(matching_fft, config)
+    fir = np.fft.irfft(matching_fft_filtered)
+    return np.fft.ifftshift(fir) * signal.windows.hann(len(fir))
+
+def matching_filters(target_stats, reference_stats, config):
+    """Returns the target gain and the mid/side FIRs derived from the two analyses."""
+    rms_coefficient = float(reference_stats["match_rms"]) / max(config.min_value, float(target_stats["match_rms"]))
+
+    # The loudest pieces are amplified by rms_coefficient before the FFT in matchering,
+    # the average magnitude spectrum scales by the same factor.
+    mid_fir = compute_fir(target_stats["mid_fft"] * rms_coefficient, reference_stats["mid_fft"], config)
+    side_fir = compute_fir(target_stats["side_fft"] * rms_coefficient, reference_stats["side_fft"], config)
+    return rms_coefficient, mid_fir, side_fir
+
+def match(target, target_stats, reference_stats, config, need_default=True, need_no_limiter=False, need_no_limiter_normalized=False):
+    """Equivalent of matchering.stages.main() working from the two analyses."""
+    target_mid, target_side = lr_to_ms(target)
+    del target
+
+    rms_coefficient, mid_fir, side_fir = matching_filters(target_stats, reference_stats, config)
+    target_mid = target_mid * rms_coefficient
+    target_side = target_side * rms_coefficient
+
+    result_no_limiter, result_no_limiter_mid = convolve(target_mid, mid_fir, target_side, side_fir)
+    del target_mid, target_side
+    report_progress("matching", 0.4)
+
+    result_no_limiter = _correct_levels(
+        result_no_limiter, result_no_limiter_mid,
+        int(target_stats["divisions"]), int(target_stats["piece_size"]),
+        float(reference_stats["match_rms"]), config,
+    )
+    del result_no_limiter_mid
+    report_progress("matching", 0.6)
+
+    return _finalize(
+        result_no_limiter, float(reference_stats["final_amplitude_coefficient"]),
+        need_default, need_no_limiter, need_no_limiter_normalized, config,
+    )
+
+def source_duration(path, file_range=None):
+    """Seconds of audio a file (or a REAPER item's range of it) yields, 0 if unknown."""
+    try:
+        info = sf.info(path)
+    except RuntimeError:
+        return 0.0 # Not readable by libsndfile (decoded through FFmpeg): in-memory path
+    offset, length, rate = file_range if file_range else (0.0, 0.0, 1.0)
+    seconds = max(0.0, info.frames / info.samplerate - offset) / rate
+    return min(seconds, length) if length > 0 else seconds
+
+def use_streaming(stream, path, file_range, config):
+    """Decides whether a file goes through the bounded-memory pipeline."""
+    if stream == "auto":
+        duration = source_duration(path, file_range)
+        return duration > STREAM_THRESHOLD or duration > config.max_length
+    return stream == "on"
+
+def process_job(target_path, reference_path, results, cache=None, config=None, timings=None,
+                target_range=None, reference_range=None, stream="auto"):
+    """Processes one Target/Reference pair into the requested Results.
+
+    Mirrors matchering.process(), except that the analyses of both files go through
+    the AnalysisCache: a cached Reference is not even decoded. If `timings` is a
+    dict, the seconds spent in each step (decode, analysis, matching, write) are
+    stored in it. `target_range` / `reference_range` limit the decoding to the part
+    of the file used by the REAPER item (see load_range). `stream` ("auto", "on" or
+    "off") selects the bounded-memory pipeline for long targets (see process_job_stream).
+    Every Result (bit depth, limiter, normalization) is rendered from the same analysis
+    and matching; the in-memory path writes them in parallel (see save_results).
+    """
+    config = config or Config()
+    if len({os.path.abspath(rr.file) for rr in results}) != len(results):
+        raise ValueError("Two results have the same file path.")
+    temp_folder = config.temp_folder if config.temp_folder else get_temp_folder(results)
+    timings = {} if timings is None else timings
+    if use_streaming(stream, target_path, target_range, config):
+        process_job_stream(target_path, reference_path, results, cache, config, timings,
+                           target_range, reference_range, temp_folder, stream)
+        return
+    step_start = time.perf_counter()
+    report_progress("decode")
+
+    # 1. Target (always decoded: it is the audio we process)
+    target, target_sample_rate = load_checked(target_path, "target", config, temp_folder, target_range)
+    timings["decode"] = time.perf_counter() - step_start
+    step_start = time.perf_counter()
+    report_progress("analysis")
+
+    # 2. Analyses
+    if cache is not None:
+        target_digest = cache.file_digest(target_path)
+        reference_digest = cache.file_digest(reference_path)
+        if not config.allow_equality and (target_digest, target_range) == (reference_digest, reference_range):
+            raise ModuleError(Code.ERROR_TARGET_EQUALS_REFERENCE)
+
+        reference_stats = cache.get_or_compute(
+            cache.make_key("reference", reference_digest, config, extra=reference_range),
+            lambda: analyze_reference(
+                load_checked(reference_path, "reference", config, temp_folder, reference_range)[0], config
+            ),
+        )
+        target_stats = cache.get_or_compute(
+            cache.make_key("target", target_digest, config, extra=target_range),
+            lambda target=target: analyze_target(target, config), # Bound now: `target` is deleted below
+        )
+        reference_size = int(reference_stats["size"])
+    else:
+        reference, _ = load_checked(reference_path, "reference", config, temp_folder, reference_range)
+        if not config.allow_equality:
+            check_equality(target, reference)
+        reference_size = size(reference)
+        reference_stats = analyze_reference(reference, config)
+        target_stats = analyze_target(target, config)
+        del reference
+
+    # Validation of the most important conditions (same as matchering.process)
+    if (
+        target_sample_rate != config.internal_sample_rate
+        or channel_count(target) != 2
+        or not (size(target) > config.fft_size and reference_size > config.fft_size)
+    ):
+        raise ModuleError(Code.ERROR_VALIDATION)
+    timings["analysis"] = time.perf_counter() - step_start
+    step_start = time.perf_counter()
+    report_progress("matching")
+
+    # 3. Matching
+    result, result_no_limiter, result_no_limiter_normalized = match(
+        target, target_stats, reference_stats, config,
+        need_default=any(rr.use_limiter for rr in results),
+        need_no_limiter=any(not rr.use_limiter and not rr.normalize for rr in results),
+        need_no_limiter_normalized=any(not rr.use_limiter and rr.normalize for rr in results),
+    )
+    del target
+    timings["matching"] = time.perf_counter() - step_start
+    step_start = time.perf_counter()
+    report_progress("write")
+
+    # 4. Save
+    save_results(results, result, result_no_limiter, result_no_limiter_normalized, config.internal_sample_rate)
+    timings["write"] = time.perf_counter() - step_start
+
+
+def process_job_stream(target_path, reference_path, results, cache, config, timings,
+                       target_range, reference_range, temp_folder, stream="auto"):
+    """process_job() for targets that should not be loaded into memory.
+
+    Both passes of matchering_stream read the Target piece by piece. The Reference
+    is streamed too when it is long, otherwise it is analyzed in memory as usual.
+    The analyses go through the same AnalysisCache (with their own keys).
+    """
+    step_start = time.perf_counter()
+    report_progress("analysis")
+    stream_reference = stream == "on" or use_streaming(stream, reference_path, reference_range, config)
+
+    def analyze_reference_any():
+        if stream_reference:
+            return matchering_stream.analyze(
+                reference_path, "reference", config, reference_range,
+                progress=lambda fraction: report_progress("analysis", 0.5 * fraction),
+            )
+        return analyze_reference(load_checked(reference_path, "reference", config, temp_folder, reference_range)[0], config)
+
+    def analyze_target_stream():
+        return matchering_stream.analyze(
+            target_path, "target", config, target_range,
+            progress=lambda fraction: report_progress("analysis", 0.5 + 0.5 * fraction),
+        )
+
+    if cache is not None:
+        target_digest = cache.file_digest(target_path)
+        reference_digest = cache.file_digest(reference_path)
+        if not config.allow_equality and (target_digest, target_range) == (reference_digest, reference_range):
+            raise ModuleError(Code.ERROR_TARGET_EQUALS_REFERENCE)
+        reference_extra = {"range": reference_range, "stream": True} if stream_reference else reference_range
+        reference_stats = cache.get_or_compute(
+            cache.make_key("reference", reference_digest, config, extra=reference_extra), analyze_reference_any
+        )
+        target_stats = cache.get_or_compute(
+            cache.make_key("target", target_digest, config, extra={"range": target_range, "stream": True}),
+            analyze_target_stream,
+        )
+    else:
+        # Without the cache there are no content hashes: same file and same range
+        if (not config.allow_equality and target_range == reference_range
+                and os.path.samefile(target_path, reference_path)):
+            raise ModuleError(Code.ERROR_TARGET_EQUALS_REFERENCE)
+        reference_stats = analyze_reference_any()
+        target_stats = analyze_target_stream()
+    timings["decode"] = 0.0 # Decoding happens inside both passes
+    timings["analysis"] = time.perf_counter() - step_start
+
+    rms_coefficient, mid_fir, side_fir = matching_filters(target_stats, reference_stats, config)
+    matchering_stream.render(
+        target_path, results, target_stats, reference_stats, rms_coefficient, mid_fir, side_fir,
+        config, temp_folder, target_range, timings, progress=report_progress,
+    )
+
+
+# --- DAEMON (long-lived engine, one warm process per parallel job) ---
+
+_pool_cache = None # AnalysisCache of the current pool process
+_pool_progress = None # Queue of the progress messages, read by the daemon process
+_pool_first_job = True # The first job of a spawned pool process pays its imports
+
+def _init_pool_process(cache_dir, progress_queue=None):
+    """Initializer of every pool process: silent logs and one cache per process."""
+    global _pool_cache, _pool_progress
+    mg.log() # No console output from pool processes
+    _pool_cache = AnalysisCache(cache_dir) if cache_dir else None
+    _pool_progress = progress_queue
+
+def run_job(job):
+    """Runs one daemon job inside a pool process. Returns a JSON-friendly dict.
+
+    The outputs are listed in job["variants"] ({"result", "bit", "no_limiter",
+    "dont_normalize"} each); a job without that list has one output, described by
+    the same keys on the job itself.
+    """
+    global _pool_first_job
+    started = time.time()
+    timings = {
+        "queue_wait": max(0.0, started - job["submitted"]),
+        # Forked pool processes inherit the daemon's imports (see MatcheringDaemon.take_boot_seconds)
+        "startup": _IMPORT_SECONDS if _pool_first_job and os.getpid() == _IMPORT_PID else 0.0,
+    }
+    _pool_first_job = False
+    if _pool_progress is not None:
+        set_progress_handler(lambda message: _pool_progress.put(dict(message, key=job.get("key"))))
+
+    steps = {}
+    try:
+        results = [
+            Result(
+                variant["result"],
+                subtype=BIT_TO_SUBTYPE[int(variant.get("bit", 24))],
+                use_limiter=not variant.get("no_limiter", False),
+                normalize=not variant.get("dont_normalize", False),
+            )
+            for variant in job.get("variants") or [job]
+        ]
+        process_job(
+            job["target"], job["reference"], results, cache=_pool_cache, timings=steps,
+            target_range=tuple(job["target_range"]) if job.get("target_range") else None,
+            reference_range=tuple(job["reference_range"]) if job.get("reference_range") else None,
+            stream=job.get("stream", "auto"),
+        )
+        code, error = 0, ""
+    except ModuleError as e:
+        code, error = 1, str(e)
+    except Exception as e:
+        code, error = 1, f"{type(e).__name__}: {e}"
+
+    timings["processing"] = steps.get("decode", 0.0) + steps.get("analysis", 0.0) + steps.get("matching", 0.0)
+    timings["write"] = steps.get("write", 0.0)
+    timings["total"] = time.time() - job["submitted"]
+    return {"event": "done", "id": job.get("id"), "code": code, "error": error, "timings": timings}
+
+
+class _DaemonRequestHandler(socketserver.StreamRequestHandler):
+    """One connection = one request line (JSON) and its reply line(s)."""
+
+    def handle(self):
+        daemon = self.server.daemon_owner
+        try:
+            request = json.loads(self.rfile.readline().decode("utf-8"))
+        except ValueError:
+            return
+        if request.get("token") != daemon.token:
+            self._reply({"event": "error", "error": "Invalid token."})
+            return
+
+        op = request.get("op")
+        if op == "ping":
+            self._reply({"event": "pong", "pid": os.getpid(), "workers": daemon.workers})
+        elif op == "shutdown":
+            self._reply({"event": "bye"})
+            daemon.stop()
+        elif op == "resize":
+            workers = daemon.resize(int(request.get("workers", 0)))
+            self._reply({"event": "pong", "pid": os.getpid(), "workers": workers})
+        elif op == "cancel":
+            # Kills the pool processes (running jobs included), then exits
+            self._reply({"event": "bye"})
+            daemon.terminate_pools()
+            daemon.stop()
+        elif op == "job":
+            request["submitted"] = time.time()
+            request["key"] = daemon.job_started(self, request.get("id"))
+            boot_seconds = daemon.take_boot_seconds()
+            try:
+                reply = daemon.pool.apply_async(run_job, (request,)).get()
+            except Exception as e:
+                reply = {"event": "done", "id": request.get("id"), "code": 1, "error": f"Daemon: {e}", "timings": {}}
+            finally:
+                daemon.job_finished(request["key"])
+            if boot_seconds:
+                timings = reply.setdefault("timings", {})
+                timings["startup"] = timings.get("startup", 0.0) + boot_seconds
+                timings["total"] = timings.get("total", 0.0) + boot_seconds
+            self._reply(reply)
+        else:
+            self._reply({"event": "error", "error": f"Unknown op: {op}"})
+
+    def _reply(self, message):
+        # Progress lines are written by the dispatcher thread of the daemon
+        with self.write_lock:
+            try:
+                self.wfile.write((json.dumps(message) + "\n").encode("utf-8"))
+                self.wfile.flush()
+            except (OSError, ValueError):
+                pass # The worker went away (e.g. cancelled)
+
+    def setup(self):
+        super().setup()
+        self.write_lock = threading.Lock()
+
+
+class _DaemonServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = False
+
+
+class MatcheringDaemon:
+    """Long-lived engine process fed with jobs over a local TCP socket.
+
+    Matchering, NumPy and SciPy are imported once per pool process instead of once
+    per job. The port, pid and a random token are written to daemon.json in the
+    cache folder; the daemon removes it and exits after `idle_timeout` seconds
+    without jobs. A client that needs more parallel jobs than the pool has asks
+    for a bigger one ("resize"); jobs already running finish in the old pool.
+    """
+
+    def __init__(self, workers, idle_timeout=DAEMON_IDLE_TIMEOUT, cache_dir=DEFAULT_CACHE_DIR, use_cache=True):
+        self.workers = max(1, workers)
+        self.idle_timeout = idle_timeout
+        self.cache_dir = cache_dir
+        self.use_cache = use_cache
+        self.state_path = os.path.join(cache_dir, DAEMON_STATE_FILE)
+        self.token = secrets.token_hex(16)
+        self.active_jobs = 0
+        self.last_activity = time.time()
+        self.lock = threading.Lock()
+        self.listeners = {} # Job key: (request handler, job id) receiving the progress
+        self.next_key = 0
+        self.progress_queue = multiprocessing.Queue()
+        self.pool = self._new_pool(self.workers)
+        self.retired_pools = [] # Smaller pools replaced by resize(), finishing their jobs
+        self.boot_seconds = 0.0 # Imports + pool spawn, charged to the first job (see take_boot_seconds)
+        self.server = _DaemonServer(("127.0.0.1", 0), _DaemonRequestHandler)
+        self.server.daemon_owner = self
+
+    def _new_pool(self, workers):
+        return multiprocessing.Pool(
+            workers, initializer=_init_pool_process,
+            initargs=(self.cache_dir if self.use_cache else None, self.progress_queue),
+        )
+
+    def take_boot_seconds(self):
+        """The daemon's startup time for the first job it serves, 0 for every later job."""
+        with self.lock:
+            boot_seconds, self.boot_seconds = self.boot_seconds, 0.0
+        return boot_seconds
+
+    def resize(self, workers):
+        """Grows the pool to `workers` processes (never shrinks it). Returns the pool size."""
+        with self.lock:
+            if workers <= self.workers:
+                return self.workers
+            old_pool, self.pool = self.pool, self._new_pool(workers)
+            self.workers = workers
+            self.retired_pools.append(old_pool)
+        old_pool.close() # Takes no new jobs, the running ones finish
+        log(f"Daemon: pool resized to {workers} worker(s).")
+        return workers
+
+    def terminate_pools(self):
+        """Kills every pool process, running jobs included."""
+        with self.lock:
+            pools = [self.pool] + self.retired_pools
+        for pool in pools:
+            pool.terminate()
+
+    def job_started(self, handler, job_id):
+        """Registers a job and the connection its progress goes to. Returns its key."""
+        with self.lock:
+            self.active_jobs += 1
+            self.last_activity = time.time()
+            self.next_key += 1
+            self.listeners[self.next_key] = (handler, job_id)
+            return self.next_key
+
+    def job_finished(self, key):
+        with self.lock:
+            self.active_jobs -= 1
+            self.last_activity = time.time()
+            self.listeners.pop(key, None)
+
+    def _dispatch_progress(self):
+        """Forwards the progress messages of the pool processes to the job connections."""
+        while True:
+            try:
+                message = self.progress_queue.get()
+            except (OSError, EOFError, ValueError):
+                return
+            with self.lock:
+                handler, job_id = self.listeners.get(message.pop("key", None), (None, None))
+            if handler is not None:
+                handler._reply(dict(message, id=job_id))
+
+    def stop(self):
+        threading.Thread(target=self.server.shutdown, daemon=True).start()
+
+    def _watch_idle(self):
+        while True:
+            time.sleep(1.0)
+            with self.lock:
+                idle = self.active_jobs == 0 and time.time() - self.last_activity > self.idle_timeout
+            if idle:
+                log(f"Daemon: idle for {self.idle_timeout} s, shutting down.")
+                self.stop()
+                return
+
+    def serve(self):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        port = self.server.server_address[1]
+        self.boot_seconds = time.perf_counter() - _PROCESS_START # Interpreter up to a listening socket
+        # Owner-only: the token lets a client run jobs that write files as this user
+        AnalysisCache._write_json(self.state_path, {"port": port, "pid": os.getpid(), "token": self.token}, mode=0o600)
+        log(f"Daemon: listening on 127.0.0.1:{port} with {self.workers} worker(s).")
+        threading.Thread(target=self._watch_idle, daemon=True).start()
+        threading.Thread(target=self._dispatch_progress, daemon=True).start()
+        try:
+            self.server.serve_forever(poll_interval=0.5)
+        finally:
+            try:
+                with open(self.state_path, "r", encoding="utf-8") as f:
+                    if json.load(f).get("pid") == os.getpid():
+                        os.remove(self.state_path)
+            except (OSError, ValueError):
+                pass
+            self.server.server_close()
+            self.terminate_pools()
+            for pool in [self.pool] + self.retired_pools:
+                pool.join()
+
+def serve_main(argv):
+    parser = argparse.ArgumentParser(description="Matchering 2.0 engine daemon")
+    parser.add_argument("--workers", type=int, default=0, help="Parallel jobs (0 = CPU core count)")
+    parser.add_argument("--idle-timeout", dest="idle_timeout", type=float, default=DAEMON_IDLE_TIMEOUT,
+                        help="Seconds without jobs before the daemon exits")
+    parser.add_argument("--cache-dir", dest="cache_dir", type=str, default=DEFAULT_CACHE_DIR,
+                        help="Folder of the persistent analysis cache (and daemon.json)")
+    parser.add_argument("--no-cache", dest="no_cache", action="store_true",
+                        help="Analyze both files without using the cache")
+    args = parser.parse_args(argv)
+
+    workers = args.workers if args.workers > 0 else (os.cpu_count() or 1)
+    MatcheringDaemon(workers, args.idle_timeout, args.cache_dir, use_cache=not args.no_cache).serve()
+    return 0
+
+
+# --- COMMAND LINE (compatible with mg_cli.py) ---
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Matchering 2.0 engine with analysis cache")
+    parser.add_argument("target", type=str, help="The track you want to master")
+    parser.add_argument("reference", type=str, help='Some "wet" reference track')
+    parser.add_argument("result", type=str, help="Where to save your result")
+    parser.add_argument("-b", "--bit", type=int, choices=[16, 24, 32], default=16,
+                        help="The bit depth of your mastered result. 32 means 32-bit float")
+    parser.add_argument("--no_limiter", dest="no_limiter", action="store_true",
+                        help="Disables the limiter at the final stage of processing")
+    parser.add_argument("--dont_normalize", dest="dont_normalize", action="store_true",
+                        help="Disables normalization, if --no_limiter is set")
+    parser.add_argument("--cache-dir", dest="cache_dir", type=str, default=DEFAULT_CACHE_DIR,
+                        help="Folder of the persistent analysis cache")
+    parser.add_argument("--no-cache", dest="no_cache", action="store_true",
+                        help="Analyze both files without using the cache")
+    parser.add_argument("--target-range", dest="target_range", type=parse_range, default=None,
+                        help="OFFSET:LENGTH:PLAYRATE of the Target item (decode only that part)")
+    parser.add_argument("--reference-range", dest="reference_range", type=parse_range, default=None,
+                        help="OFFSET:LENGTH:PLAYRATE of the Reference item (decode only that part)")
+    parser.add_argument("--stream", choices=["auto", "on", "off"], default="auto",
+                        help=f"Bounded-memory processing (auto: files longer than {STREAM_THRESHOLD} s)")
+    parser.add_argument("--variant", dest="variants", nargs=2, action="append", default=[],
+                        metavar=("BIT[:nolimiter][:nonormalize]", "RESULT"),
+                        help="Also render this variant to RESULT, from the same analysis (repeatable)")
+    return parser.parse_args(argv)
+
+def verify_stream_main(argv):
+    """Renders a pair with both pipelines and compares the results."""
+    parser = argparse.ArgumentParser(description="Compare the streaming and in-memory pipelines")
+    parser.add_argument("target", type=str)
+    parser.add_argument("reference", type=str)
+    parser.add_argument("--tolerance", type=float, default=matchering_stream.STREAM_TOLERANCE,
+                        help="Maximum peak absolute difference")
+    args = parser.parse_args(argv)
+
+    variants = [("limiter", True, True), ("no_limiter", False, False), ("normalized", False, True)]
+    worst = 0.0
+    with tempfile.TemporaryDirectory() as folder:
+        outputs = {}
+        for stream in ("off", "on"):
+            results = [
+                Result(os.path.join(folder, f"{stream}_{name}.wav"), subtype="FLOAT", use_limiter=limiter, normalize=normalize)
+                for name, limiter, normalize in variants
+            ]
+            timings = {}
+            process_job(args.target, args.reference, results, stream=stream, timings=timings)
+            log(f"{'Streaming' if stream == 'on' else 'In-memory'}: " + ", ".join(f"{k} {v:.2f} s" for k, v in timings.items()))
+            outputs[stream] = [sf.read(r.file)[0] for r in results]
+
+        for (name, *_), expected, actual in zip(variants, outputs["off"], outputs["on"]):
+            common = min(len(expected), len(actual))
+            difference = float(np.abs(expected[:common] - actual[:common]).max())
+            worst = max(worst, difference)
+            log(f"{name}: {len(expected)} / {len(actual)} samples, peak difference {difference:.2e}")
+
+    if worst > args.tolerance:
+        log(f"Error: the streaming result differs by {worst:.2e} (tolerance {args.tolerance:.0e}).")
+        return 1
+    log(f"Streaming matches the in-memory result within {args.tolerance:.0e}.")
+    return 0
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv and argv[0] == "serve":
+        return serve_main(argv[1:])
+    if argv and argv[0] == "verify-stream":
+        return verify_stream_main(argv[1:])
+
+    args = parse_args(argv)
+    mg.log(warning_handler=log, info_handler=log)
+    set_progress_handler(lambda message: log("@progress " + json.dumps(
+        {k: message[k] for k in ("stage", "label", "percent")}
+    )))
+
+    results = [Result(
+        args.result,
+        subtype=BIT_TO_SUBTYPE[args.bit],
+        use_limiter=not args.no_limiter,
+        normalize=not args.dont_normalize,
+    )]
+    for spec, result_path in args.variants:
+        try:
+            subtype, use_limiter, normalize = parse_variant(spec)
+        except argparse.ArgumentTypeError as e:
+            log(f"Error: {e}")
+            return 2
+        results.append(Result(result_path, subtype=subtype, use_limiter=use_limiter, normalize=normalize))
+    cache = None if args.no_cache else AnalysisCache(args.cache_dir)
+
+    start_time = time.time()
+    timings = {}
+    try:
+        process_job(
+            args.target, args.reference, results, cache=cache, timings=timings,
+            target_range=args.target_range, reference_range=args.reference_range, stream=args.stream,
+        )
+    except ModuleError as e:
+        log(f"Error: {e}")
+        return 1
+    except Exception as e:
+        log(f"Error: {type(e).__name__}: {e}")
+        return 1
+
+    if cache is not None:
+        log(f"Analysis cache: {cache.hits} hit(s), {cache.misses} miss(es).")
+    log("Timings: startup {:.2f} s, ".format(_IMPORT_SECONDS) + ", ".join(f"{k} {v:.2f} s" for k, v in timings.items()))
+    log(f"Done in {time.time() - start_time:.2f} s.")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,7 +1,7 @@
 --[[
 @description    Matchering 2.0 GUI (Unified Batch Processor)
 @author         Hosi
-@version        1.1
+@version        1.5
 @reaper_version 6.0+
 @extensions     ReaImGui, SWS/ReaPack (for Python worker)
 @provides
@@ -30,6 +30,10 @@
 @changelog
   + v1.0 (2025-Nov-12) - Initial Unified Batch release with Multi-Target and Multi-Reference modes.
   + v1.1 (2025-Dec-09) - Modern GUI 
+  + v1.2 (2026-Oct-17) - Parallel jobs: the whole batch is sent to the worker Pool at once (per-job status).
+  + v1.3 (2026-Oct-17) - 'Prune old masters' (deletes outputs that the worker's result manifest no longer tracks).
+  + v1.4 (2026-Oct-17) - Sends item offset/length/playrate: only the used part of each source is processed.
+  + v1.5 (2026-Oct-17) - 'Variants': several masters per job (e.g. "24, 16:noimport, 24:nolimiter") from one analysis, import optional per variant.
 --]]
 
 -- REAPER SCRIPT: Matchering 2.0 GUI (Unified Batch)
@@ -70,6 +74,10 @@ local total_jobs = 0
 local current_job_target_item = nil -- Item being processed (for muting)
 local current_job_ref_item = nil -- Item being processed (for muting)
 
+-- *** NEW: Pool mode (parallel jobs) ***
+local pool_mode = false -- true while a Pool batch is running
+local pool_jobs = {} -- Stores tables: {target, ref, name, status, finished}
+
 local status_text = "Idle. Select a mode and add items."
 local last_error = ""
 local is_running = false
@@ -84,7 +92,11 @@ local settings = {
     bit_depth_options = {"-b16", "-b24", "-b32"},
     bit_depth_index = 2,
     -- *** NEW: Idea 2 (Continue on Error) ***
-    continue_on_error = reaper.GetExtState("MatcheringGUI", "ContinueOnError", "false") == "true"
+    continue_on_error = reaper.GetExtState("MatcheringGUI", "ContinueOnError", "false") == "true",
+    -- *** NEW: Parallel jobs (0 = Auto / CPU cores, 1 = sequential) ***
+    max_jobs = tonumber(reaper.GetExtState("MatcheringGUI", "MaxJobs")) or 0,
+    -- *** NEW: Output variants ("" = one master at the selected bit depth) ***
+    variants = reaper.GetExtState("MatcheringGUI", "Variants")
 }
 local saved_bit_depth = reaper.GetExtState("MatcheringGUI", "BitDepth", "-b24")
 for i, v in ipairs(settings.bit_depth_options) do
@@ -98,6 +110,8 @@ function SaveSettings()
     reaper.SetExtState("MatcheringGUI", "BitDepth", settings.bit_depth_options[settings.bit_depth_index], true)
     -- *** NEW: Idea 2 (Continue on Error) ***
     reaper.SetExtState("MatcheringGUI", "ContinueOnError", settings.continue_on_error and "true" or "false", true)
+    reaper.SetExtState("MatcheringGUI", "MaxJobs", tostring(settings.max_jobs), true)
+    reaper.SetExtState("MatcheringGUI", "Variants", settings.variants, true)
 end
 -- --- End Settings ---
 
@@ -116,6 +130,32 @@ function GetItemPath(item)
     return nil
 end
 
+-- *** NEW: Part of the source used by the item (offset in source seconds, length in item seconds) ***
+function GetItemRange(item)
+    local take = item and reaper.GetActiveTake(item)
+    if not take then return 0, 0, 1 end
+    local offset = reaper.GetMediaItemTakeInfo_Value(take, "D_STARTOFFS")
+    local length = reaper.GetMediaItemInfo_Value(item, "D_LENGTH")
+    local rate = reaper.GetMediaItemTakeInfo_Value(take, "D_PLAYRATE")
+    if reaper.GetMediaItemTakeInfo_Value(take, "B_PPITCH") == 1 then
+        -- Preserve pitch: same source span, but no resampling
+        length, rate = length * rate, 1
+    end
+    return offset, length, rate
+end
+
+function FormatItemRange(item)
+    local offset, length, rate = GetItemRange(item)
+    return string.format("%.6f\t%.6f\t%.6f", offset, length, rate)
+end
+
+function SetRangeExtState(prefix, item)
+    local offset, length, rate = GetItemRange(item)
+    reaper.SetExtState("MatcheringWorker", prefix .. "Offset", string.format("%.6f", offset), false)
+    reaper.SetExtState("MatcheringWorker", prefix .. "Length", string.format("%.6f", length), false)
+    reaper.SetExtState("MatcheringWorker", prefix .. "Playrate", string.format("%.6f", rate), false)
+end
+
 function GetBasename(path)
     if not path or #path == 0 then return "None" end
     local basename = path:match("([^/\\]+)$")
@@ -210,6 +250,7 @@ function ClearAllQueues()
     single_target_item, single_target_path, single_target_name = nil, nil, "None"
     job_queue = {}
     total_jobs = 0
+    pool_jobs = {}
     status_text = "Mode switched. Please add items."
     last_error = ""
     is_running = false -- Safety
@@ -370,10 +411,14 @@ function StartNextJob()
         return
     end
     
+    reaper.SetExtState("MatcheringWorker", "Mode", "", false)
     reaper.SetExtState("MatcheringWorker", "Target", job.target.path, false)
     reaper.SetExtState("MatcheringWorker", "Reference", job.ref.path, false)
     reaper.SetExtState("MatcheringWorker", "ReferenceName", job.ref.name, false)
     reaper.SetExtState("MatcheringWorker", "BitDepth", settings.bit_depth_options[settings.bit_depth_index], false)
+    reaper.SetExtState("MatcheringWorker", "Variants", settings.variants, false)
+    SetRangeExtState("Target", job.target.item)
+    SetRangeExtState("Reference", job.ref.item)
     reaper.SetExtState("MatcheringWorker", "Command", "", false) 
     
     reaper.Main_OnCommand(cmd_id, 0)
@@ -429,13 +474,131 @@ function StartBatch()
         return
     end
     
-    StartNextJob()
+    if settings.max_jobs ~= 1 then
+        StartPoolBatch()
+    else
+        StartNextJob()
+    end
+end
+
+-- *** NEW: Pool mode (whole batch sent to the worker at once) ***
+function StartPoolBatch()
+    local cmd_id = reaper.NamedCommandLookup(settings.cmd_id)
+    if cmd_id == 0 then
+        status_text = "Error: Batch stopped."
+        last_error = "Could not find worker script Command ID. Check Settings."
+        job_queue = {}
+        return
+    end
+
+    pool_jobs = {}
+    local lines = {}
+    for i, job in ipairs(job_queue) do
+        local job_name = batch_mode == 1 and ("T: " .. job.target.name) or ("R: " .. job.ref.name)
+        table.insert(pool_jobs, { target = job.target, ref = job.ref, name = job_name, status = "Queued", finished = false })
+        table.insert(lines, table.concat({
+            job.target.path, job.ref.path, job.ref.name, FormatItemRange(job.target.item), FormatItemRange(job.ref.item)
+        }, "\t"))
+        reaper.SetExtState("MatcheringWorker", "Status_" .. i, "", false)
+    end
+    job_queue = {}
+
+    reaper.SetExtState("MatcheringWorker", "Mode", "Pool", false)
+    reaper.SetExtState("MatcheringWorker", "Jobs", table.concat(lines, "\n"), false)
+    reaper.SetExtState("MatcheringWorker", "MaxJobs", tostring(settings.max_jobs), false)
+    reaper.SetExtState("MatcheringWorker", "BitDepth", settings.bit_depth_options[settings.bit_depth_index], false)
+    reaper.SetExtState("MatcheringWorker", "Variants", settings.variants, false)
+    reaper.SetExtState("MatcheringWorker", "Status", "", false)
+    reaper.SetExtState("MatcheringWorker", "Command", "", false)
+
+    reaper.Main_OnCommand(cmd_id, 0)
+
+    status_text = string.format("Running %d job(s) in parallel...", total_jobs)
+    last_error = ""
+    pool_mode = true
+    is_running = true
+    run_start_time = reaper.time_precise()
+end
+
+function FinishPoolBatch()
+    pool_mode = false
+    is_running = false
+    run_start_time = 0
+    total_jobs = 0
+    if batch_mode == 2 and single_target_item then
+        reaper.SetMediaItemInfo_Value(single_target_item, "B_MUTE", 1.0)
+    end
+    reaper.UpdateArrange()
+end
+
+function PollPoolStatus()
+    local any_muted = false
+    local finished_count = 0
+    for i, job in ipairs(pool_jobs) do
+        if not job.finished then
+            local job_status = reaper.GetExtState("MatcheringWorker", "Status_" .. i)
+            if job_status and #job_status > 0 then job.status = job_status end
+            if job_status == "Done" or (job_status:match("^Error:") and settings.continue_on_error) then
+                job.finished = true
+                if batch_mode == 1 and job.target.item then reaper.SetMediaItemInfo_Value(job.target.item, "B_MUTE", 1.0) end
+                if job.ref.item and (batch_mode == 2 or job_status == "Done") then reaper.SetMediaItemInfo_Value(job.ref.item, "B_MUTE", 1.0) end
+                any_muted = true
+            elseif job_status:match("^Error:") then
+                -- Not continuing on error: stop the rest of the Pool
+                job.finished = true
+                last_error = job_status:gsub("^Error: ", "")
+                reaper.SetExtState("MatcheringWorker", "Command", "Cancel", false)
+            end
+        end
+        if job.finished then finished_count = finished_count + 1 end
+    end
+    if any_muted then reaper.UpdateArrange() end
+
+    local worker_status = reaper.GetExtState("MatcheringWorker", "Status")
+    if worker_status == "Done" then
+        reaper.SetExtState("MatcheringWorker", "Status", "", false)
+        status_text = string.format("Batch complete! %d job(s) finished.", total_jobs)
+        FinishPoolBatch()
+    elseif worker_status:match("^Error:") then
+        reaper.SetExtState("MatcheringWorker", "Status", "", false)
+        if last_error == "" then last_error = worker_status:gsub("^Error: ", "") end
+        status_text = "Error! Batch finished with errors."
+        multi_target_queue = {}; multi_ref_queue = {}
+        FinishPoolBatch()
+    elseif reaper.GetExtState("MatcheringWorker", "Command") == "Cancel" then
+        status_text = "Cancelling... waiting for worker."
+    else
+        status_text = string.format("Running (%d/%d finished)", finished_count, total_jobs)
+    end
+end
+
+-- *** NEW: Delete masters that the worker's result manifest no longer tracks ***
+function PruneMasters()
+    if is_running then return end
+    local cmd_id = reaper.NamedCommandLookup(settings.cmd_id)
+    if cmd_id == 0 then
+        last_error = "Could not find worker script Command ID. Check Settings."
+        return
+    end
+    reaper.SetExtState("MatcheringWorker", "Mode", "Prune", false)
+    reaper.SetExtState("MatcheringWorker", "Status", "", false)
+    reaper.Main_OnCommand(cmd_id, 0) -- Runs synchronously
+    local worker_status = reaper.GetExtState("MatcheringWorker", "Status")
+    reaper.SetExtState("MatcheringWorker", "Status", "", false)
+    if worker_status:match("^Error:") then
+        last_error = worker_status:gsub("^Error: ", "")
+    else
+        last_error = ""
+        status_text = #worker_status > 0 and worker_status or "Prune requested."
+    end
 end
 
 -- --- GUI LOOP (ReaImGui) ---
 function main_loop()
     -- Status check logic (Unchanged Logic, just checking status)
-    if is_running then
+    if is_running and pool_mode then
+        PollPoolStatus()
+    elseif is_running then
         local worker_status = reaper.GetExtState("MatcheringWorker", "Status")
         if worker_status and #worker_status > 0 then
             if worker_status == "Done" then
@@ -586,6 +749,21 @@ function main_loop()
             end
             imgui.EndChild(ctx)
         end
+
+        -- 3b. Per-job status (Pool mode)
+        if #pool_jobs > 0 then
+            imgui.Dummy(ctx, 0, 5)
+            if imgui.BeginChild(ctx, "JobList", 0, math.min(#pool_jobs * 18 + 8, 150), 1) then
+                for _, job in ipairs(pool_jobs) do
+                    local color = UI.TextDisabled
+                    if job.status == "Done" then color = UI.Success
+                    elseif job.status:match("^Error:") then color = UI.Error
+                    elseif job.status:match("^Running") or job.status:match("^Completed") then color = UI.Info end
+                    imgui.TextColored(ctx, color, job.name .. "  -  " .. job.status)
+                end
+                imgui.EndChild(ctx)
+            end
+        end
         
         -- 4. Settings (Collapsible)
         imgui.Dummy(ctx, 0, 5)
@@ -594,6 +772,12 @@ function main_loop()
             -- Checkbox
             local c_err, n_err = imgui.Checkbox(ctx, "Continue on Error", settings.continue_on_error)
             if c_err then settings.continue_on_error = n_err; SaveSettings() end
+
+            -- Parallel jobs (0 = Auto)
+            imgui.PushItemWidth(ctx, 80)
+            local c_mj, n_mj = imgui.InputInt(ctx, "Parallel jobs (0 = Auto)", settings.max_jobs)
+            if c_mj then settings.max_jobs = math.max(0, n_mj); SaveSettings() end
+            imgui.PopItemWidth(ctx)
             
             imgui.Dummy(ctx, 0, 2)
             
@@ -623,6 +807,17 @@ function main_loop()
             local c_bd, n_bd = imgui.Combo(ctx, "##BitDepth", settings.bit_depth_index - 1, opts)
             if c_bd then settings.bit_depth_index = n_bd + 1; SaveSettings() end
             imgui.PopItemWidth(ctx)
+
+            -- Output variants (rendered from one analysis; "noimport" = file only)
+            imgui.PushItemWidth(ctx, 235)
+            local c_var, n_var = imgui.InputTextWithHint(ctx, "Variants", "e.g. 24, 16:noimport, 24:nolimiter", settings.variants)
+            if c_var then settings.variants = n_var; SaveSettings() end
+            imgui.PopItemWidth(ctx)
+            imgui.TextDisabled(ctx, "(16/24/32 + :nolimiter :nonormalize :noimport; empty = bit depth above)")
+
+            -- Result cache maintenance
+            if imgui.Button(ctx, "Prune old masters") then PruneMasters() end
+            imgui.SameLine(ctx); imgui.TextDisabled(ctx, "(outputs of changed inputs)")
         end
         imgui.EndDisabled(ctx)
 
@@ -0,0 +1,445 @@
+# @noindex
+# MATCHERING STREAMING PIPELINE (runs in the Matchering venv, used by matchering_engine.py)
+# DESCRIPTION: Bounded-memory version of the Matchering 2.0 pipeline for very long
+# targets (podcasts, DJ mixes). The audio is never loaded as a whole:
+#   Pass 1 (analyze) reads the file piece by piece and keeps only block statistics:
+#          the RMS and the summed magnitude spectra of every piece, and the peak.
+#   Pass 2 (render) convolves the target block by block into a float32 temp file
+#          (mid/side), derives the level correction from it piece by piece,
+#          then writes the results through a lookahead limiter, block by block.
+# Peak memory depends on the piece and block sizes, not on the length of the file.
+# The analyses have the same format as the in-memory ones, so they share the cache.
+#
+# Differences to the in-memory path (checked by `matchering_engine.py verify-stream`):
+#   - the limiter's zero-phase attack filter is evaluated over a finite margin,
+#   - the intermediate result is stored as float32.
+# The outputs agree within STREAM_TOLERANCE (peak absolute difference).
+
+import math
+import os
+import time
+from fractions import Fraction
+
+import numpy as np
+import resampy
+import soundfile as sf
+from scipy import signal
+from scipy.ndimage import maximum_filter1d
+
+from matchering.log import Code, ModuleError
+from matchering.utils import make_odd, ms_to_samples, random_str
+
+# --- CONFIGURATION ---
+BLOCK_SIZE = 2 ** 18 # Samples per block in pass 2 (about 6 s at 44.1 kHz)
+RESAMPLE_MAX_DENOMINATOR = 1000 # Precision of the resampling ratio (e.g. playrate 1.05)
+LIMITER_MARGIN_PRECISION = 1e-9 # Residual of the attack filter at the margin of a block
+STREAM_TOLERANCE = 1e-4 # Peak absolute difference to the in-memory path (about -80 dBFS)
+
+
+# --- READING ---
+
+class SourceReader:
+    """Sequential reader of a file (or of a REAPER item's range of it).
+
+    Returns stereo float64 blocks at the internal sample rate: mono files are
+    duplicated and other sample rates (or playrates) are resampled on the fly with
+    resampy, like matchering.check() does. `size` is known before reading, as
+    Matchering needs the piece layout up front.
+    """
+
+    def __init__(self, path, name, config, file_range=None):
+        self.path = path
+        self.name = name
+        try:
+            info = sf.info(path)
+        except RuntimeError:
+            raise ModuleError(Code.ERROR_TARGET_LOADING if name == "target" else Code.ERROR_REFERENCE_LOADING)
+        if info.channels > 2:
+            raise ModuleError(
+                Code.ERROR_TARGET_NUM_OF_CHANNELS_IS_EXCEEDED if name == "target"
+                else Code.ERROR_REFERENCE_NUM_OF_CHANNELS_IS_EXCEEDED
+            )
+
+        offset, length, rate = file_range if file_range else (0.0, 0.0, 1.0)
+        self.start = min(max(0, int(round(offset * info.samplerate))), info.frames)
+        self.frames = info.frames - self.start
+        if length > 0:
+            self.frames = min(self.frames, int(round(length * rate * info.samplerate)))
+
+        ratio = Fraction(config.internal_sample_rate) / Fraction(info.samplerate * rate)
+        ratio = ratio.limit_denominator(RESAMPLE_MAX_DENOMINATOR)
+        self.up, self.down = ratio.numerator, ratio.denominator
+        self.size = self.frames * self.up // self.down # Same length as resampy
+
+        # Input samples of context on both sides of a chunk: covers the interpolation
+        # filter (64 zero crossings in kaiser_best), rounded to whole ratio periods so
+        # that the output grid of every chunk lines up with the one of the whole file.
+        context = 64 * max(self.up, self.down) // self.up + 2
+        self.context = -(-context // self.down) * self.down if self.resampled else 0
+        self.chunk = max(1, BLOCK_SIZE // max(1, self.up)) * self.down
+        self.file = None
+        self.rewind()
+
+    @property
+    def resampled(self):
+        return self.up != self.down
+
+    def rewind(self):
+        """Starts reading from the beginning again."""
+        self.close()
+        self.file = sf.SoundFile(self.path)
+        self.position = 0 # Input frames consumed
+        self.produced = 0 # Output frames returned
+        self.pending = np.zeros((0, 2))
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def _read_input(self, start, count):
+        """Reads `count` input frames from `start` (zeros outside of the range)."""
+        block = np.zeros((count, 2))
+        first, last = max(0, start), min(self.frames, start + count)
+        if last > first:
+            self.file.seek(self.start + first)
+            data = self.file.read(last - first, dtype="float64", always_2d=True)
+            block[first - start:first - start + len(data)] = data if data.shape[1] == 2 else data[:, :1]
+        return block
+
+    def _next_chunk(self):
+        if not self.resampled:
+            chunk = self._read_input(self.position, min(self.chunk, self.frames - self.position))
+            self.position += len(chunk)
+            return chunk
+
+        # A chunk plus context on both sides, resampled, then trimmed back: the
+        # interior equals the resampling of the whole file.
+        padded = self._read_input(self.position - self.context, self.chunk + 2 * self.context)
+        resampled = resampy.resample(padded, self.down, self.up, axis=0)
+        trim = self.context * self.up // self.down
+        self.position += self.chunk
+        return resampled[trim:trim + self.chunk * self.up // self.down]
+
+    def read(self, count):
+        """Returns the next `count` output frames (fewer at the end of the file)."""
+        count = min(count, self.size - self.produced)
+        parts, available = [self.pending], len(self.pending)
+        while available < count:
+            chunk = self._next_chunk()
+            if not len(chunk):
+                break
+            parts.append(chunk)
+            available += len(chunk)
+        data = np.concatenate(parts) if len(parts) > 1 else parts[0]
+        block, self.pending = data[:count], data[count:]
+        self.produced += len(block)
+        return block
+
+
+def to_mid_side(block):
+    """Same arithmetic as matchering.dsp.lr_to_ms()."""
+    mid = (block[:, 0] + block[:, 1]) * 0.5
+    return mid, mid - block[:, 1]
+
+
+# --- PASS 1: ANALYSIS ---
+
+def _piece_spectrum(piece, fft_size):
+    """Summed magnitude spectrum of the fft_size segments of a piece.
+
+    Matches scipy.signal.stft(window="boxcar", noverlap=0, boundary=None,
+    padded=False) as used by Matchering, before the averaging.
+    """
+    segments = len(piece) // fft_size
+    frames = piece[:segments * fft_size].reshape(segments, fft_size)
+    return np.abs(np.fft.rfft(frames, axis=1)).sum(axis=0) / fft_size, segments
+
+
+def analyze(path, name, config, file_range=None, progress=None):
+    """Streaming equivalent of analyze_target() / analyze_reference() of the engine.
+
+    Returns the same dict (the reference entries on top of the target ones), read
+    piece by piece: only one piece of audio is in memory at a time. `progress` is
+    called with the fraction (0-1) of the file analyzed so far.
+    """
+    reader = SourceReader(path, name, config, file_range)
+    try:
+        array_size = reader.size
+        if array_size <= config.fft_size:
+            raise ModuleError(
+                Code.ERROR_TARGET_LENGTH_IS_TOO_SMALL if name == "target"
+                else Code.ERROR_REFERENCE_LENGTH_LENGTH_TOO_SMALL
+            )
+        divisions = int(array_size / config.max_piece_size) + 1
+        piece_size = int(array_size / divisions)
+
+        rmses = np.zeros(divisions)
+        mid_spectra = np.zeros((divisions, config.fft_size // 2 + 1))
+        side_spectra = np.zeros_like(mid_spectra)
+        peak = 0.0
+        segments = 1
+        for i in range(divisions):
+            piece = reader.read(piece_size)
+            peak = max(peak, np.abs(piece).max())
+            mid, side = to_mid_side(piece)
+            rmses[i] = np.sqrt(mid @ mid / piece_size)
+            mid_spectra[i], segments = _piece_spectrum(mid, config.fft_size)
+            side_spectra[i], _ = _piece_spectrum(side, config.fft_size)
+            if progress is not None:
+                progress((i + 1) / divisions)
+        rest = reader.read(array_size)
+        if len(rest):
+            peak = max(peak, np.abs(rest).max())
+    finally:
+        reader.close()
+
+    # Reference normalization (matchering.dsp.normalize with normalize_clipped=False):
+    # dividing the audio by a coefficient divides its RMS and spectra by it as well.
+    coefficient = 1.0
+    if name == "reference" and peak < config.threshold:
+        coefficient = max(config.min_value, peak / config.threshold)
+
+    rmses /= coefficient
+    average_rms = np.sqrt(rmses @ rmses / len(rmses))
+    loudest = rmses >= average_rms
+    loudest_rmses = rmses[loudest]
+    scale = coefficient * np.count_nonzero(loudest) * segments
+    return {
+        "final_amplitude_coefficient": np.float64(coefficient),
+        "match_rms": np.float64(np.sqrt(loudest_rmses @ loudest_rmses / len(loudest_rmses))),
+        "divisions": np.int64(divisions),
+        "piece_size": np.int64(piece_size),
+        "mid_fft": mid_spectra[loudest].sum(axis=0) / scale,
+        "side_fft": side_spectra[loudest].sum(axis=0) / scale,
+        "size": np.int64(array_size),
+    }
+
+
+# --- PASS 2: RENDERING ---
+
+class _TempSignal:
+    """Float32 (frames, 2) signal in a temp file, written and read in blocks.
+
+    Plain file I/O rather than a memory map: mapped pages would count towards the
+    memory of the process as the file is read.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, "w+b")
+        self.frames = 0
+
+    def append(self, block):
+        self.file.seek(0, os.SEEK_END)
+        self.file.write(np.ascontiguousarray(block, dtype=np.float32).tobytes())
+        self.frames += len(block)
+
+    def read(self, start, stop):
+        """Returns frames [start, stop) as float64."""
+        self.file.seek(start * 8)
+        data = np.fromfile(self.file, dtype=np.float32, count=(stop - start) * 2)
+        return data.reshape(-1, 2).astype(np.float64)
+
+    def close(self):
+        self.file.close()
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+
+class _BlockConvolver:
+    """fftconvolve(x, fir, "same") computed block by block (overlap-save)."""
+
+    def __init__(self, fir):
+        self.fir = fir
+        self.history = np.zeros(len(fir) - 1)
+        self.delay = (len(fir) - 1) // 2 # "same" = the full convolution shifted by this
+        self.skipped = 0
+
+    def process(self, block):
+        """Returns the "same" output available after feeding `block`."""
+        data = np.concatenate((self.history, block))
+        self.history = data[len(data) - len(self.history):]
+        output = signal.fftconvolve(data, self.fir, "valid")
+        if self.skipped < self.delay:
+            skip = min(self.delay - self.skipped, len(output))
+            self.skipped += skip
+            output = output[skip:]
+        return output
+
+    def flush(self):
+        """Returns the last `delay` output samples."""
+        return self.process(np.zeros(self.delay))
+
+
+class _StreamingLimiter:
+    """Matchering's Hyrax limiter computed block by block.
+
+    The gain envelope only depends on the neighbourhood of a sample, apart from the
+    hold/release filters which are causal: every block is evaluated over a window
+    extended by a margin on both sides (sliding maxima and the zero-phase attack
+    filter), and the hold/release filter states are carried from block to block.
+    """
+
+    def __init__(self, config, total):
+        self.config = config
+        self.total = total
+        limiter = config.limiter
+        rate = config.internal_sample_rate
+
+        self.attack = ms_to_samples(limiter.attack, rate)
+        self.attack_window = 2 * make_odd(self.attack) - 1
+        coef = math.exp(limiter.attack_filter_coefficient / self.attack)
+        self.attack_b, self.attack_a = [1 - coef], [1, -coef]
+        settle = int(math.ceil(math.log(LIMITER_MARGIN_PRECISION) / math.log(coef)))
+
+        self.hold = ms_to_samples(limiter.hold, rate)
+        self.hold_b, self.hold_a = signal.butter(
+            limiter.hold_filter_order, limiter.hold_filter_coefficient, fs=rate
+        )
+        self.release_b, self.release_a = signal.butter(
+            limiter.release_filter_order, limiter.release_filter_coefficient / limiter.release, fs=rate
+        )
+        self.hold_state = np.zeros(max(len(self.hold_a), len(self.hold_b)) - 1)
+        self.release_state = np.zeros(max(len(self.release_a), len(self.release_b)) - 1)
+
+        self.margin_after = self.attack_window // 2 + settle
+        self.margin_before = self.attack_window // 2 + settle + self.hold
+
+    def _sliding_hold(self, array):
+        """hyrax.__sliding_window_fast(mode="hold"): trailing maximum."""
+        half_window_size = (self.hold - 1) // 2
+        array = np.pad(array, (half_window_size, 0))
+        slided = maximum_filter1d(array, size=self.hold)
+        return slided[:-half_window_size] if half_window_size else slided
+
+    def gain(self, read, start, stop):
+        """Gain of samples [start, stop). `read(a, b)` returns the input frames [a, b)."""
+        config = self.config
+        window_start = max(0, start - self.margin_before)
+        window_stop = min(self.total, stop + self.margin_after)
+        window = read(window_start, window_stop)
+
+        rectified = np.abs(window).max(1)
+        rectified[rectified <= config.threshold] = config.threshold
+        rectified /= config.threshold
+        gain_hard_clip = 1.0 - 1.0 / rectified
+
+        slided = maximum_filter1d(gain_hard_clip, size=self.attack_window)
+        gain_attack = signal.filtfilt(self.attack_b, self.attack_a, slided)
+
+        # The hold window only looks back: everything before `start` is context
+        slided_hold = self._sliding_hold(slided)
+        section = slice(start - window_start, stop - window_start)
+        hold_input = slided_hold[section]
+        hold_output, self.hold_state = signal.lfilter(
+            self.hold_b, self.hold_a, hold_input, zi=self.hold_state
+        )
+        release_output, self.release_state = signal.lfilter(
+            self.release_b, self.release_a, np.maximum(hold_input, hold_output), zi=self.release_state
+        )
+        gain_release = np.maximum(hold_output, release_output)
+
+        envelope = np.maximum.reduce((gain_hard_clip[section], gain_attack[section], gain_release))
+        return 1.0 - envelope
+
+
+def _piece_rmses(mid_side, divisions, piece_size, gain):
+    """RMS of the clipped, amplified mid channel of every piece."""
+    rmses = np.zeros(divisions)
+    for i in range(divisions):
+        mid = np.clip(mid_side.read(i * piece_size, (i + 1) * piece_size)[:, 0] * gain, -1.0, 1.0)
+        rmses[i] = np.sqrt(mid @ mid / piece_size)
+    return rmses
+
+
+def render(target_path, results, target_stats, reference_stats, rms_coefficient, mid_fir, side_fir,
+           config, temp_folder, target_range=None, timings=None, progress=None):
+    """Pass 2: applies the matching to the target block by block and writes `results`.
+
+    `rms_coefficient`, `mid_fir` and `side_fir` come from the analyses (see the
+    engine's matching_filters()). Equivalent of matchering.stages __match_frequencies,
+    __correct_levels and __finalize. If `timings` is a dict, the seconds spent in
+    matching (convolution, level correction) and write (limiter, encoding) are stored.
+    `progress(stage, fraction)` is called with stage "matching" or "write".
+    """
+    timings = {} if timings is None else timings
+    progress = progress or (lambda stage, fraction: None)
+    step_start = time.perf_counter()
+    reader = SourceReader(target_path, "target", config, target_range)
+    total = reader.size
+    mid_side = _TempSignal(os.path.join(temp_folder, f"matchering-stream-{random_str()}.tmp"))
+    writers = []
+    try:
+        # Convolution into the intermediate result (mid, side)
+        mid_convolver, side_convolver = _BlockConvolver(mid_fir), _BlockConvolver(side_fir)
+        peak = 0.0
+
+        def store(mid, side):
+            nonlocal peak
+            count = min(len(mid), total - mid_side.frames)
+            mid, side = mid[:count], side[:count]
+            mid_side.append(np.stack((mid, side), axis=1))
+            peak = max(peak, np.abs(mid + side).max(initial=0.0), np.abs(mid - side).max(initial=0.0))
+
+        while True:
+            block = reader.read(BLOCK_SIZE)
+            if not len(block):
+                break
+            mid, side = to_mid_side(block)
+            store(mid_convolver.process(mid * rms_coefficient), side_convolver.process(side * rms_coefficient))
+            progress("matching", 0.7 * mid_side.frames / total)
+        store(mid_convolver.flush(), side_convolver.flush())
+        reader.close()
+
+        # Level correction: only the gain changes between steps
+        divisions, piece_size = int(target_stats["divisions"]), int(target_stats["piece_size"])
+        reference_match_rms = float(reference_stats["match_rms"])
+        gain = 1.0
+        for step in range(config.rms_correction_steps):
+            rmses = _piece_rmses(mid_side, divisions, piece_size, gain)
+            average_rms = np.sqrt(rmses @ rmses / len(rmses))
+            loudest_rmses = rmses[rmses >= average_rms]
+            match_rms = np.sqrt(loudest_rmses @ loudest_rmses / len(loudest_rmses))
+            gain *= reference_match_rms / max(config.min_value, match_rms)
+            progress("matching", 0.7 + 0.3 * (step + 1) / config.rms_correction_steps)
+
+        timings["matching"] = time.perf_counter() - step_start
+        step_start = time.perf_counter()
+
+        # Finalization (one writer per result)
+        final_amplitude_coefficient = float(reference_stats["final_amplitude_coefficient"])
+        normalize_coefficient = max(config.min_value, peak * gain / config.threshold)
+        limiter = _StreamingLimiter(config, total) if any(r.use_limiter for r in results) else None
+        for required_result in results:
+            writers.append(sf.SoundFile(
+                required_result.file, "w", config.internal_sample_rate, 2, required_result.subtype
+            ))
+
+        def read_lr(start, stop):
+            block = mid_side.read(start, stop)
+            return np.stack((block[:, 0] + block[:, 1], block[:, 0] - block[:, 1]), axis=1) * gain
+
+        for start in range(0, total, BLOCK_SIZE):
+            stop = min(total, start + BLOCK_SIZE)
+            result_no_limiter = read_lr(start, stop)
+            limited = None
+            if limiter is not None:
+                limited = result_no_limiter * limiter.gain(read_lr, start, stop)[:, None]
+                limited *= final_amplitude_coefficient
+            for required_result, writer in zip(results, writers):
+                if required_result.use_limiter:
+                    writer.write(limited)
+                elif required_result.normalize:
+                    writer.write(result_no_limiter / normalize_coefficient)
+                else:
+                    writer.write(result_no_limiter)
+            progress("write", stop / total)
+        timings["write"] = time.perf_counter() - step_start
+    finally:
+        reader.close()
+        for writer in writers:
+            writer.close()
+        mid_side.close()
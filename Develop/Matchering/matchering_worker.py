@@ -1,19 +1,42 @@
 # --- SCRIPT METADATA (FOR REAPACK/DOCUMENTATION) ---
 # @description    Matchering 2.0 Worker (Python Subprocess)
 # @author         Hosi
-# @version        1.0
+# @version        1.10
 # @reaper_version 6.12+ (Requires `reaper_python` environment)
 # @extensions     SWS/ReaPack (Python script support)
+# @provides
+#   [nomain] matchering_engine.py
+#   [nomain] matchering_stream.py
+#   [nomain] matchering_bench.py
 # @about
 #   # Matchering 2.0 Worker
 #   This Python script is designed to be called non-interactively by the Matchering 2.0 Lua GUI.
 #   It handles the external execution of the `matchering-cli` subprocess in a non-blocking way,
 #   using REAPER's ExtState for communication and RPR_defer for process status polling.
 #
+#   By default the subprocess is `matchering_engine.py` (shipped with this script), a drop-in
+#   replacement for `mg_cli.py` that runs Matchering through its library API and caches the
+#   analysis of every file, so a shared Reference/Target is analyzed once. The engine is started
+#   once as a daemon and fed with jobs over a local socket; it exits after an idle timeout.
+#   Long targets (podcasts, DJ mixes) are processed in two streaming passes with bounded memory.
+#   A job can deliver several variants of the same master (bit depths, limiter on/off, normalized
+#   or not, "Variants" setting): they share one analysis and one matching pass, are written in
+#   parallel, and each one is only imported into the project if asked for.
+#
 #   **DO NOT RUN THIS SCRIPT MANUALLY.**
 #
 # @changelog
 #   + v1.0 (2025-11-12) - Initial release with non-blocking Popen and ExtState communication.
+#   + v1.1 (2026-10-17) - Pool mode: runs the whole job list concurrently (N = CPU cores by default).
+#   + v1.2 (2026-10-17) - Uses matchering_engine.py (library API + persistent analysis cache) instead of mg_cli.py.
+#   + v1.3 (2026-10-17) - Jobs are fed to a long-lived engine daemon (no per-job Python/NumPy startup), per-job timings.
+#   + v1.4 (2026-10-17) - Result manifest: identical inputs re-import the existing master, changed inputs always re-render. "Prune" mode.
+#   + v1.5 (2026-10-17) - Item ranges: only the used part of each source (offset, length, playrate) is decoded and processed.
+#   + v1.6 (2026-10-17) - Streaming mode: targets longer than 10 minutes are processed with bounded memory (STREAM_MODE).
+#   + v1.7 (2026-10-17) - Event-driven status: jobs are watched by background threads, ExtState is only written on changes (rate-limited), with stage, percent and ETA.
+#   + v1.8 (2026-10-17) - Batch import: finished masters are inserted together through the track/item API, in one undo step without intermediate redraws.
+#   + v1.9 (2026-10-17) - Output variants: one job renders several bit depths / limiter settings from a single analysis, import optional per variant.
+#   + v1.10 (2026-10-17) - The engine helpers are marked @noindex and installed with this package (matchering_bench.py included).
 #
 # --- END SCRIPT METADATA ---
 
@@ -22,9 +45,16 @@
 # It reads Target/Reference paths from ExtState and runs the process.
 
 
+import abc
 import os
 import sys
+import glob
+import hashlib
+import json
+import queue
+import socket
 import subprocess
+import threading
 import time
 import re # Import regex for cleaning filenames
 
@@ -43,17 +73,84 @@ except ImportError:
     def RPR_InsertMedia(file_path, mode): return None
     def RPR_UpdateArrange(): pass
     def RPR_defer(func_name_str): pass
+    def RPR_CountMediaItems(proj): return 0
+    def RPR_GetMediaItem(proj, idx): return None
+    def RPR_GetActiveTake(item): return None
+    def RPR_GetMediaItemTake_Source(take): return None
+    def RPR_GetMediaSourceFileName(source, buf, buf_sz): return None, "", 0
+    def RPR_PreventUIRefresh(prevent_count): pass
+    def RPR_Undo_BeginBlock2(proj): pass
+    def RPR_Undo_EndBlock2(proj, desc, extraflags): pass
+    def RPR_SelectAllMediaItems(proj, selected): pass
+    def RPR_CountTracks(proj): return 0
+    def RPR_InsertTrackAtIndex(idx, want_defaults): pass
+    def RPR_GetTrack(proj, idx): return None
+    def RPR_AddMediaItemToTrack(track): return None
+    def RPR_AddTakeToMediaItem(item): return None
+    def RPR_PCM_Source_CreateFromFile(filename): return None
+    def RPR_SetMediaItemTake_Source(take, source): return False
+    def RPR_GetMediaSourceLength(source, length_is_qn): return 0.0, source, False
+    def RPR_SetMediaItemInfo_Value(item, parm, value): return False
+    def RPR_SetMediaItemSelected(item, selected): pass
+    def RPR_GetSetMediaItemTakeInfo_String(take, parm, value, set_new): return False, take, parm, value, set_new
+    def RPR_TrackList_AdjustWindows(is_minor): pass
+
+# --- Folder of this script (matchering_engine.py is shipped next to it) ---
+try:
+    SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+except NameError:
+    SCRIPT_DIR = os.path.dirname(os.path.abspath(sys.argv[0])) if sys.argv and sys.argv[0] else os.getcwd()
 
 # --- USER CONFIGURATION BLOCK ---
 PATH_TO_VENV_PYTHON = r"C:\vpy\matchering_venv\Scripts\python.exe"
 PATH_TO_MG_CLI = r"C:\vpy\matchering-cli\mg_cli.py"
+PATH_TO_MG_ENGINE = os.path.join(SCRIPT_DIR, "matchering_engine.py")
+USE_MG_ENGINE = True # False = call mg_cli.py (no analysis cache)
+ANALYSIS_CACHE_DIR = "" # "" = engine default (~/.hosi_matchering_cache)
+USE_MG_DAEMON = True # Feed jobs to one long-lived engine process (requires USE_MG_ENGINE)
+DAEMON_IDLE_TIMEOUT = 300 # Seconds without jobs before the engine daemon exits
+DAEMON_START_TIMEOUT = 60 # Seconds to wait for a new daemon to come up
 # DEFAULT_BIT_DEPTH = "-b24" # REMOVED (Now read from GUI)
 OUTPUT_SUBFOLDER = "Matchering_Masters"
+RESULT_MANIFEST_NAME = ".matchering_manifest.json" # Inside OUTPUT_SUBFOLDER
+OUTPUT_VARIANTS = "" # Outputs per job, e.g. "24, 16:noimport, 24:nolimiter" ("" = the GUI bit depth; GUI "Variants" overrides)
+MAX_PARALLEL_JOBS = 0 # Pool mode: 0 = one job per CPU core (GUI "MaxJobs" overrides)
+STREAM_MODE = "auto" # Engine: "auto" = stream long targets with bounded memory, "on" = always, "off" = never
+BATCH_IMPORT = True # Import finished masters together, through the track/item API (False = one action-based import per job)
+IMPORT_BATCH_INTERVAL = 1.0 # Pool mode: seconds a finished master may wait for others before it is imported
+STATUS_MIN_INTERVAL = 0.25 # Seconds between two progress updates sent to the GUI
+CANCEL_CHECK_INTERVAL = 0.25 # Seconds between two reads of the GUI's Cancel command
 # --- END CONFIGURATION BLOCK ---
 
 # --- Global variables for the process ---
 g_process = None
-g_result_path = None
+g_outputs = [] # Outputs of the current job (see prepare_outputs)
+g_inputs = None # (target path, reference path, target range, reference range) of the current job
+
+# --- Global variables for the engine daemon ---
+g_daemon_process = None # Popen of the daemon started by this worker
+g_daemon_state = None # {"port", "pid", "token"} of a daemon that answered a ping
+g_daemon_start_time = 0
+g_daemon_lock = threading.Lock() # ensure_daemon() is called from the job watcher threads
+
+# --- Global variables for Pool mode ---
+g_pool_jobs = [] # List of job dicts (see parse_job_list)
+g_pool_max_parallel = 1
+g_pool_variants = [] # Output variants of every Pool job (see parse_variants)
+
+# --- Global variables for the batch import ---
+g_pending_imports = [] # Pool jobs whose master is waiting for the next batch import
+g_pending_since = 0
+
+# --- Global variables for the job watchers ---
+g_events = queue.Queue() # (handle, event dict) posted by the watcher threads
+g_last_cancel_check = 0
+
+# --- Global variables for the result manifest (prepared off the main thread) ---
+g_manifest_lock = threading.Lock() # Serializes the manifest's read-modify-write cycles
+g_digest_locks = {} # Memo key: Lock, so jobs sharing a file hash it once
+g_digest_memo = {} # Memo key: SHA-256 computed by this run
+g_digest_guard = threading.Lock() # Protects g_digest_locks
 
 # --- Helper Functions ---
 def log(msg):
@@ -61,10 +158,93 @@ def log(msg):
     # RPR_ShowConsoleMsg(str(msg) + "\n") # --- CONSOLE OFF ---
     pass # Do nothing
 
+class StatusChannel:
+    """Coalescing, rate-limited writer of the worker's ExtState keys.
+
+    A value is only written when it changed, and progress updates are written at
+    most every STATUS_MIN_INTERVAL seconds (the newest value of every key wins).
+    Immediate updates (results, errors) are written right away.
+    """
+
+    def __init__(self, min_interval=STATUS_MIN_INTERVAL):
+        self.min_interval = min_interval
+        self.published = {} # Key: value last written
+        self.pending = {} # Key: newest value not written yet
+        self.last_write = 0
+
+    def publish(self, key, value, immediate=False):
+        if immediate:
+            self.pending.pop(key, None)
+            self._write(key, value)
+            return
+        if self.published.get(key) == value:
+            self.pending.pop(key, None)
+        else:
+            self.pending[key] = value
+        self.flush()
+
+    def flush(self, force=False):
+        """Writes the pending values if the rate limit allows it (or if forced)."""
+        if not self.pending or (not force and time.time() - self.last_write < self.min_interval):
+            return
+        pending, self.pending = self.pending, {}
+        for key, value in pending.items():
+            self._write(key, value)
+        self.last_write = time.time()
+
+    def _write(self, key, value):
+        RPR_SetExtState("MatcheringWorker", key, value, False)
+        self.published[key] = value
+
+g_status = StatusChannel()
+
 def set_status(status_msg):
     """Sends status back to the Lua GUI."""
-    RPR_SetExtState("MatcheringWorker", "Status", status_msg, False)
-        
+    g_status.publish("Status", status_msg, immediate=True)
+
+def set_job_status(job_index, status_msg):
+    """Sends the status of one Pool job back to the Lua GUI (key: Status_<index>)."""
+    g_status.publish(f"Status_{job_index}", status_msg, immediate=True)
+
+def format_duration(seconds):
+    return f"{int(seconds) // 60}:{int(seconds) % 60:02d}"
+
+def publish_progress(handle, status_key, info_key):
+    """Publishes the progress of a running job (rate-limited).
+
+    `status_key` gets a readable line ("Running... Matching 45% (ETA 0:12)"),
+    `info_key` the structured values: "stage=matching;percent=45;elapsed=9.8;eta=12.0".
+    """
+    progress = handle.progress
+    if not progress:
+        return
+    elapsed = time.time() - handle.started
+    percent = progress["percent"]
+    eta = elapsed * (100 - percent) / percent if percent > 0 else -1
+    text = f"Running... {progress['label']} {percent}%"
+    if eta >= 0:
+        text += f" (ETA {format_duration(eta)})"
+    g_status.publish(status_key, text)
+    g_status.publish(info_key, f"stage={progress['stage']};percent={percent};elapsed={elapsed:.1f};eta={eta:.1f}")
+
+def cancel_requested():
+    """Reads the GUI's Cancel command, at most every CANCEL_CHECK_INTERVAL seconds."""
+    global g_last_cancel_check
+    now = time.time()
+    if now - g_last_cancel_check < CANCEL_CHECK_INTERVAL:
+        return False
+    g_last_cancel_check = now
+    return RPR_GetExtState("MatcheringWorker", "Command") == "Cancel"
+
+def drain_events():
+    """Returns the events posted by the job watchers since the last call."""
+    events = []
+    while True:
+        try:
+            events.append(g_events.get_nowait())
+        except queue.Empty:
+            return events
+
 def get_project_path():
     """Gets the current project path."""
     (project_path_buf, buf_size) = RPR_GetProjectPath("", 4096)
@@ -73,8 +253,481 @@ def get_project_path():
         return None
     return project_path_buf
 
-def finalize_import(result_path):
-    """Imports the resulting file into REAPER."""
+def get_output_dir():
+    """Returns (creating it if needed) the output folder inside the project, or None."""
+    project_path_buf = get_project_path()
+    if not project_path_buf:
+        set_status("Error: Could not get project path. Please save project.")
+        log("Error: Could not get project path from worker.")
+        return None
+
+    output_dir = os.path.join(project_path_buf, OUTPUT_SUBFOLDER)
+    if not os.path.exists(output_dir):
+        try:
+            os.makedirs(output_dir)
+        except OSError as e:
+            set_status(f"Error: Could not create output directory: {e}")
+            log(f"Error: Could not create output directory: {e}")
+            return None
+    return output_dir
+
+def build_result_path(output_dir, target_path, ref_name, suffix=""):
+    """Builds the result path: <target>_mastered_REF_<reference>[_<suffix>].wav (Idea 1, Dynamic Naming)."""
+    # Clean filenames to be safe
+    target_filename_base = os.path.splitext(os.path.basename(target_path))[0]
+    ref_filename_base = os.path.splitext(os.path.basename(ref_name))[0]
+    # Remove characters that are bad for filenames
+    target_filename_base = re.sub(r'[\\/*?:"<>|]', "", target_filename_base)
+    ref_filename_base = re.sub(r'[\\/*?:"<>|]', "", ref_filename_base)
+
+    result_name = f"{target_filename_base}_mastered_REF_{ref_filename_base}"
+    if suffix:
+        result_name += f"_{suffix}"
+    return os.path.join(output_dir, result_name + ".wav")
+
+def format_range(file_range):
+    """(offset, length, playrate) -> "OFFSET:LENGTH:PLAYRATE" (engine argument)."""
+    return ":".join(repr(float(v)) for v in file_range)
+
+def read_item_range(prefix):
+    """Reads <prefix>Offset / <prefix>Length / <prefix>Playrate from ExtState.
+
+    Returns (offset, length, playrate) in REAPER item units, or None when the whole
+    source is used (nothing sent, or offset 0, length 0 and playrate 1).
+    """
+    try:
+        offset = float(RPR_GetExtState("MatcheringWorker", prefix + "Offset") or 0)
+        length = float(RPR_GetExtState("MatcheringWorker", prefix + "Length") or 0)
+        rate = float(RPR_GetExtState("MatcheringWorker", prefix + "Playrate") or 1)
+    except ValueError:
+        return None
+    return parse_range_fields(offset, length, rate)
+
+def parse_range_fields(offset, length, rate):
+    """Normalizes an item range; None means "whole file"."""
+    offset, length, rate = float(offset or 0), float(length or 0), float(rate or 1)
+    if rate <= 0:
+        rate = 1.0
+    if offset == 0 and length == 0 and rate == 1:
+        return None
+    return (offset, length, rate)
+
+def parse_variants(text, bit_depth="-b24"):
+    """Parses an output variant list such as "24, 16:noimport, 24:nolimiter:nonormalize".
+
+    Every variant is a bit depth (16, 24 or 32; "-b24" works too) followed by options:
+    "nolimiter", "nonormalize" (only with "nolimiter", as in Matchering) and "noimport"
+    (rendered, but not inserted into the project). An empty list means one imported
+    master at `bit_depth`. Returns a list of variant dicts; raises ValueError.
+    """
+    variants = []
+    for spec in (text or "").replace(";", ",").split(","):
+        fields = [field.strip().lower() for field in spec.split(":")]
+        if not fields[0]:
+            continue
+        bit = fields[0].lstrip("-b")
+        if bit not in ("16", "24", "32"):
+            raise ValueError(f"Invalid bit depth in variant '{spec.strip()}' (16, 24 or 32).")
+        unknown = set(fields[1:]) - {"nolimiter", "nonormalize", "noimport"}
+        if unknown:
+            raise ValueError(f"Unknown option in variant '{spec.strip()}': {', '.join(sorted(unknown))}.")
+        limiter = "nolimiter" not in fields
+        variant = {
+            "bit_depth": f"-b{bit}",
+            "limiter": limiter,
+            "normalize": limiter or "nonormalize" not in fields,
+            "import": "noimport" not in fields,
+        }
+        same = next((v for v in variants if variant_spec(v) == variant_spec(variant)), None)
+        if same:
+            same["import"] = same["import"] or variant["import"] # Listed twice: rendered once
+        else:
+            variants.append(variant)
+    return variants or [{"bit_depth": bit_depth, "limiter": True, "normalize": True, "import": True}]
+
+def read_variants():
+    """Output variants of the current run: GUI "Variants" > OUTPUT_VARIANTS > GUI "BitDepth"."""
+    bit_depth = RPR_GetExtState("MatcheringWorker", "BitDepth")
+    if not bit_depth:
+        bit_depth = "-b24" # Fallback just in case
+        log("Warning: Bit depth not received from GUI, defaulting to -b24.")
+    return parse_variants(RPR_GetExtState("MatcheringWorker", "Variants") or OUTPUT_VARIANTS, bit_depth)
+
+def variant_spec(variant):
+    """"-b24", "-b24:nolimiter" or "-b24:nolimiter:nonormalize" (without the import flag)."""
+    spec = variant["bit_depth"]
+    if not variant["limiter"]:
+        spec += ":nolimiter" if variant["normalize"] else ":nolimiter:nonormalize"
+    return spec
+
+def variant_label(variant):
+    """File name part of a variant: "24bit", "16bit_nolimiter", ..."""
+    label = variant["bit_depth"][len("-b"):] + "bit"
+    if not variant["limiter"]:
+        label += "_nolimiter" if variant["normalize"] else "_nolimiter_nonormalize"
+    return label
+
+def variant_flags(variant):
+    """mg_cli.py / engine options of one variant: ["-b16", "--no_limiter", ...]."""
+    flags = [variant["bit_depth"]]
+    if not variant["limiter"]:
+        flags.append("--no_limiter")
+        if not variant["normalize"]:
+            flags.append("--dont_normalize")
+    return flags
+
+def build_command(outputs, target_path, ref_path, target_range=None, reference_range=None):
+    """Builds the engine (or matchering-cli) command lines of one job's outputs.
+
+    The engine renders every output in one run (--variant); mg_cli.py renders one
+    result per run, so it gets one command per output, run one after the other.
+    """
+    if not USE_MG_ENGINE:
+        if target_range or reference_range:
+            log("Warning: mg_cli.py does not support item ranges, the whole files are processed.")
+        return [
+            [PATH_TO_VENV_PYTHON, "-X", "utf8", PATH_TO_MG_CLI] + variant_flags(output["variant"])
+            + [target_path, ref_path, output["result_path"]]
+            for output in outputs
+        ]
+
+    command_list = [PATH_TO_VENV_PYTHON, "-X", "utf8", PATH_TO_MG_ENGINE] + variant_flags(outputs[0]["variant"])
+    for output in outputs[1:]:
+        command_list += ["--variant", variant_spec(output["variant"])[len("-b"):], output["result_path"]]
+    if ANALYSIS_CACHE_DIR:
+        command_list += ["--cache-dir", ANALYSIS_CACHE_DIR]
+    if STREAM_MODE != "auto":
+        command_list += ["--stream", STREAM_MODE]
+    if target_range:
+        command_list += ["--target-range", format_range(target_range)]
+    if reference_range:
+        command_list += ["--reference-range", format_range(reference_range)]
+    return [command_list + [target_path, ref_path, outputs[0]["result_path"]]]
+
+def set_timings(key, timings):
+    """Publishes per-job timings (seconds) for the GUI, e.g. Timings_3 = "queue_wait=0.01;..."."""
+    if not timings:
+        return
+    text = ";".join(f"{name}={value:.3f}" for name, value in timings.items())
+    RPR_SetExtState("MatcheringWorker", key, text, False)
+    log(f"Worker: {key}: {text}")
+
+# --- Engine Daemon Client ---
+
+def get_engine_cache_dir():
+    """Folder of the engine's analysis cache (and of its daemon.json)."""
+    return ANALYSIS_CACHE_DIR or os.path.join(os.path.expanduser("~"), ".hosi_matchering_cache")
+
+def read_daemon_state():
+    """Reads daemon.json written by a running daemon, or returns None."""
+    try:
+        with open(os.path.join(get_engine_cache_dir(), "daemon.json"), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def daemon_request(state, message, timeout=2.0):
+    """Sends one short request to the daemon and returns its reply (dict), or None."""
+    message = dict(message, token=state.get("token"))
+    try:
+        with socket.create_connection(("127.0.0.1", int(state["port"])), timeout=timeout) as sock:
+            sock.sendall((json.dumps(message) + "\n").encode("utf-8"))
+            reply = sock.makefile("rb").readline()
+        return json.loads(reply.decode("utf-8")) if reply else None
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+def ensure_daemon(workers):
+    """Returns the state of a live daemon, or None while one is being started."""
+    global g_daemon_process, g_daemon_state, g_daemon_start_time
+
+    if g_daemon_state is not None:
+        return g_daemon_state
+
+    state = read_daemon_state()
+    pong = daemon_request(state, {"op": "ping"}, timeout=0.5) if state else None
+    if pong:
+        if int(pong.get("workers", 0)) < workers:
+            # Started by a smaller run (e.g. a single job): grow its pool, or the batch runs one job at a time
+            if not daemon_request(state, {"op": "resize", "workers": workers}):
+                log(f"Worker: Could not resize the engine daemon to {workers} worker(s).")
+        g_daemon_state = state
+        return state
+
+    if g_daemon_process is None or g_daemon_process.poll() is not None:
+        command_list = [
+            PATH_TO_VENV_PYTHON, "-X", "utf8", PATH_TO_MG_ENGINE, "serve",
+            "--workers", str(workers), "--idle-timeout", str(DAEMON_IDLE_TIMEOUT),
+            "--cache-dir", get_engine_cache_dir()
+        ]
+        g_daemon_process = launch_process(command_list)
+        g_daemon_start_time = time.time()
+        log(f"Worker: Started engine daemon (PID: {g_daemon_process.pid}).")
+    return None
+
+def cancel_daemon():
+    """Kills the daemon's running jobs and the daemon itself."""
+    global g_daemon_process, g_daemon_state
+    with g_daemon_lock:
+        state = g_daemon_state or read_daemon_state()
+        if state:
+            daemon_request(state, {"op": "cancel"})
+        if g_daemon_process is not None and g_daemon_process.poll() is None:
+            try:
+                g_daemon_process.kill()
+            except Exception as e:
+                log(f"Worker: Error while killing daemon: {e}")
+        g_daemon_process = None
+        g_daemon_state = None
+
+# Matchering's own messages (mg_cli.py output): text, stage, label, overall percent
+MATCHERING_STAGES = [
+    ("Loading and analysis", "analysis", "Analysis", 5),
+    ("Matching levels", "matching", "Matching levels", 30),
+    ("Matching frequencies", "matching", "Matching frequencies", 40),
+    ("Correcting levels", "matching", "Correcting levels", 60),
+    ("Final processing and saving", "write", "Finalizing", 75),
+    ("Exporting various audio formats", "write", "Exporting", 95),
+]
+
+def parse_progress_line(line):
+    """Returns the progress dict described by one output line, or None.
+
+    Understands the engine's `@progress {json}` lines and Matchering's stage messages.
+    """
+    line = line.strip()
+    if line.startswith("@progress "):
+        try:
+            message = json.loads(line[len("@progress "):])
+            return {"stage": message["stage"], "label": message["label"], "percent": int(message["percent"])}
+        except (ValueError, KeyError, TypeError):
+            return None
+    for text, stage, label, percent in MATCHERING_STAGES:
+        if text in line:
+            return {"stage": stage, "label": label, "percent": percent}
+    return None
+
+class JobHandle(abc.ABC):
+    """Popen-like handle (poll/kill/pid) of one job, watched by a background thread.
+
+    The thread posts "progress" and "done" events to g_events; the poll loops on the
+    REAPER main thread only drain that queue. REAPER API calls stay on the main thread.
+    """
+
+    def __init__(self):
+        self.returncode = None
+        self.error = ""
+        self.timings = {}
+        self.pid = 0
+        self.progress = None # Last {"stage", "label", "percent"}
+        self.started = time.time()
+        self.cancelled = False
+
+    def start(self):
+        threading.Thread(target=self._watch, daemon=True).start()
+        return self
+
+    @abc.abstractmethod
+    def _watch(self):
+        """Runs on the watcher thread until the job ends."""
+
+    def _post_progress(self, progress):
+        if progress and progress != self.progress and not self.cancelled:
+            self.progress = progress
+            g_events.put((self, {"event": "progress"}))
+
+    def _post_done(self, returncode, error="", timings=None):
+        if self.returncode is not None or self.cancelled:
+            return
+        self.timings = timings or {}
+        self.error = error
+        self.returncode = returncode
+        g_events.put((self, {"event": "done"}))
+
+    def poll(self):
+        """Returns None while the job runs, then the return code (0 = success)."""
+        return self.returncode
+
+class ProcessJobHandle(JobHandle):
+    """Engine (or matchering-cli) subprocesses, run one after the other; their output is read by the watcher."""
+
+    def __init__(self, command_lists):
+        super().__init__()
+        self.commands = list(command_lists)
+        self.lock = threading.Lock() # kill() vs. the launch of the next variant
+        self.process = launch_process(self.commands.pop(0), capture_output=True)
+        self.pid = self.process.pid
+
+    def _watch(self):
+        while True:
+            last_error = ""
+            structured = False # The engine's @progress lines supersede Matchering's messages
+            for line in self.process.stdout:
+                if line.startswith("Error:"):
+                    last_error = line.strip()[len("Error:"):].strip()
+                structured = structured or line.startswith("@progress ")
+                if structured and not line.startswith("@progress "):
+                    continue
+                self._post_progress(parse_progress_line(line))
+            returncode = self.process.wait()
+            with self.lock:
+                if returncode != 0 or not self.commands or self.cancelled:
+                    break
+                self.process = launch_process(self.commands.pop(0), capture_output=True) # Next mg_cli.py variant
+                self.pid = self.process.pid
+        self._post_done(returncode, last_error)
+
+    def kill(self):
+        with self.lock:
+            self.cancelled = True
+            self.process.kill()
+
+class DaemonJobHandle(JobHandle):
+    """One job sent to the engine daemon; the watcher reads the daemon's replies."""
+
+    def __init__(self, request, workers):
+        super().__init__()
+        self.request = request
+        self.workers = workers
+        self.sock = None
+
+    def _connect(self):
+        """Returns a socket with the job sent, starting the daemon if needed."""
+        global g_daemon_state
+        while not self.cancelled:
+            with g_daemon_lock:
+                state = ensure_daemon(self.workers)
+                start_time = g_daemon_start_time
+            if state is None:
+                if time.time() - max(self.started, start_time) > DAEMON_START_TIMEOUT:
+                    raise OSError("Engine daemon did not start.")
+                time.sleep(0.2)
+                continue
+            try:
+                sock = socket.create_connection(("127.0.0.1", int(state["port"])), timeout=2.0)
+                sock.sendall((json.dumps(dict(self.request, token=state["token"])) + "\n").encode("utf-8"))
+                sock.settimeout(None) # The watcher waits for as long as the job runs
+                self.pid = state.get("pid", 0)
+                return sock
+            except OSError as e:
+                with g_daemon_lock:
+                    g_daemon_state = None # Stale daemon.json: start a new daemon
+                log(f"Worker: Could not reach the engine daemon: {e}")
+                time.sleep(0.2)
+        return None
+
+    def _watch(self):
+        try:
+            self.sock = self._connect()
+            if self.sock is None:
+                return
+            for line in self.sock.makefile("rb"):
+                try:
+                    message = json.loads(line.decode("utf-8"))
+                except ValueError:
+                    continue
+                event = message.get("event")
+                if event == "progress":
+                    self._post_progress({k: message.get(k) for k in ("stage", "label", "percent")})
+                elif event == "done":
+                    self._post_done(int(message.get("code", 1)), message.get("error", ""), message.get("timings"))
+                    return
+                elif event == "error":
+                    self._post_done(1, message.get("error", ""))
+                    return
+            self._post_done(1, "The engine daemon closed the connection.")
+        except OSError as e:
+            self._post_done(1, f"Lost connection to the engine daemon: {e}")
+        finally:
+            if self.sock is not None:
+                self.sock.close()
+
+    def kill(self):
+        """Cancels the job (the daemon and all of its running jobs are killed)."""
+        self.cancelled = True
+        cancel_daemon()
+
+class PrepareTask(JobHandle):
+    """Runs prepare_outputs() (input hashing, manifest keys) on a background thread.
+
+    Posts a "prepared" event; then `outputs` holds the job's outputs, or `error` why
+    the inputs could not be read. Killing it only discards the result.
+    """
+
+    def __init__(self, output_dir, target_path, ref_path, ref_name, variants, target_range=None, reference_range=None):
+        super().__init__()
+        self.args = (output_dir, target_path, ref_path, ref_name, variants, target_range, reference_range)
+        self.outputs = None
+
+    def _watch(self):
+        try:
+            self.outputs = prepare_outputs(*self.args)
+        except OSError as e:
+            self.error = f"Could not read input file: {e}"
+        if not self.cancelled:
+            g_events.put((self, {"event": "prepared"}))
+
+    def kill(self):
+        self.cancelled = True
+
+def launch_job(outputs, target_path, ref_path, workers=1, target_range=None, reference_range=None):
+    """Starts one job rendering `outputs`: on the engine daemon, or as a subprocess. Returns a JobHandle."""
+    if USE_MG_ENGINE and USE_MG_DAEMON:
+        request = {
+            "op": "job",
+            "target": target_path, "reference": ref_path,
+            "variants": [{
+                "result": output["result_path"],
+                "bit": int(output["variant"]["bit_depth"][len("-b"):]),
+                "no_limiter": not output["variant"]["limiter"],
+                "dont_normalize": not output["variant"]["normalize"],
+            } for output in outputs],
+            "target_range": target_range, "reference_range": reference_range,
+            "stream": STREAM_MODE,
+        }
+        return DaemonJobHandle(request, workers).start()
+    return ProcessJobHandle(build_command(outputs, target_path, ref_path, target_range, reference_range)).start()
+
+def launch_process(command_list, capture_output=False):
+    """Starts one matchering-cli subprocess (no console window on Windows)."""
+    log("Worker building command: " + " ".join(f'"{c}"' for c in command_list))
+
+    my_env = os.environ.copy()
+    my_env["PYTHONIOENCODING"] = "utf-8"
+    creation_flags = 0
+    if sys.platform == "win32":
+        creation_flags = subprocess.CREATE_NO_WINDOW
+
+    if not capture_output:
+        return subprocess.Popen(
+            command_list,
+            env=my_env,
+            creationflags=creation_flags
+        )
+    return subprocess.Popen(
+        command_list,
+        env=my_env,
+        creationflags=creation_flags,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        encoding="utf-8",
+        errors="replace",
+    )
+
+def import_outputs(outputs):
+    """Inserts the files of the outputs whose variant is imported, each on a new track.
+
+    Returns the list of success flags (one per imported output).
+    """
+    result_paths = [output["result_path"] for output in outputs if output["variant"]["import"]]
+    if not result_paths:
+        return []
+    if BATCH_IMPORT:
+        return import_results(result_paths)
+    return [import_result_with_actions(result_path) for result_path in result_paths]
+
+def import_result_with_actions(result_path):
+    """Legacy import: actions + InsertMedia (one undo point and redraw per file)."""
     log(f"Importing mastered file from: {result_path}")
 
     RPR_Main_OnCommandEx(40297, 0, 0) # Item: Unselect all items
@@ -84,28 +737,306 @@ def finalize_import(result_path):
 
     if not new_item:
         log(f"Matchering succeeded, but failed to import result file: {result_path}")
+        return False
+
+    log("Done! Mastered file added on a new track.")
+    RPR_UpdateArrange()
+    return True
+
+def insert_result_item(result_path, track_index):
+    """Inserts one file as an item at the project start on a new track. Returns the item or None."""
+    source = RPR_PCM_Source_CreateFromFile(result_path)
+    if not source:
+        return None
+    RPR_InsertTrackAtIndex(track_index, True)
+    track = RPR_GetTrack(0, track_index)
+    item = RPR_AddMediaItemToTrack(track) if track else None
+    take = RPR_AddTakeToMediaItem(item) if item else None
+    if not take:
+        return None
+    RPR_SetMediaItemTake_Source(take, source)
+    RPR_GetSetMediaItemTakeInfo_String(take, "P_NAME", os.path.basename(result_path), True)
+    RPR_SetMediaItemInfo_Value(item, "D_POSITION", 0.0)
+    RPR_SetMediaItemInfo_Value(item, "D_LENGTH", RPR_GetMediaSourceLength(source, False)[0])
+    RPR_SetMediaItemSelected(item, True)
+    return item
+
+def import_results(result_paths):
+    """Inserts several files, each on a new track, as one operation.
+
+    The tracks and items are created through the API inside PreventUIRefresh and a
+    single undo block, so REAPER redraws once for the whole batch. Returns the list
+    of success flags and publishes the main-thread stall in "ImportStall".
+    """
+    start = time.perf_counter()
+    results = []
+    RPR_PreventUIRefresh(1)
+    RPR_Undo_BeginBlock2(0)
+    try:
+        RPR_SelectAllMediaItems(0, False)
+        for result_path in result_paths:
+            log(f"Importing mastered file from: {result_path}")
+            item = insert_result_item(result_path, RPR_CountTracks(0))
+            if not item:
+                log(f"Matchering succeeded, but failed to import result file: {result_path}")
+            results.append(bool(item))
+    finally:
+        RPR_Undo_EndBlock2(0, f"Matchering: Import {len(result_paths)} mastered file(s)", -1)
+        RPR_PreventUIRefresh(-1)
+        RPR_TrackList_AdjustWindows(False)
+        RPR_UpdateArrange()
+
+    stall = time.perf_counter() - start
+    RPR_SetExtState(
+        "MatcheringWorker", "ImportStall",
+        f"files={len(result_paths)};total={stall:.4f};per_file={stall / max(1, len(result_paths)):.4f}", False
+    )
+    log(f"Done! {sum(results)} mastered file(s) added on new tracks in {stall * 1000:.1f} ms.")
+    return results
+
+def finalize_import(outputs, timings=None):
+    """Imports the resulting files into REAPER (and publishes the timings with their stall)."""
+    start = time.perf_counter()
+    imported = all(import_outputs(outputs))
+    set_timings("Timings", dict(timings or {}, **{"import": time.perf_counter() - start}))
+    if not imported:
         set_status("Error: Succeeded, but failed to import file.")
     else:
-        log("Done! Mastered file added on a new track.")
-        RPR_UpdateArrange()
         set_status("Done")
 
+# --- Result Cache (Manifest in OUTPUT_SUBFOLDER) ---
+
+g_matchering_version = None
+
+def get_matchering_version():
+    """Matchering version installed in the venv (read from its dist-info, no subprocess)."""
+    global g_matchering_version
+    if g_matchering_version is None:
+        venv_dir = os.path.dirname(os.path.dirname(PATH_TO_VENV_PYTHON)) # .../Scripts/python.exe -> venv
+        patterns = [
+            os.path.join(venv_dir, "Lib", "site-packages", "matchering-*.dist-info"), # Windows
+            os.path.join(venv_dir, "lib", "python*", "site-packages", "matchering-*.dist-info"), # macOS/Linux
+        ]
+        found = [path for pattern in patterns for path in glob.glob(pattern)]
+        if found:
+            g_matchering_version = os.path.basename(found[0])[len("matchering-"):-len(".dist-info")]
+        else:
+            g_matchering_version = "unknown"
+    return g_matchering_version
+
+def load_manifest(output_dir):
+    """Reads the result manifest: {"file_hashes": {...}, "results": {key: entry}}."""
+    try:
+        with open(os.path.join(output_dir, RESULT_MANIFEST_NAME), "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        manifest = {}
+    manifest.setdefault("file_hashes", {})
+    manifest.setdefault("results", {})
+    return manifest
+
+def save_manifest(output_dir, manifest):
+    """Writes the result manifest atomically."""
+    manifest_path = os.path.join(output_dir, RESULT_MANIFEST_NAME)
+    tmp_path = manifest_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=1)
+    os.replace(tmp_path, manifest_path)
+
+def file_digest(path, file_hashes):
+    """SHA-256 of a file's content, memoized in `file_hashes` by path, size and mtime.
+
+    Called from PrepareTask threads: concurrent jobs sharing a file (the Reference
+    of a batch) wait for the one that hashes it.
+    """
+    stat = os.stat(path)
+    memo_key = f"{os.path.abspath(path)}|{stat.st_size}|{stat.st_mtime_ns}"
+    digest = file_hashes.get(memo_key)
+    if digest is None:
+        with g_digest_guard:
+            lock = g_digest_locks.setdefault(memo_key, threading.Lock())
+        with lock:
+            digest = g_digest_memo.get(memo_key)
+            if digest is None:
+                sha = hashlib.sha256()
+                with open(path, "rb") as f:
+                    for block in iter(lambda: f.read(1024 * 1024), b""):
+                        sha.update(block)
+                digest = g_digest_memo[memo_key] = sha.hexdigest()
+        file_hashes[memo_key] = digest
+    return digest
+
+def prepare_outputs(output_dir, target_path, ref_path, ref_name, variants, target_range=None, reference_range=None):
+    """Looks every output variant of the job up in the manifest.
+
+    Returns a list of {"variant", "result_path", "result_key", "cached"} dicts. A key
+    covers the content of both files, the item ranges, the variant (bit depth,
+    limiter, normalization) and the Matchering version, and its first 8 characters
+    are part of the file name, so a changed input never overwrites an older master.
+    With several variants the file name also tells them apart ("_16bit_...").
+
+    Hashing a long source takes seconds: this runs on a PrepareTask thread, never
+    on REAPER's main thread.
+    """
+    file_hashes = dict(load_manifest(output_dir)["file_hashes"])
+    base_fields = {
+        "target": file_digest(target_path, file_hashes),
+        "reference": file_digest(ref_path, file_hashes),
+        "matchering": get_matchering_version(),
+    }
+    if target_range:
+        base_fields["target_range"] = list(target_range)
+    if reference_range:
+        base_fields["reference_range"] = list(reference_range)
+    with g_manifest_lock:
+        manifest = load_manifest(output_dir)
+        if any(memo_key not in manifest["file_hashes"] for memo_key in file_hashes):
+            manifest["file_hashes"].update(file_hashes)
+            save_manifest(output_dir, manifest) # Keep the new file hashes
+
+    outputs = []
+    for variant in variants:
+        key_fields = dict(base_fields, bit_depth=variant["bit_depth"])
+        if not variant["limiter"]: # Limiter variants keep the keys of older manifests
+            key_fields["limiter"] = False
+            key_fields["normalize"] = variant["normalize"]
+        key_source = json.dumps(key_fields, sort_keys=True)
+        result_key = hashlib.sha256(key_source.encode("utf-8")).hexdigest()
+
+        entry = manifest["results"].get(result_key)
+        result_path = os.path.join(output_dir, entry["file"]) if entry else None
+        cached = result_path is not None and os.path.isfile(result_path)
+        if not cached:
+            suffix = result_key[:8] if len(variants) == 1 else f"{variant_label(variant)}_{result_key[:8]}"
+            result_path = build_result_path(output_dir, target_path, ref_name, suffix)
+        outputs.append({"variant": variant, "result_path": result_path, "result_key": result_key, "cached": cached})
+    return outputs
+
+def record_outputs(output_dir, outputs, target_path, ref_path, target_range=None, reference_range=None):
+    """Adds the newly rendered masters of a job to the manifest.
+
+    Older entries for the same Target/Reference paths, ranges and variant (inputs
+    that have changed since) are dropped, so prune_results() can delete their files.
+    """
+    with g_manifest_lock:
+        _record_outputs(output_dir, outputs, target_path, ref_path, target_range, reference_range)
+
+def _record_outputs(output_dir, outputs, target_path, ref_path, target_range, reference_range):
+    manifest = load_manifest(output_dir)
+    for output in outputs:
+        if output["cached"]:
+            continue
+        slot = [os.path.abspath(target_path), os.path.abspath(ref_path), variant_spec(output["variant"])]
+        if target_range or reference_range:
+            slot += [list(target_range or ()), list(reference_range or ())]
+        for key in [k for k, e in manifest["results"].items() if e.get("slot") == slot]:
+            del manifest["results"][key]
+        manifest["results"][output["result_key"]] = {
+            "file": os.path.basename(output["result_path"]),
+            "slot": slot,
+            "matchering": get_matchering_version(),
+            "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+        }
+    save_manifest(output_dir, manifest)
+
+def get_project_media_paths():
+    """Normalized paths of every media source used by an item in the current project."""
+    paths = set()
+    for i in range(RPR_CountMediaItems(0)):
+        take = RPR_GetActiveTake(RPR_GetMediaItem(0, i))
+        if not take:
+            continue
+        source = RPR_GetMediaItemTake_Source(take)
+        file_name = RPR_GetMediaSourceFileName(source, "", 4096)[1]
+        if file_name:
+            paths.add(os.path.normcase(os.path.abspath(file_name)))
+    return paths
+
+def prune_results(output_dir):
+    """Deletes masters that have no manifest entry (and are not used in the project).
+
+    Also drops manifest entries whose file is gone and forgets stale file hashes.
+    Returns (number of deleted files, number of files kept because they are in use).
+    """
+    with g_manifest_lock:
+        return _prune_results(output_dir)
+
+def _prune_results(output_dir):
+    manifest = load_manifest(output_dir)
+    manifest["results"] = {
+        k: e for k, e in manifest["results"].items() if os.path.isfile(os.path.join(output_dir, e["file"]))
+    }
+    manifest["file_hashes"] = {
+        k: d for k, d in manifest["file_hashes"].items() if os.path.isfile(k.rsplit("|", 2)[0])
+    }
+    known_files = {e["file"] for e in manifest["results"].values()}
+    used_paths = get_project_media_paths()
+
+    removed, in_use = 0, 0
+    for result_path in glob.glob(os.path.join(output_dir, "*_mastered_REF_*.wav")):
+        if os.path.basename(result_path) in known_files:
+            continue
+        if os.path.normcase(os.path.abspath(result_path)) in used_paths:
+            in_use += 1
+            continue
+        try:
+            os.remove(result_path)
+            removed += 1
+        except OSError as e:
+            log(f"Worker: Could not delete {result_path}: {e}")
+
+    save_manifest(output_dir, manifest)
+    return removed, in_use
+
 # --- Polling Logic (Non-Blocking) ---
 
 def on_process_finished(return_code):
     """Called by poll_process() when the process completes."""
-    global g_result_path
-    
     if return_code == 0:
         log(f"Worker: Matchering completed successfully (Code: {return_code}).")
+        # The inputs the job was prepared with: the GUI may have changed ExtState meanwhile
+        record_outputs(os.path.dirname(g_outputs[0]["result_path"]), g_outputs, *g_inputs)
         set_status("Completed! Importing file...")
-        finalize_import(g_result_path)
+        finalize_import(g_outputs, getattr(g_process, "timings", None))
     else:
-        log(f"--- WORKER: MATCHERING FAILED (Error Code: {return_code}) ---")
-        set_status(f"Error: Matchering failed (Code: {return_code}).")
+        set_timings("Timings", getattr(g_process, "timings", None))
+        error = getattr(g_process, "error", "")
+        log(f"--- WORKER: MATCHERING FAILED (Error Code: {return_code}) {error} ---")
+        set_status(f"Error: Matchering failed (Code: {return_code}){': ' + error if error else '.'}")
+
+def on_process_prepared(task):
+    """Called by poll_process() once the inputs are hashed: imports the cached masters
+    or launches the job for the missing variants. Returns the job's handle, or None."""
+    global g_outputs, g_inputs
+    if task.outputs is None:
+        set_status(f"Error: {task.error}")
+        log(f"Error: {task.error}")
+        return None
+    g_outputs = task.outputs
+    missing = [output for output in g_outputs if not output["cached"]]
+    if not missing:
+        log(f"Worker: Result is cached, importing {', '.join(o['result_path'] for o in g_outputs)}")
+        finalize_import(g_outputs)
+        return None
+
+    _, target_path, ref_path, _, _, target_range, reference_range = task.args
+    g_inputs = (target_path, ref_path, target_range, reference_range)
+    try:
+        # *** FIX: Use the variants (bit depths) from ExtState; cached variants are not rendered again ***
+        process = launch_job(missing, target_path, ref_path, 1, target_range, reference_range)
+        log(f"Worker starting Matchering process (PID: {process.pid})...")
+        return process
+    except Exception as e:
+        log(f"Critical error launching subprocess: {e}")
+        set_status(f"Error: Popen failed: {e}")
+        return None
 
 def poll_process():
-    """Polling function (non-blocking) using RPR_defer."""
+    """Polling function (non-blocking) using RPR_defer.
+
+    Only drains the events of the job watcher: ExtState is read at most every
+    CANCEL_CHECK_INTERVAL and written only when the status changed.
+    """
     global g_process
 
     if g_process is None:
@@ -113,8 +1044,7 @@ def poll_process():
         return
 
     # *** NEW (11/11/2025): Check for Cancel command from GUI ***
-    command = RPR_GetExtState("MatcheringWorker", "Command")
-    if command == "Cancel":
+    if cancel_requested():
         log("Worker: Received Cancel command from GUI.")
         try:
             g_process.kill() # Kill the subprocess
@@ -128,23 +1058,315 @@ def poll_process():
         return # Stop the poll loop
     # *** END NEW ***
 
-    return_code = g_process.poll()
+    for handle, event in drain_events():
+        if handle is not g_process:
+            continue
+        if event["event"] == "prepared":
+            g_process = on_process_prepared(handle)
+            if g_process is None:
+                return
+        elif event["event"] == "progress":
+            publish_progress(handle, "Status", "Info")
+        elif event["event"] == "done":
+            # Finished
+            g_status.flush(force=True)
+            on_process_finished(handle.returncode)
+            g_process = None # Clear the process to stop the loop
+            return
 
-    if return_code is None:
-        # Still running
-        set_status(f"Running... (PID: {g_process.pid})")
-        # Reschedule self
-        RPR_defer("poll_process()") 
+    # Still running: reschedule self
+    g_status.flush()
+    RPR_defer("poll_process()")
+
+# --- Pool Mode (Concurrent Jobs) ---
+
+def parse_job_list(jobs_string):
+    """Parses the "Jobs" ExtState written by the Lua GUI.
+
+    One job per line, fields separated by TAB: target, reference, reference name,
+    then (optional) target offset, length, playrate and reference offset, length,
+    playrate of the REAPER items. Returns a list of job dicts. Index is 1-based to
+    match the Lua job table.
+    """
+    jobs = []
+    for line in jobs_string.splitlines():
+        if not line.strip():
+            continue
+        fields = line.split("\t")
+        target_path = fields[0] if len(fields) > 0 else ""
+        ref_path = fields[1] if len(fields) > 1 else ""
+        ref_name = fields[2] if len(fields) > 2 and fields[2] else "ref" # Fallback
+        range_fields = (fields[3:9] + [""] * 6)[:6]
+        try:
+            target_range = parse_range_fields(*range_fields[0:3])
+            reference_range = parse_range_fields(*range_fields[3:6])
+        except ValueError:
+            target_range, reference_range = None, None
+        jobs.append({
+            "index": len(jobs) + 1,
+            "target": target_path,
+            "reference": ref_path,
+            "ref_name": ref_name,
+            "target_range": target_range,
+            "reference_range": reference_range,
+            "output_dir": None,
+            "outputs": [], # See prepare_outputs
+            "process": None,
+            "state": "queued", # queued / running / importing / done / failed
+        })
+    return jobs
+
+def get_max_parallel_jobs():
+    """Number of concurrent jobs: GUI "MaxJobs" > MAX_PARALLEL_JOBS > CPU core count."""
+    max_jobs_str = RPR_GetExtState("MatcheringWorker", "MaxJobs")
+    try:
+        max_jobs = int(max_jobs_str) if max_jobs_str else MAX_PARALLEL_JOBS
+    except ValueError:
+        max_jobs = MAX_PARALLEL_JOBS
+    if max_jobs <= 0:
+        max_jobs = os.cpu_count() or 1
+    return max_jobs
+
+def fail_pool_job(job, error_msg):
+    """Marks a Pool job as failed and reports it to the GUI."""
+    job["state"] = "failed"
+    job["process"] = None
+    set_job_status(job["index"], f"Error: {error_msg}")
+    log(f"Worker: Job {job['index']} failed: {error_msg}")
+
+def start_pool_job(job, variants):
+    """Starts one queued Pool job: its inputs are hashed on a background thread first."""
+    job["process"] = PrepareTask(
+        job["output_dir"], job["target"], job["reference"], job["ref_name"], variants,
+        job["target_range"], job["reference_range"]
+    ).start()
+    job["state"] = "running" # Takes its slot while the inputs are hashed
+    set_job_status(job["index"], "Running... (reading inputs)")
+
+def on_pool_job_prepared(job, task):
+    """Launches the subprocess of a Pool job whose inputs are hashed (or imports its cached masters).
+
+    Only the variants without a cached master are rendered.
+    """
+    if task.outputs is None:
+        fail_pool_job(job, task.error)
+        return
+    job["outputs"] = task.outputs
+    missing = [output for output in job["outputs"] if not output["cached"]]
+    if not missing:
+        log(f"Worker: Job {job['index']} is cached: {', '.join(o['result_path'] for o in job['outputs'])}")
+        on_pool_job_finished(job, 0, from_cache=True)
+        return
+
+    try:
+        job["process"] = launch_job(
+            missing, job["target"], job["reference"], g_pool_max_parallel,
+            job["target_range"], job["reference_range"]
+        )
+    except Exception as e:
+        log(f"Critical error launching subprocess: {e}")
+        fail_pool_job(job, f"Popen failed: {e}")
+        return
+    job["state"] = "running"
+    set_job_status(job["index"], f"Running... (PID: {job['process'].pid})" if job["process"].pid else "Running...")
+    log(f"Worker: Job {job['index']} started (PID: {job['process'].pid}).")
+
+def on_pool_job_finished(job, return_code, from_cache=False):
+    """Called by poll_pool() when one job's process completes."""
+    global g_pending_since
+    process = job["process"]
+    job["process"] = None
+    job["timings"] = dict(getattr(process, "timings", None) or {})
+    if return_code != 0:
+        set_timings(f"Timings_{job['index']}", job["timings"])
+        error = getattr(process, "error", "")
+        fail_pool_job(job, f"Matchering failed (Code: {return_code}){': ' + error if error else '.'}")
+        return
+    if not from_cache:
+        record_outputs(
+            job["output_dir"], job["outputs"], job["target"], job["reference"],
+            job["target_range"], job["reference_range"]
+        )
+
+    set_job_status(job["index"], "Completed! Importing file...")
+    if not BATCH_IMPORT:
+        import_pool_jobs([job])
+        return
+    # Imported with the other masters finished around the same time (see flush_pool_imports)
+    job["state"] = "importing"
+    if not g_pending_imports:
+        g_pending_since = time.time()
+    g_pending_imports.append(job)
+
+def import_pool_jobs(jobs):
+    """Imports the masters of finished Pool jobs and reports every job's final status."""
+    start = time.perf_counter()
+    imported = import_outputs([output for job in jobs for output in job["outputs"]])
+    stall = (time.perf_counter() - start) / max(1, len(jobs))
+    position = 0 # One flag per imported output, in job order
+    for job in jobs:
+        set_timings(f"Timings_{job['index']}", dict(job.get("timings") or {}, **{"import": stall}))
+        count = sum(1 for output in job["outputs"] if output["variant"]["import"])
+        success = all(imported[position:position + count])
+        position += count
+        if success:
+            job["state"] = "done"
+            set_job_status(job["index"], "Done")
+        else:
+            fail_pool_job(job, "Succeeded, but failed to import file.")
+
+def flush_pool_imports(force=False):
+    """Imports the pending masters once no job is about to finish, or after IMPORT_BATCH_INTERVAL."""
+    global g_pending_imports
+    if not g_pending_imports:
+        return
+    busy = any(job["state"] in ("queued", "running") for job in g_pool_jobs)
+    if not force and busy and time.time() - g_pending_since < IMPORT_BATCH_INTERVAL:
+        return
+    jobs, g_pending_imports = g_pending_imports, []
+    import_pool_jobs(jobs)
+
+def cancel_pool():
+    """Kills every running child process and marks the remaining jobs as cancelled."""
+    global g_pool_jobs
+    for job in g_pool_jobs:
+        if job["state"] == "running" and job["process"] is not None:
+            try:
+                job["process"].kill() # Kill the subprocess
+                log(f"Worker: Job {job['index']} killed.")
+            except Exception as e:
+                log(f"Worker: Error while killing process: {e}")
+    if USE_MG_ENGINE and USE_MG_DAEMON:
+        cancel_daemon() # Also covers jobs whose handle is not connected yet
+    flush_pool_imports(force=True) # Finished masters are still imported
+    for job in g_pool_jobs:
+        if job["state"] in ("queued", "running"):
+            fail_pool_job(job, "Operation cancelled by user.")
+    g_pool_jobs = []
+    set_status("Error: Operation cancelled by user.")
+    RPR_SetExtState("MatcheringWorker", "Command", "", False) # Clear command
+
+def poll_pool():
+    """Polling function for Pool mode (non-blocking) using RPR_defer."""
+    if not g_pool_jobs:
+        log("Worker: Pool is empty. Stopping poll.")
+        return
+
+    if cancel_requested():
+        log("Worker: Received Cancel command from GUI.")
+        cancel_pool()
+        return
+
+    # 1. Progress and completion events of the job watchers
+    events = drain_events()
+    jobs_by_handle = {id(job["process"]): job for job in g_pool_jobs if job["state"] == "running"}
+    for handle, event in events:
+        job = jobs_by_handle.get(id(handle))
+        if job is None or job["process"] is not handle:
+            continue
+        if event["event"] == "prepared":
+            on_pool_job_prepared(job, handle)
+        elif event["event"] == "progress":
+            publish_progress(handle, f"Status_{job['index']}", f"Info_{job['index']}")
+        elif event["event"] == "done":
+            on_pool_job_finished(job, handle.returncode)
+
+    # 2. Fill the free slots (only when a job finished, or on the first call)
+    running = sum(1 for job in g_pool_jobs if job["state"] == "running")
+    if running < g_pool_max_parallel and any(job["state"] == "queued" for job in g_pool_jobs):
+        for job in g_pool_jobs:
+            if running >= g_pool_max_parallel:
+                break
+            if job["state"] == "queued":
+                start_pool_job(job, g_pool_variants)
+                if job["state"] == "running":
+                    running += 1
+
+    # 3. Import the finished masters as one batch
+    flush_pool_imports()
+
+    # 4. Report overall progress
+    total = len(g_pool_jobs)
+    finished = sum(1 for job in g_pool_jobs if job["state"] in ("done", "failed"))
+    failed = sum(1 for job in g_pool_jobs if job["state"] == "failed")
+
+    if finished < total:
+        g_status.publish("Status", f"Running... ({finished}/{total} finished, {running} running)")
+        g_status.flush()
+        RPR_defer("poll_pool()") # Reschedule self
+        return
+    g_status.flush(force=True)
+    if failed:
+        set_status(f"Error: {failed} of {total} job(s) failed.")
     else:
-        # Finished
-        on_process_finished(return_code)
-        g_process = None # Clear the process to stop the loop
+        set_status("Done")
+
+def main_pool_worker():
+    """Pool mode: reads the whole job list and runs up to N jobs concurrently."""
+    global g_pool_jobs, g_pool_max_parallel, g_pool_variants
+
+    log("Python worker script started (Pool mode).")
+
+    jobs = parse_job_list(RPR_GetExtState("MatcheringWorker", "Jobs"))
+    if not jobs:
+        set_status("Error: Worker received an empty job list from ExtState.")
+        log("Error: Worker received an empty job list from ExtState.")
+        return
+    try:
+        g_pool_variants = read_variants()
+    except ValueError as e:
+        set_status(f"Error: {e}")
+        log(f"Error: {e}")
+        return
+
+    output_dir = get_output_dir()
+    if not output_dir:
+        return
+
+    for job in jobs:
+        set_job_status(job["index"], "Queued")
+        if not job["target"] or not job["reference"]:
+            fail_pool_job(job, "Worker received invalid paths from ExtState.")
+        elif job["target"].lower().endswith(".mp3") or job["reference"].lower().endswith(".mp3"):
+            fail_pool_job(job, ".mp3 files are not supported. Use .wav or .flac.")
+        else:
+            job["output_dir"] = output_dir # Result path is resolved when the job starts (manifest)
+
+    g_pool_jobs = jobs
+    g_pending_imports.clear()
+    g_pool_max_parallel = get_max_parallel_jobs()
+    log(f"Worker: {len(jobs)} job(s), up to {g_pool_max_parallel} in parallel.")
+
+    # Starts the first N jobs and keeps the loop going (NON-BLOCKING)
+    poll_pool()
+
+def main_prune_worker():
+    """Prune mode: deletes masters that no longer have a manifest entry."""
+    output_dir = get_output_dir()
+    if not output_dir:
+        return
+    removed, in_use = prune_results(output_dir)
+    message = f"Pruned {removed} old master(s)."
+    if in_use:
+        message += f" {in_use} kept (used in project)."
+    set_status(message)
+    log(f"Worker: {message}")
 
 # --- MAIN EXECUTION FUNCTION ---
 
 def main_worker():
     """Main worker function, called when the script runs."""
-    global g_process, g_result_path
+    global g_process, g_outputs
+
+    # *** NEW: Pool mode (whole job list at once) / Prune mode ***
+    mode = RPR_GetExtState("MatcheringWorker", "Mode")
+    if mode == "Pool":
+        main_pool_worker()
+        return
+    if mode == "Prune":
+        main_prune_worker()
+        return
+    # *** END NEW ***
     
     log("Python worker script started (Internal REAPER mode).")
     
@@ -157,11 +1379,13 @@ def main_worker():
         ref_name = "ref" # Fallback
     # *** END NEW ***
     
-    # *** NEW: Read Bit Depth from GUI ***
-    bit_depth = RPR_GetExtState("MatcheringWorker", "BitDepth")
-    if not bit_depth or bit_depth == "":
-        bit_depth = "-b24" # Fallback just in case
-        log("Warning: Bit depth not received from GUI, defaulting to -b24.")
+    # *** NEW: Read Bit Depth (and the output variants) from GUI ***
+    try:
+        variants = read_variants()
+    except ValueError as e:
+        set_status(f"Error: {e}")
+        log(f"Error: {e}")
+        return
     # *** END NEW ***
 
     # 2. Validation
@@ -175,65 +1399,20 @@ def main_worker():
         log("Error: .mp3 files are not supported.")
         return
 
-    project_path_buf = get_project_path()
-    if not project_path_buf:
-        set_status("Error: Could not get project path. Please save project.")
-        log("Error: Could not get project path from worker.")
-        return
-
     # 3. Build Paths and Command
-    output_dir = os.path.join(project_path_buf, OUTPUT_SUBFOLDER)
-    if not os.path.exists(output_dir):
-        try:
-            os.makedirs(output_dir)
-        except OSError as e:
-            set_status(f"Error: Could not create output directory: {e}")
-            log(f"Error: Could not create output directory: {e}")
-            return
-
-    # *** NEW: Idea 1 (Dynamic Naming) ***
-    # Clean filenames to be safe
-    target_filename_base = os.path.splitext(os.path.basename(target_path))[0]
-    ref_filename_base = os.path.splitext(os.path.basename(ref_name))[0]
-    # Remove characters that are bad for filenames
-    target_filename_base = re.sub(r'[\\/*?:"<>|]', "", target_filename_base)
-    ref_filename_base = re.sub(r'[\\/*?:"<>|]', "", ref_filename_base)
-
-    result_name = f"{target_filename_base}_mastered_REF_{ref_filename_base}.wav"
-    g_result_path = os.path.join(output_dir, result_name) # Save to global variable
-    # *** END NEW ***
-
-    # *** FIX: Use the 'bit_depth' variable from ExtState ***
-    command_list = [
-        PATH_TO_VENV_PYTHON, "-X", "utf8",
-        PATH_TO_MG_CLI, bit_depth, # Use the selected bit depth
-        target_path, ref_path, g_result_path
-    ]
-
-    log("Worker building command: " + " ".join(f'"{c}"' for c in command_list))
+    output_dir = get_output_dir()
+    if not output_dir:
+        return
 
-    # 4. Execute Popen (just like Hosi_...py file)
-    g_process = None
-    try:
-        my_env = os.environ.copy()
-        my_env["PYTHONIOENCODING"] = "utf-8"
-        creation_flags = 0
-        if sys.platform == "win32":
-            creation_flags = subprocess.CREATE_NO_WINDOW
+    # *** NEW: Item ranges (only the used part of the sources is processed) ***
+    target_range = read_item_range("Target")
+    reference_range = read_item_range("Reference")
 
-        g_process = subprocess.Popen(
-            command_list,
-            env=my_env,
-            creationflags=creation_flags
-        )
-        
-        log(f"Worker starting Matchering process (PID: {g_process.pid})...")
-        set_status("Running...") # Send initial status to GUI
-        
-    except Exception as e:
-        log(f"Critical error launching subprocess: {e}")
-        set_status(f"Error: Popen failed: {e}")
-        return
+    # 4. Hash the inputs and look them up in the manifest (background thread), then
+    #    execute Popen (just like Hosi_...py file) or send the job to the engine daemon
+    g_outputs = []
+    g_process = PrepareTask(output_dir, target_path, ref_path, ref_name, variants, target_range, reference_range).start()
+    set_status("Running...") # Send initial status to GUI
 
     # 5. Start the polling loop (NON-BLOCKING)
     RPR_defer("poll_process()")
@@ -1,97 +1,607 @@
 # -*- coding: utf-8 -*-
 # @description This script is called by Hosi_Freesound_Logic_GUI_Pro.lua.
-# @version 1.3
+# @version 1.15
 # @author Hosi Prod
+# @provides
+#   [nomain] freesound_bench.py
 # @changelog
+#   + v1.15 (2026-10-17) - freesound_bench.py is installed with this helper (@provides).
+#   + v1.14 (2026-10-17) - Downloads are analyzed (peak envelope, loudness, true peak; WAV while it streams in); get_analysis mode.
+#   + v1.13 (2026-10-17) - Sounds seen in results or downloaded are kept in a local SQLite full-text index; local_search mode, offline fallback of search.
+#   + v1.12 (2026-10-17) - Login is kept in a token store; expired access tokens are refreshed silently (get_user, download_original); logout mode.
+#   + v1.11 (2026-10-17) - Faster cold start: modules are imported by the modes that use them; --profile-startup.
+#   + v1.10 (2026-10-17) - Faster Lua serializer (streamed, cheap escaping); --fields and --out-file options.
+#   + v1.9 (2026-10-17) - API requests go through a rate-limit scheduler (token buckets, Retry-After, backoff, priorities); batch_search mode.
+#   + v1.8 (2026-10-17) - Favorites: no more truncation at 25 sounds; IDs are fetched in concurrent chunks and cached per sound.
+#   + v1.7 (2026-10-17) - Downloads resume after errors (HTTP Range), large files in parallel segments, progress file for the GUI.
+#   + v1.6 (2026-10-17) - Preview cache: the daemon prefetches the previews of every result page, download_preview is served from the cache.
+#   + v1.5 (2026-10-17) - Search and similar-sound responses are cached on disk (TTL, LRU, stale-while-revalidate in the daemon).
+#   + v1.4 (2026-10-17) - Daemon mode: one long-lived process with pooled keep-alive connections serves the GUI's calls.
 #   + v1.3 (2025-08-31) - Initial release on Reapack.
+#
+# Usage: python Hosi_Freesound_Logic_Pro.py [OPTIONS] MODE ARGS...   (prints "return {...}")
+#        python Hosi_Freesound_Logic_Pro.py serve [--idle-timeout S]   (the daemon itself)
+# The GUI imports this file and calls main() instead (python -c, see the Lua script): an
+# imported module is loaded from its cached bytecode, a script is compiled at every run.
+# Options:
+#   --daemon          The call is forwarded to a running daemon (started if needed) over a
+#                     local socket, so it pays neither the `requests` import nor a new TLS
+#                     handshake. If the daemon cannot be reached, the mode runs in this
+#                     process as before.
+#   --fields LIST     Sounds in "results" lists keep only these keys, e.g.
+#                     "id,name,previews.preview-hq-mp3" (dotted = nested key).
+#   --out-file PATH   "return {...}" is written to PATH instead of stdout.
+#   --profile-startup One "profile-startup {json}" line on stderr: load time of this file,
+#                     time spent in the mode's own imports (and which), mode and total time.
 
+import time
+_MODULE_START = time.perf_counter() # --profile-startup: the module starts loading here
+
+# Only what every mode needs is imported here (the --daemon client runs on these alone);
+# each mode imports the rest where it is used: requests, http.server, concurrent.futures...
 import sys
 import os
+import contextlib
+import itertools
 import json
-import requests
-import traceback
-import webbrowser
+import socket
 import threading
-import time
-from http.server import HTTPServer, BaseHTTPRequestHandler
-from urllib.parse import urlparse, parse_qs
 
 # --- CONFIGURATION ---
 REDIRECT_URI = "http://127.0.0.1:8008/"
+OAUTH_TIMEOUT = 120 # Seconds the browser login may take
+STATE_DIR = os.path.join(os.path.expanduser("~"), ".hosi_freesound")
+TOKEN_FILE = os.path.join(STATE_DIR, "tokens.json") # OAuth2 tokens of the logged-in user (readable by this user only)
+TOKEN_REFRESH_MARGIN = 5 * 60 # Seconds before its expiry an access token is refreshed
+DAEMON_STATE_FILE = os.path.join(STATE_DIR, "daemon.json") # Port, pid and token of the running daemon
+DAEMON_IDLE_TIMEOUT = 600 # Seconds without requests before the daemon exits
+DAEMON_START_TIMEOUT = 10 # Seconds a client waits for a new daemon to come up
+HTTP_POOL_SIZE = 8 # Keep-alive connections kept per host
+API_ROOT = "https://freesound.org/apiv2/" # Requests below this URL count against the rate limits
+API_RATE_PER_MINUTE = 60 # Freesound's limits for one API key
+API_RATE_PER_DAY = 2000
+API_RATE_STATE_FILE = os.path.join(STATE_DIR, "rate.json") # Bucket levels, shared with the next process
+API_RETRIES = 4 # Retries of a throttled (429 / 503) request, and of a network error for GET/HEAD
+API_BACKOFF = 1.0 # Seconds; doubled at every retry, with jitter
+API_MAX_WAIT = 30 # Seconds a request may wait for the rate limit before it fails
+BATCH_SEARCH_WORKERS = 4 # Queries of a batch_search in flight at once
+RESPONSE_CACHE_DIR = os.path.join(STATE_DIR, "responses")
+RESPONSE_CACHE_TTL = 15 * 60 # Seconds a cached search / similar-sounds response is fresh (0 = no cache)
+RESPONSE_CACHE_MAX_BYTES = 32 * 1024 * 1024 # Size bound of the response cache (least recently used out first)
+RESPONSE_CACHE_SERVE_STALE = True # Daemon: answer with an expired entry at once and refresh it in the background
+PREVIEW_CACHE_DIR = os.path.join(STATE_DIR, "previews")
+PREVIEW_CACHE_MAX_BYTES = 256 * 1024 * 1024 # Size bound of the preview cache (least recently used out first)
+PREFETCH_PREVIEWS = True # Daemon: download the previews of every result page in the background
+PREFETCH_WORKERS = 4 # Concurrent preview downloads
+PREFETCH_QUALITY = "preview-hq-mp3" # The preview the GUI auditions
+DOWNLOAD_SEGMENTS = 4 # Concurrent connections for one large file
+DOWNLOAD_SEGMENT_MIN_BYTES = 8 * 1024 * 1024 # Smaller files are downloaded on one connection
+DOWNLOAD_RETRIES = 3 # Reconnections per segment before a download fails (the .part file is kept)
+DOWNLOAD_CHUNK_MIN = 64 * 1024 # Read size, doubled on fast connections up to DOWNLOAD_CHUNK_MAX
+DOWNLOAD_CHUNK_MAX = 4 * 1024 * 1024
+PROGRESS_INTERVAL = 0.25 # Seconds between two writes of a download's progress file
+SEARCH_FIELDS = "id,name,previews,username,duration,url,license,tags,num_downloads,category"
+SEARCH_PAGE_SIZE = 25
+FAVORITES_CHUNK_SIZE = 50 # Sound IDs per favorites request (one page of at most 150; keeps the filter URL short)
+FAVORITES_WORKERS = 4 # Favorites requests in flight at once
+SOUND_CACHE_DIR = os.path.join(STATE_DIR, "sounds")
+SOUND_CACHE_TTL = 24 * 60 * 60 # Seconds the metadata of one sound is reused by the favorites panel (0 = no cache)
+SOUND_CACHE_MAX_BYTES = 16 * 1024 * 1024 # Size bound of the sound metadata cache (least recently used out first)
+SOUND_INDEX_FILE = os.path.join(STATE_DIR, "library.db") # SQLite full-text index of every sound seen or downloaded (local_search)
+SOUND_INDEX_ENABLED = True # Record the sounds of search / similar / favorites results and downloads
+ANALYZE_DOWNLOADS = True # Peak envelope, loudness and true peak of downloads (needs numpy and scipy; soundfile for other formats than WAV)
+ANALYSIS_PEAK_RATE = 50 # Points per second of the peak envelope (min / max over all channels)
+ANALYSIS_BLOCK_FRAMES = 65536 # Frames per block when a finished file is analyzed
 
-# Global variable to hold the authorization code from the server
-authorization_code = None
+# `requests` is imported on first use: the --daemon client never needs it
+requests = None
+_session = None
+_session_lock = threading.Lock()
+_response_cache = None
+_daemon = None # The FreesoundDaemon of this process: work can go on after the reply (cache refresh, prefetch, downloads)
+_preview_cache = None
+_prefetch_pool = None
+_scheduler = None
+_token_store = None
+_sound_index = None
+_priority = threading.local()
+
+# Request priorities: a lower value goes first
+PRIORITY_INTERACTIVE = 0 # The user waits for the answer
+PRIORITY_BATCH = 1 # batch_search
+PRIORITY_BACKGROUND = 2 # Prefetch and cache refresh
 
 # --- OAUTH2 HTTP SERVER ---
-class OAuthCallbackHandler(BaseHTTPRequestHandler):
-    """A simple HTTP request handler to catch the OAuth2 callback."""
-    def log_message(self, format, *args):
-        return # Suppress console logging
-
-    def do_GET(self):
-        global authorization_code
-        self.send_response(200)
-        self.send_header("Content-type", "text/html")
-        self.end_headers()
-        
-        query_components = parse_qs(urlparse(self.path).query)
-        code = query_components.get("code", [None])[0]
-        
-        if code:
-            authorization_code = code
-            self.wfile.write(b"<html><head><style>body { font-family: sans-serif; background-color: #222; color: #eee; text-align: center; padding-top: 50px; }</style></head>")
-            self.wfile.write(b"<body><h1>Authentication successful!</h1><p>You can close this window now and return to REAPER.</p></body></html>")
-        else:
-            self.wfile.write(b"<html><head><style>body { font-family: sans-serif; background-color: #222; color: #eee; text-align: center; padding-top: 50px; }</style></head>")
-            self.wfile.write(b"<body><h1>Authentication failed.</h1><p>Please try again from the REAPER script.</p></body></html>")
+def make_oauth_callback_handler(state, on_callback):
+    """Returns the request handler class of the OAuth2 callback server (http.server is imported here).
+
+    on_callback(code) is called once the browser comes back with our `state`: with
+    the authorization code, or None when the user denied access. Other requests
+    (favicon...) are ignored.
+    """
+    from http.server import BaseHTTPRequestHandler
+    from urllib.parse import urlparse, parse_qs
+
+    class OAuthCallbackHandler(BaseHTTPRequestHandler):
+        """A simple HTTP request handler to catch the OAuth2 callback."""
+        def log_message(self, format, *args):
+            return # Suppress console logging
+
+        def do_GET(self):
+            query_components = parse_qs(urlparse(self.path).query)
+            code = query_components.get("code", [None])[0]
+            if query_components.get("state", [None])[0] != state or not (code or "error" in query_components):
+                self.send_response(404)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+
+            self.send_response(200)
+            self.send_header("Content-type", "text/html")
+            self.end_headers()
+            if code:
+                self.wfile.write(b"<html><head><style>body { font-family: sans-serif; background-color: #222; color: #eee; text-align: center; padding-top: 50px; }</style></head>")
+                self.wfile.write(b"<body><h1>Authentication successful!</h1><p>You can close this window now and return to REAPER.</p></body></html>")
+            else:
+                self.wfile.write(b"<html><head><style>body { font-family: sans-serif; background-color: #222; color: #eee; text-align: center; padding-top: 50px; }</style></head>")
+                self.wfile.write(b"<body><h1>Authentication failed.</h1><p>Please try again from the REAPER script.</p></body></html>")
+            on_callback(code)
+
+    return OAuthCallbackHandler
 
 # --- HELPER FUNCTIONS TO CONVERT PYTHON DICT TO LUA TABLE STRING ---
 
+# Decimal escapes of the other non-printable Latin-1 characters (tab, NUL, NBSP...)
+_LUA_CONTROL_ESCAPES = {c: f'\\{c}' for c in range(256) if not chr(c).isprintable()}
+
 def escape_lua_string(s):
     """Escapes a string to be safely included in a Lua string literal."""
     if not isinstance(s, str):
         s = str(s)
-    s = s.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n').replace('\r', '\\r')
-    s = ''.join(c if c.isprintable() else f'\\{ord(c)}' for c in s)
+    # Most strings need nothing: every step is skipped by a C-level test
+    if '\\' in s or '"' in s:
+        s = s.replace('\\', '\\\\').replace('"', '\\"')
+    if not s.isprintable():
+        s = s.replace('\n', '\\n').replace('\r', '\\r')
+        if not s.isprintable():
+            s = s.translate(_LUA_CONTROL_ESCAPES)
+            if not s.isprintable(): # Beyond Latin-1 (U+2028...)
+                s = ''.join(c if c.isprintable() else f'\\{ord(c)}' for c in s)
     return s
 
+def write_lua(obj, write):
+    """Writes a Python object as a Lua value through write(text), in one pass.
+
+    No intermediate strings are built for tables: the output can go straight to
+    a file or stdout. Same text as python_to_lua().
+    """
+    if obj is None: write("nil")
+    elif obj is True: write("true")
+    elif obj is False: write("false")
+    elif isinstance(obj, str): write(f'"{escape_lua_string(obj)}"')
+    elif isinstance(obj, (int, float)): write(str(obj))
+    elif isinstance(obj, dict):
+        write("{")
+        separator = '["'
+        for k, v in obj.items():
+            write(f'{separator}{escape_lua_string(k)}"] = ')
+            write_lua(v, write)
+            separator = ', ["'
+        write("}")
+    elif isinstance(obj, list):
+        write("{")
+        first = True
+        for item in obj:
+            if not first: write(", ")
+            first = False
+            write_lua(item, write)
+        write("}")
+    else: write(f'"{escape_lua_string(str(obj))}"')
+
 def python_to_lua(obj):
-    """Recursively converts a Python object to a Lua table string."""
-    if obj is None: return "nil"
-    if isinstance(obj, bool): return str(obj).lower()
-    if isinstance(obj, (int, float)): return str(obj)
-    if isinstance(obj, str): return f'"{escape_lua_string(obj)}"'
-    if isinstance(obj, list): return "{" + ", ".join(python_to_lua(item) for item in obj) + "}"
+    """Converts a Python object to a Lua table string."""
+    parts = []
+    write_lua(obj, parts.append)
+    return "".join(parts)
+
+def parse_fields(spec):
+    """"id,name,previews.preview-hq-mp3" -> {"id": None, "name": None, "previews": {"preview-hq-mp3": None}}."""
+    tree = {}
+    for path in spec.split(","):
+        node = tree
+        keys = [key.strip() for key in path.split(".") if key.strip()]
+        for i, key in enumerate(keys):
+            if i == len(keys) - 1:
+                node.setdefault(key, None)
+            else:
+                child = node.get(key)
+                if child is None:
+                    child = node[key] = {}
+                node = child
+    return tree
+
+def project_results(obj, fields):
+    """Keeps only the `fields` (parse_fields() tree) of the sounds in every "results" list of obj."""
+    def project(value, tree):
+        if tree is None or not isinstance(value, dict):
+            return value
+        return {key: project(value[key], subtree) for key, subtree in tree.items() if key in value}
+
     if isinstance(obj, dict):
-        items = [f'["{escape_lua_string(k)}"] = {python_to_lua(v)}' for k, v in obj.items()]
-        return "{" + ", ".join(items) + "}"
-    return f'"{escape_lua_string(str(obj))}"'
+        return {key: [project(sound, fields) for sound in value] if key == "results" and isinstance(value, list)
+                else project_results(value, fields) for key, value in obj.items()}
+    if isinstance(obj, list):
+        return [project_results(item, fields) for item in obj]
+    return obj
+
+def write_result(obj, out_path=None):
+    """Writes "return <obj>" to stdout, or atomically to `out_path` (a file the caller reads)."""
+    if out_path is None:
+        out = sys.stdout
+        out.write("return ")
+        write_lua(obj, out.write)
+        out.flush()
+        return
+    tmp_path = f"{out_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8", newline="\n", buffering=1024 * 1024) as out:
+        out.write("return ")
+        write_lua(obj, out.write)
+    os.replace(tmp_path, out_path)
+
+# --- HTTP SESSION ---
+
+def get_session():
+    """Returns the shared requests.Session (keep-alive connections are reused between calls)."""
+    global requests, _session
+    with _session_lock:
+        if _session is None:
+            import requests as requests_module
+            requests = requests_module
+            session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _session = session
+        return _session
+
+# --- REQUEST SCHEDULER ---
+
+class TokenBucket:
+    """`capacity` tokens, refilled continuously over `period` seconds."""
+
+    def __init__(self, capacity, period, tokens=None, stamp=None):
+        self.capacity = capacity
+        self.rate = capacity / period
+        self.tokens = capacity if tokens is None else min(tokens, capacity)
+        self.stamp = stamp or time.time()
+
+    def delay(self, now):
+        """Seconds until one token is available."""
+        self.tokens = min(self.capacity, self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+class RequestScheduler:
+    """Single way out for HTTP requests.
+
+    Requests to API_ROOT take one token from a per-minute and a per-day bucket;
+    while tokens are short, they are granted by priority, then in arrival order.
+    A 429 pauses every API request for its Retry-After; throttled requests (429,
+    503) and network errors of plain GET/HEAD requests are retried with jittered
+    exponential backoff. Background requests to other hosts (preview prefetch)
+    wait while an interactive request is in flight. The bucket levels are saved
+    in `state_path`, so one-shot processes and a new daemon respect them too.
+    """
+
+    def __init__(self, state_path=API_RATE_STATE_FILE):
+        self.state_path = state_path
+        self.cond = threading.Condition()
+        self.queue = [] # Heap of (priority, ticket) of the requests waiting for tokens
+        self.tickets = itertools.count()
+        self.interactive = 0 # Interactive requests in flight (streams excluded)
+        self.paused_until = 0.0
+        state = {}
+        try:
+            with open(state_path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            pass
+        self.buckets = [TokenBucket(API_RATE_PER_MINUTE, 60, *state.get("minute", ())),
+                        TokenBucket(API_RATE_PER_DAY, 24 * 60 * 60, *state.get("day", ()))]
+        self.paused_until = state.get("paused_until", 0.0)
+
+    def _save(self):
+        with self.cond:
+            state = {"minute": [self.buckets[0].tokens, self.buckets[0].stamp],
+                     "day": [self.buckets[1].tokens, self.buckets[1].stamp],
+                     "paused_until": self.paused_until}
+        tmp_path = f"{self.state_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(self.state_path), exist_ok=True)
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(state, f)
+            os.replace(tmp_path, self.state_path)
+        except OSError:
+            pass # The limits then only hold within this process
+
+    def _acquire(self, priority):
+        """Waits for a token of every bucket; raises RetryError if that would take more than API_MAX_WAIT."""
+        import heapq
+        with self.cond:
+            entry = (priority, next(self.tickets))
+            heapq.heappush(self.queue, entry)
+            try:
+                while True:
+                    now = time.time()
+                    delay = max([self.paused_until - now] + [bucket.delay(now) for bucket in self.buckets])
+                    if delay > API_MAX_WAIT:
+                        raise requests.exceptions.RetryError(f"Freesound rate limit reached, retry in {int(delay) + 1} s.")
+                    if self.queue[0] == entry and delay <= 0:
+                        for bucket in self.buckets:
+                            bucket.tokens -= 1
+                        break
+                    self.cond.wait(delay if delay > 0 else None)
+            finally:
+                self.queue.remove(entry)
+                heapq.heapify(self.queue)
+                self.cond.notify_all()
+        self._save()
+
+    def _pause(self, delay):
+        with self.cond:
+            self.paused_until = max(self.paused_until, time.time() + delay)
+            self.cond.notify_all()
+        self._save()
+
+    @staticmethod
+    def _retry_after(response):
+        """Seconds of the Retry-After header (a number or an HTTP date), or None."""
+        from email.utils import parsedate_to_datetime
+        value = response.headers.get("Retry-After", "").strip()
+        if value.isdigit():
+            return float(value)
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError, IndexError):
+            return None
+
+    def request(self, method, url, priority=None, **kwargs):
+        """session.request() under the rate limits; the last response is returned as is (429 included)."""
+        import random
+        session = get_session()
+        if priority is None:
+            priority = getattr(_priority, "value", PRIORITY_INTERACTIVE)
+        limited = url.startswith(API_ROOT)
+        stream = kwargs.get("stream", False)
+        counted = priority == PRIORITY_INTERACTIVE and not stream
+        with self.cond:
+            if counted:
+                self.interactive += 1
+            elif priority >= PRIORITY_BACKGROUND and not limited:
+                self.cond.wait_for(lambda: self.interactive == 0, timeout=API_MAX_WAIT)
+        try:
+            for attempt in range(API_RETRIES + 1):
+                if limited:
+                    self._acquire(priority)
+                backoff = API_BACKOFF * 2 ** attempt * random.uniform(0.5, 1.5)
+                try:
+                    response = session.request(method, url, **kwargs)
+                except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                    if stream or method not in ("GET", "HEAD") or attempt == API_RETRIES:
+                        raise
+                    time.sleep(backoff)
+                    continue
+                if response.status_code not in (429, 503) or attempt == API_RETRIES:
+                    return response
+                delay = self._retry_after(response)
+                response.close()
+                if delay is not None and delay > API_MAX_WAIT:
+                    if limited:
+                        self._pause(delay)
+                    return response
+                if limited and response.status_code == 429:
+                    self._pause(delay if delay is not None else backoff) # _acquire() waits it out
+                else:
+                    time.sleep(delay if delay is not None else backoff)
+        finally:
+            if counted:
+                with self.cond:
+                    self.interactive -= 1
+                    self.cond.notify_all()
+
+def get_scheduler():
+    global _scheduler
+    with _session_lock:
+        if _scheduler is None:
+            _scheduler = RequestScheduler()
+        return _scheduler
+
+def api_request(method, url, **kwargs):
+    """Sends a request through the RequestScheduler (see RequestScheduler.request)."""
+    return get_scheduler().request(method, url, **kwargs)
+
+@contextlib.contextmanager
+def request_priority(priority):
+    """Requests sent by this thread inside the block get `priority`."""
+    previous = getattr(_priority, "value", PRIORITY_INTERACTIVE)
+    _priority.value = priority
+    try:
+        yield
+    finally:
+        _priority.value = previous
+
+# --- RESPONSE CACHE ---
+
+def evict_lru(cache_dir, max_bytes):
+    """Removes least-recently-used files of a cache folder until it fits in max_bytes.
+
+    Files being written (".tmp" in the name) are left alone.
+    """
+    entries = []
+    for name in os.listdir(cache_dir):
+        if ".tmp" in name:
+            continue
+        path = os.path.join(cache_dir, name)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, path))
+
+    total = sum(e[1] for e in entries)
+    for _, entry_size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+            total -= entry_size
+        except OSError:
+            pass
+
+class ResponseCache:
+    """Persistent cache of API responses, keyed by the normalized request.
+
+    Entries are JSON files; they are fresh for `ttl` seconds and evicted
+    least-recently-used first once the folder exceeds `max_bytes`. Error responses
+    are never stored. Every result gets a "cache" field with the status of the
+    lookup ("hit", "stale" or "miss") and the hit/miss counts of this process.
+    """
+
+    def __init__(self, cache_dir=RESPONSE_CACHE_DIR, ttl=RESPONSE_CACHE_TTL, max_bytes=RESPONSE_CACHE_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self.refreshing = set() # Keys being refreshed in the background
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def make_key(endpoint, params):
+        import hashlib
+        payload = json.dumps({"endpoint": endpoint, "params": params}, sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _entry_path(self, key):
+        return os.path.join(self.cache_dir, key + ".json")
+
+    def get(self, key):
+        """Returns (response, age in seconds), or (None, None)."""
+        path = self._entry_path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+            os.utime(path) # LRU: refresh the access time
+        except (OSError, ValueError):
+            return None, None
+        return entry["response"], time.time() - entry["stored"]
+
+    def put(self, key, response):
+        """Stores a response atomically and evicts old entries if needed."""
+        path = self._entry_path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"stored": time.time(), "response": response}, f)
+        os.replace(tmp_path, path)
+        self.evict()
+
+    def evict(self):
+        evict_lru(self.cache_dir, self.max_bytes)
+
+    def _store(self, key, response):
+        if "error" not in response:
+            try:
+                self.put(key, response)
+            except OSError:
+                pass # A full or read-only disk only costs the cache
+
+    def _refresh(self, key, fetch):
+        try:
+            with request_priority(PRIORITY_BACKGROUND):
+                self._store(key, fetch())
+        finally:
+            with self.lock:
+                self.refreshing.discard(key)
+
+    def fetch(self, key, fetch):
+        """Returns the cached response for `key`, or calls fetch() and caches its result."""
+        response, age = self.get(key)
+        if response is not None and age <= self.ttl:
+            status = "hit"
+        elif response is not None and RESPONSE_CACHE_SERVE_STALE and _daemon is not None:
+            status = "stale"
+            with self.lock:
+                start = key not in self.refreshing
+                self.refreshing.add(key)
+            if start:
+                threading.Thread(target=self._refresh, args=(key, fetch), daemon=True).start()
+        else:
+            status, age = "miss", 0.0
+            response = fetch()
+            self._store(key, response)
+
+        with self.lock:
+            if status == "miss":
+                self.misses += 1
+            else:
+                self.hits += 1
+            info = {"status": status, "age": round(age), "hits": self.hits, "misses": self.misses}
+        return dict(response, cache=info)
+
+def cache_key_params(params):
+    """The request parameters as the cache key sees them: the query's case and spacing and
+    the order (and case) of the tag filters do not change Freesound's answer.
+
+    Only the key is normalized; the request is sent as the user typed it.
+    """
+    import re
+    key_params = dict(params)
+    if "query" in key_params:
+        key_params["query"] = " ".join(str(key_params["query"]).split()).lower()
+    if "filter" in key_params:
+        tag_pattern = r'tag:"([^"]*)"'
+        tags = sorted({tag.strip().lower() for tag in re.findall(tag_pattern, key_params["filter"])})
+        rest = " ".join(re.sub(tag_pattern, " ", key_params["filter"]).split())
+        key_params["filter"] = " ".join([rest] + [f'tag:"{tag}"' for tag in tags]).strip()
+    return key_params
+
+def cached_request(endpoint, params, fetch):
+    """Runs fetch() through the response cache (directly when the cache is disabled)."""
+    global _response_cache
+    if RESPONSE_CACHE_TTL <= 0:
+        return fetch()
+    with _session_lock:
+        if _response_cache is None:
+            _response_cache = ResponseCache()
+    return _response_cache.fetch(ResponseCache.make_key(endpoint, cache_key_params(params)), fetch)
 
 # --- OAUTH2 FLOW FUNCTIONS ---
 
 def start_authorization(client_id):
-    """Starts the OAuth2 authorization process."""
-    global authorization_code
-    authorization_code = None # Reset code from previous attempts
-    
-    auth_url = f"https://freesound.org/apiv2/oauth2/authorize/?client_id={client_id}&response_type=code&redirect_uri={REDIRECT_URI}"
+    """Starts the OAuth2 authorization process: browser login, then waits for the callback (OAUTH_TIMEOUT)."""
+    import secrets
+    import webbrowser
+    from http.server import HTTPServer
+    from urllib.parse import urlencode
+
+    state = secrets.token_urlsafe(16) # Only the callback of this login is accepted
+    received = threading.Event()
+    codes = []
+    def on_callback(code):
+        if not received.is_set():
+            codes.append(code)
+            received.set()
+
+    query = urlencode({"client_id": client_id, "response_type": "code", "redirect_uri": REDIRECT_URI, "state": state})
+    auth_url = f"https://freesound.org/apiv2/oauth2/authorize/?{query}"
     
     httpd = None
-    server_thread = None
     try:
-        httpd = HTTPServer(('127.0.0.1', 8008), OAuthCallbackHandler)
-        
-        server_thread = threading.Thread(target=httpd.serve_forever)
-        server_thread.daemon = True
-        server_thread.start()
-        
+        httpd = HTTPServer(('127.0.0.1', 8008), make_oauth_callback_handler(state, on_callback))
+        threading.Thread(target=httpd.serve_forever, daemon=True).start()
         webbrowser.open(auth_url)
-        
-        timeout = 120
-        start_time = time.time()
-        while authorization_code is None and (time.time() - start_time) < timeout:
-            time.sleep(0.1)
-            
+        received.wait(OAUTH_TIMEOUT)
     except Exception as e:
         return {"error": f"Could not start local server. Is port 8008 in use? Details: {e}"}
     finally:
@@ -99,10 +609,11 @@ def start_authorization(client_id):
             httpd.shutdown()
             httpd.server_close()
 
-    if authorization_code:
-        return {"status": "success", "code": authorization_code}
-    else:
-        return {"error": "Authorization timed out or was cancelled."}
+    if codes and codes[0]:
+        return {"status": "success", "code": codes[0]}
+    if codes:
+        return {"error": "Authorization was denied in the browser."}
+    return {"error": "Authorization timed out or was cancelled."}
 
 
 def get_access_token(client_id, client_secret, code):
@@ -116,34 +627,187 @@ def get_access_token(client_id, client_secret, code):
         "redirect_uri": REDIRECT_URI
     }
     try:
-        response = requests.post(token_url, data=payload, timeout=10)
+        response = api_request("POST", token_url, data=payload, timeout=10)
         response.raise_for_status()
         tokens = response.json()
-        return {"status": "success", "tokens": tokens}
+        entry = get_token_store().save(client_id, tokens)
+        return {"status": "success", "tokens": dict(tokens, refresh_token=entry["refresh_token"])}
     except requests.exceptions.RequestException as e:
-        return {"error": f"Failed to get access token. Status: {e.response.status_code if e.response else 'N/A'}, Response: {e.response.text if e.response else str(e)}"}
+        if e.response is None:
+            return {"error": f"Failed to get access token. Status: N/A, Response: {e}"}
+        if e.response.status_code in (400, 401):
+            # The code was refused (expired, already used or wrong client)
+            return {"error": "The authorization was refused. Please authorize again.", "status_code": e.response.status_code}
+        return {"error": f"Failed to get access token. Status: {e.response.status_code}, Response: {e.response.text}", "status_code": e.response.status_code}
 
 def get_user_info(access_token):
     """Gets information about the logged-in user."""
     url = "https://freesound.org/apiv2/me/"
     headers = {"Authorization": f"Bearer {access_token}"}
     try:
-        response = requests.get(url, headers=headers, timeout=10)
+        response = api_request("GET", url, headers=headers, timeout=10)
         response.raise_for_status()
         return response.json()
     except requests.exceptions.RequestException as e:
-        return {"error": f"Failed to get user info. Status: {e.response.status_code if e.response else 'N/A'}"}
+        status_code = e.response.status_code if e.response is not None else None
+        return {"error": f"Failed to get user info. Status: {status_code or 'N/A'}", "status_code": status_code}
+
+# --- OAUTH2 TOKEN STORE ---
+
+class TokenStore:
+    """The OAuth2 tokens of the logged-in user, kept in TOKEN_FILE between runs.
+
+    The file holds {"client_id", "access_token", "refresh_token", "expires_at"};
+    expires_at is None for tokens handed over by the GUI (expiry unknown: they are
+    refreshed on their first 401). An access token is refreshed TOKEN_REFRESH_MARGIN
+    seconds before it expires, so the browser login only runs again when the
+    refresh token itself is refused.
+    """
+
+    def __init__(self, path=TOKEN_FILE):
+        self.path = path
+        self.lock = threading.Lock()
+
+    def load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return entry if isinstance(entry, dict) and entry.get("refresh_token") else None
+
+    def _write(self, entry):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(entry, f)
+        os.replace(tmp_path, self.path)
+
+    def save(self, client_id, tokens):
+        """Stores a token endpoint response (access_token, refresh_token, expires_in).
+
+        A response without a refresh token keeps the one stored for the same client.
+        """
+        expires_in = tokens.get("expires_in")
+        with self.lock:
+            refresh_token = tokens.get("refresh_token")
+            if not refresh_token:
+                previous = self.load()
+                if previous and previous.get("client_id") == client_id:
+                    refresh_token = previous["refresh_token"]
+            entry = {
+                "client_id": client_id,
+                "access_token": tokens["access_token"],
+                "refresh_token": refresh_token,
+                "expires_at": time.time() + float(expires_in) if expires_in else None,
+            }
+            self._write(entry)
+        return entry
+
+    def seed(self, client_id, access_token, refresh_token):
+        """Adopts tokens saved by the GUI when the store has none for this client."""
+        if not (access_token and refresh_token):
+            return
+        with self.lock:
+            entry = self.load()
+            if entry is None or entry.get("client_id") != client_id:
+                self._write({"client_id": client_id, "access_token": access_token,
+                             "refresh_token": refresh_token, "expires_at": None})
+
+    def clear(self):
+        with self.lock:
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+
+    def get(self, client_id, client_secret, force_refresh=False):
+        """A usable token entry for `client_id`, refreshed first if needed, or {"error": ...}.
+
+        The entry has "refreshed": True when new tokens were fetched.
+        """
+        with self.lock:
+            entry = self.load()
+            if entry is None or entry.get("client_id") != client_id:
+                return {"error": "Not logged in."}
+            expires_at = entry.get("expires_at")
+            if not force_refresh and (expires_at is None or expires_at - time.time() > TOKEN_REFRESH_MARGIN):
+                return entry
+
+            payload = {
+                "client_id": client_id,
+                "client_secret": client_secret,
+                "grant_type": "refresh_token",
+                "refresh_token": entry["refresh_token"],
+            }
+            try:
+                response = api_request("POST", "https://freesound.org/apiv2/oauth2/access_token/", data=payload, timeout=10)
+                response.raise_for_status()
+                tokens = response.json()
+            except (requests.exceptions.RequestException, ValueError) as e:
+                latest = self.load()
+                if latest and latest.get("refresh_token") != entry["refresh_token"]:
+                    return latest # Another process refreshed it meanwhile
+                response = getattr(e, "response", None)
+                if response is not None and response.status_code in (400, 401):
+                    try:
+                        os.remove(self.path) # The refresh token was refused: a new login is needed
+                    except OSError:
+                        pass
+                    return {"error": "Session expired. Please log in again."}
+                return {"error": f"Could not refresh the login: {e}"}
+            entry = {
+                "client_id": client_id,
+                "access_token": tokens["access_token"],
+                "refresh_token": tokens.get("refresh_token", entry["refresh_token"]),
+                "expires_at": time.time() + float(tokens["expires_in"]) if tokens.get("expires_in") else None,
+            }
+            self._write(entry)
+            return dict(entry, refreshed=True)
+
+def get_token_store():
+    global _token_store
+    with _session_lock:
+        if _token_store is None:
+            _token_store = TokenStore()
+        return _token_store
+
+def run_with_user_token(call, access_token, client_id=None, client_secret=None, refresh_token=None):
+    """Runs call(access token) -> result dict with the stored token of `client_id`.
+
+    The stored token is refreshed when it is about to expire, and once more when
+    the call still gets a 401. Without client credentials (older GUI), the given
+    access token is used as is. A result made with new tokens gets them in
+    "tokens", for the GUI's own copy.
+    """
+    if not (client_id and client_secret):
+        return call(access_token)
+    store = get_token_store()
+    store.seed(client_id, access_token, refresh_token)
+    entry = store.get(client_id, client_secret)
+    if "error" in entry:
+        return entry
+    result = call(entry["access_token"])
+    if isinstance(result, dict) and result.get("status_code") == 401:
+        entry = store.get(client_id, client_secret, force_refresh=True)
+        if "error" in entry:
+            return entry
+        result = call(entry["access_token"])
+    if entry.get("refreshed") and isinstance(result, dict):
+        result = dict(result, tokens={"access_token": entry["access_token"], "refresh_token": entry["refresh_token"]})
+    return result
 
 # --- FREESOUND API FUNCTIONS ---
 
-def search_freesound(api_key, query, cc0_only=False, max_duration=0.0, tags="", category="", page=1, sort_by="", extra_filters=None):
+def search_freesound(api_key, query, cc0_only=False, max_duration=0.0, tags="", category="", page=1, sort_by="", extra_filters=None, page_size=SEARCH_PAGE_SIZE):
     """Performs a text search using an API Key, with optional extra filters."""
     base_url = "https://freesound.org/apiv2/search/text/"
     headers = {"Authorization": f"Token {api_key}"}
     params = {
         "query": query,
-        "fields": "id,name,previews,username,duration,url,license,tags,num_downloads",
-        "page_size": 25,
+        "fields": SEARCH_FIELDS,
+        "page_size": page_size,
         "page": page
     }
     
@@ -160,133 +824,1596 @@ def search_freesound(api_key, query, cc0_only=False, max_duration=0.0, tags="",
 
     if filter_parts: params["filter"] = " ".join(filter_parts)
 
-    try:
-        response = requests.get(base_url, headers=headers, params=params, timeout=10)
-        response.raise_for_status()
-        return response.json()
-    except requests.exceptions.RequestException as e:
-        if e.response and e.response.status_code == 401:
-            return {"error": "Invalid API Key. Please check your key."}
-        return {"error": f"API Error {e.response.status_code if e.response else 'N/A'}: {e.response.text if e.response else str(e)}"}
+    def fetch():
+        try:
+            response = api_request("GET", base_url, headers=headers, params=params, timeout=10)
+            response.raise_for_status()
+            return response.json()
+        except requests.exceptions.RetryError as e:
+            return {"error": str(e), "rate_limited": True} # Our own rate limiter: the network is up, no local fallback
+        except requests.exceptions.RequestException as e:
+            if e.response is None:
+                return {"error": f"API Error N/A: {e}", "offline": True} # No answer at all: local_search can stand in
+            if e.response.status_code == 401:
+                return {"error": "Invalid API Key. Please check your key."}
+            return {"error": f"API Error {e.response.status_code}: {e.response.text}"}
+    return cached_request(base_url, params, fetch)
 
 def get_similar_sounds(api_key, sound_id, page=1):
     """Gets a list of sounds similar to the given sound ID."""
     base_url = f"https://freesound.org/apiv2/sounds/{sound_id}/similar/"
     headers = {"Authorization": f"Token {api_key}"}
     params = {
-        "fields": "id,name,previews,username,duration,url,license,tags,num_downloads",
-        "page_size": 25,
+        "fields": SEARCH_FIELDS,
+        "page_size": SEARCH_PAGE_SIZE,
         "page": page
     }
-    try:
-        response = requests.get(base_url, headers=headers, params=params, timeout=10)
-        response.raise_for_status()
-        return response.json()
-    except requests.exceptions.RequestException as e:
-        if e.response and e.response.status_code == 401:
-            return {"error": "Invalid API Key. Please check your key."}
-        return {"error": f"API Error {e.response.status_code if e.response else 'N/A'}: {e.response.text if e.response else str(e)}"}
+    def fetch():
+        try:
+            response = api_request("GET", base_url, headers=headers, params=params, timeout=10)
+            response.raise_for_status()
+            return response.json()
+        except requests.exceptions.RequestException as e:
+            if e.response is None:
+                return {"error": f"API Error N/A: {e}"}
+            if e.response.status_code == 401:
+                return {"error": "Invalid API Key. Please check your key."}
+            return {"error": f"API Error {e.response.status_code}: {e.response.text}"}
+    return cached_request(base_url, params, fetch)
+
+def batch_search(api_key, queries, cc0_only=False, max_duration=0.0, tags="", category="", sort_by=""):
+    """First result page of many queries, sharing the same filters.
+
+    The queries run BATCH_SEARCH_WORKERS at a time through the RequestScheduler,
+    behind interactive requests. Returns {"count": number of queries, "failed",
+    "searches": [{"query", "count", "results", "next"} or {"query", "error"}, ...]}
+    in the order of `queries`.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    queries = list(dict.fromkeys(q for q in queries if q.strip()))
+
+    def search(query):
+        with request_priority(PRIORITY_BATCH):
+            return search_freesound(api_key, query, cc0_only, max_duration, tags, category, 1, sort_by)
+
+    searches = []
+    if queries:
+        with ThreadPoolExecutor(max_workers=min(BATCH_SEARCH_WORKERS, len(queries))) as pool:
+            for query, result in zip(queries, pool.map(search, queries)):
+                if "error" in result:
+                    searches.append({"query": query, "error": result["error"]})
+                else:
+                    searches.append({"query": query, "count": result.get("count", 0),
+                                     "results": result.get("results", []), "next": result.get("next")})
+    return {"count": len(searches), "failed": sum(1 for search in searches if "error" in search), "searches": searches}
+
+# --- FAVORITES ---
+
+class SoundCache:
+    """Metadata of single sounds (SEARCH_FIELDS), one JSON file per sound ID.
+
+    Entries are fresh for `ttl` seconds and evicted least-recently-used first
+    beyond `max_bytes`. A sound the API no longer returns is stored as None, so a
+    deleted favorite is not asked for again on every reopening.
+    """
+
+    def __init__(self, cache_dir=SOUND_CACHE_DIR, ttl=SOUND_CACHE_TTL, max_bytes=SOUND_CACHE_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _entry_path(self, sound_id):
+        return os.path.join(self.cache_dir, f"{sound_id}.json")
+
+    def get(self, sound_id):
+        """Returns (True, sound or None) for a fresh entry, (False, None) otherwise."""
+        path = self._entry_path(sound_id)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+            os.utime(path) # LRU: refresh the access time
+        except (OSError, ValueError):
+            return False, None
+        if entry.get("fields") != SEARCH_FIELDS or time.time() - entry["stored"] > self.ttl:
+            return False, None
+        return True, entry["sound"]
+
+    def put_many(self, sounds):
+        """Stores {sound_id: sound or None} atomically, then evicts old entries once."""
+        stored = time.time()
+        for sound_id, sound in sounds.items():
+            path = self._entry_path(sound_id)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"stored": stored, "fields": SEARCH_FIELDS, "sound": sound}, f)
+            os.replace(tmp_path, path)
+        self.evict()
+
+    def evict(self):
+        evict_lru(self.cache_dir, self.max_bytes)
+
+def get_favorites_details(api_key, sound_ids):
+    """Metadata of the given sounds, in the order of `sound_ids`.
+
+    Sounds found in the SoundCache cost nothing; the others are fetched with
+    "id:1 OR id:2 ..." filters of FAVORITES_CHUNK_SIZE IDs, FAVORITES_WORKERS
+    requests at a time. A failed chunk only drops its own sounds (counted in
+    "failed"); the result is an error only when nothing could be loaded.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    sound_ids = list(dict.fromkeys(int(sid) for sid in sound_ids if str(sid).strip().isdigit()))
+    cache = SoundCache() if SOUND_CACHE_TTL > 0 else None
+    sounds = {}
+    missing = []
+    for sound_id in sound_ids:
+        found, sound = cache.get(sound_id) if cache else (False, None)
+        if found:
+            sounds[sound_id] = sound
+        else:
+            missing.append(sound_id)
+
+    def fetch_chunk(chunk):
+        id_filter = " OR ".join(f"id:{sound_id}" for sound_id in chunk)
+        return search_freesound(api_key, query="", extra_filters=id_filter, page_size=len(chunk))
+
+    chunks = [missing[i:i + FAVORITES_CHUNK_SIZE] for i in range(0, len(missing), FAVORITES_CHUNK_SIZE)]
+    failed, errors = 0, []
+    if chunks:
+        with ThreadPoolExecutor(max_workers=min(FAVORITES_WORKERS, len(chunks))) as pool:
+            responses = list(pool.map(fetch_chunk, chunks))
+        fetched = {}
+        for chunk, response in zip(chunks, responses):
+            if "error" in response:
+                failed += len(chunk)
+                errors.append(response["error"])
+                continue
+            # One page holds the whole chunk: an ID missing from it is gone from Freesound
+            fetched.update(dict.fromkeys(chunk))
+            fetched.update((sound["id"], sound) for sound in response.get("results", []) if sound.get("id") in fetched)
+        sounds.update(fetched)
+        if cache and fetched:
+            try:
+                cache.put_many(fetched)
+            except OSError:
+                pass # A full or read-only disk only costs the cache
+
+    results = [sounds[sound_id] for sound_id in sound_ids if sounds.get(sound_id) is not None]
+    if errors and not results:
+        return {"error": errors[0]}
+    return {"count": len(results), "results": results, "next": None, "previous": None, "failed": failed,
+            "cache": {"hits": len(sound_ids) - len(missing), "misses": len(missing)}}
 
 def get_sound_details_oauth(sound_id, access_token):
     """Gets detailed information for a single sound, including download URL."""
     url = f"https://freesound.org/apiv2/sounds/{sound_id}/"
     headers = {"Authorization": f"Bearer {access_token}"}
-    params = {"fields": "name,download,type"}
+    params = {"fields": f"download,type,{SEARCH_FIELDS}"} # The rest of SEARCH_FIELDS goes to the SoundIndex
     try:
-        response = requests.get(url, headers=headers, params=params, timeout=10)
+        response = api_request("GET", url, headers=headers, params=params, timeout=10)
         response.raise_for_status()
         return response.json()
     except requests.exceptions.RequestException as e:
-        return {"error": f"Failed to get sound details. Status: {e.response.status_code if e.response else 'N/A'}"}
+        status_code = e.response.status_code if e.response is not None else None
+        return {"error": f"Failed to get sound details. Status: {status_code or 'N/A'}", "status_code": status_code}
+
+class DownloadProgress:
+    """Progress of one download, written to a file the Lua GUI polls.
+
+    The file holds a Lua table: return {state = "running"|"done"|"error", received,
+    total, speed, updated, result}. Without a path, nothing is written.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self.lock = threading.Lock()
+        self.received = 0
+        self.resumed = 0 # Bytes already in the .part file when this session started (not part of the speed)
+        self.total = None
+        self.started = time.time()
+        self.last_write = 0
+
+    def add(self, count):
+        with self.lock:
+            self.received += count
+            due = time.time() - self.last_write >= PROGRESS_INTERVAL
+        if due:
+            self.write()
 
-def download_file(url, output_path, access_token=None):
-    """Downloads a file."""
+    def reset(self, received=0, total=None):
+        with self.lock:
+            self.received = received
+            self.resumed = received
+            self.total = total
+            self.started = time.time()
+
+    def write(self, state="running", result=None):
+        if not self.path:
+            return
+        with self.lock:
+            elapsed = max(1e-6, time.time() - self.started)
+            info = {"state": state, "received": self.received, "total": self.total,
+                    "speed": round((self.received - self.resumed) / elapsed), "updated": time.time(), "result": result}
+            self.last_write = time.time()
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp_path = f"{self.path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write("return " + python_to_lua(info))
+            os.replace(tmp_path, self.path)
+        except OSError:
+            pass # Progress is informative only
+
+def _adaptive_chunks(response):
+    """Yields the body of a streamed response in chunks sized to the connection speed."""
+    chunk_size = DOWNLOAD_CHUNK_MIN
+    while True:
+        start = time.perf_counter()
+        try:
+            data = response.raw.read(chunk_size, decode_content=True)
+        except requests.packages.urllib3.exceptions.HTTPError as e:
+            raise requests.exceptions.ConnectionError(e) # Cut connection: retried like any network error
+        if not data:
+            return
+        yield data
+        elapsed = time.perf_counter() - start
+        if elapsed < 0.05 and chunk_size < DOWNLOAD_CHUNK_MAX:
+            chunk_size *= 2
+        elif elapsed > 0.5 and chunk_size > DOWNLOAD_CHUNK_MIN:
+            chunk_size //= 2
+
+def _probe_download(url, headers):
+    """HEAD request: {"url": final URL, "size", "ranges": Range support, "etag"}."""
+    try:
+        response = api_request("HEAD", url, headers=headers, allow_redirects=True, timeout=10)
+        response.raise_for_status()
+    except requests.exceptions.RequestException:
+        return {"url": url, "size": None, "ranges": False, "etag": ""}
+    length = response.headers.get("Content-Length", "")
+    return {
+        "url": response.url,
+        "size": int(length) if length.isdigit() else None,
+        "ranges": response.headers.get("Accept-Ranges", "").lower() == "bytes",
+        "etag": response.headers.get("ETag", ""),
+    }
+
+def _retryable(error):
+    """Network errors and server errors are retried, client errors (404, 403...) are not."""
+    response = getattr(error, "response", None)
+    return response is None or response.status_code >= 500
+
+def _download_segment(url, headers, part_path, segment, progress, priority, analysis=None):
+    """Downloads segment = [first byte, last byte, bytes done] into the .part file, resuming on errors.
+
+    `analysis` (a DownloadAnalysis) gets the bytes in order: only given for a
+    single segment that starts at byte 0.
+    """
+    error = None
+    for attempt in range(DOWNLOAD_RETRIES + 1):
+        position = segment[0] + segment[2]
+        if position > segment[1]:
+            return
+        try:
+            range_headers = dict(headers, Range=f"bytes={position}-{segment[1]}")
+            with api_request("GET", url, priority=priority, headers=range_headers, stream=True, timeout=30) as r:
+                r.raise_for_status()
+                if r.status_code != 206:
+                    raise OSError("The server ignored the Range request.")
+                with open(part_path, "r+b") as f:
+                    f.seek(position)
+                    for data in _adaptive_chunks(r):
+                        data = data[:segment[1] + 1 - (segment[0] + segment[2])]
+                        f.write(data)
+                        f.flush() # The resume state never counts bytes that are not in the file
+                        segment[2] += len(data)
+                        progress.add(len(data))
+                        if analysis: analysis.feed(data)
+            if segment[0] + segment[2] > segment[1]:
+                return
+            error = OSError("Connection closed before the end of the segment.")
+        except (requests.exceptions.RequestException, OSError) as e:
+            if not _retryable(e):
+                raise
+            error = e
+        if attempt < DOWNLOAD_RETRIES:
+            time.sleep(min(2 ** attempt, 5))
+    raise error
+
+def _download_stream(url, headers, part_path, progress, priority, analysis=None):
+    """Single connection without Range support: restarts from zero on errors. Returns the size or None."""
+    error = None
+    for attempt in range(DOWNLOAD_RETRIES + 1):
+        try:
+            with api_request("GET", url, priority=priority, headers=headers, stream=True, timeout=30) as r:
+                r.raise_for_status()
+                length = r.headers.get("Content-Length", "")
+                total = int(length) if length.isdigit() else None
+                progress.reset(0, total)
+                if analysis: analysis.reset()
+                with open(part_path, "wb") as f:
+                    for data in _adaptive_chunks(r):
+                        f.write(data)
+                        progress.add(len(data))
+                        if analysis: analysis.feed(data)
+            return total
+        except (requests.exceptions.RequestException, OSError) as e:
+            if not _retryable(e):
+                raise
+            error = e
+        if attempt < DOWNLOAD_RETRIES:
+            time.sleep(min(2 ** attempt, 5))
+    raise error
+
+def _load_segments(state_path, part_path, identity):
+    """Segments saved by an interrupted download of the same file, or None."""
+    try:
+        with open(state_path, "r", encoding="utf-8") as f:
+            state = json.load(f)
+        if state.get("identity") == identity and os.path.getsize(part_path) == identity["size"]:
+            return state["segments"]
+    except (OSError, ValueError, KeyError):
+        pass
+    return None
+
+def _save_segments(state_path, identity, segments):
+    tmp_path = state_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"identity": identity, "segments": segments}, f)
+    os.replace(tmp_path, state_path)
+
+def _segments_complete(segments, size):
+    """True when the segments cover bytes 0..size-1 and each one was written to its end.
+
+    The .part file is preallocated to its full size, so its size tells nothing: only
+    the bytes counted by the segments are known to be in it.
+    """
+    position = 0
+    for first, last, done in sorted(segments):
+        if first != position or done != last - first + 1:
+            return False
+        position = last + 1
+    return position == size
+
+def download_file(url, output_path, access_token=None, progress_path=None, analyze=False):
+    """Downloads a file.
+
+    The data goes to output_path + ".part", renamed once it is verified complete. With
+    HTTP Range support, an interrupted download resumes where it stopped (also in a
+    later call, from the ".part.json" state), and files of DOWNLOAD_SEGMENT_MIN_BYTES
+    or more are fetched as DOWNLOAD_SEGMENTS concurrent segments.
+
+    With `analyze` (and ANALYZE_DOWNLOADS), the result gets the file's "analysis"
+    (see AudioAnalysis; the peak envelope goes to the SoundIndex only). A WAV file
+    downloaded in order is analyzed while its chunks arrive, anything else after.
+    """
+    from concurrent.futures import ThreadPoolExecutor, wait
+    from urllib.parse import urlparse
+    priority = getattr(_priority, "value", PRIORITY_INTERACTIVE) # The segment threads inherit it
+    progress = DownloadProgress(progress_path)
+    analysis = DownloadAnalysis() if analyze and ANALYZE_DOWNLOADS and _analysis_modules() else None
+    part_path = output_path + ".part"
+    state_path = part_path + ".json"
     try:
         directory = os.path.dirname(output_path)
         if not os.path.exists(directory): os.makedirs(directory)
         
-        headers = {}
+        headers = {"Accept-Encoding": "identity"} # Sizes and ranges refer to the file itself
         if access_token: headers["Authorization"] = f"Bearer {access_token}"
 
-        with requests.get(url, headers=headers, stream=True, timeout=30) as r:
-            r.raise_for_status()
-            with open(output_path, 'wb') as f:
-                for chunk in r.iter_content(chunk_size=8192):
-                    f.write(chunk)
-        return {"status": "success", "path": output_path}
+        source = _probe_download(url, headers)
+        if urlparse(source["url"]).netloc != urlparse(url).netloc:
+            headers.pop("Authorization", None) # Redirected to a CDN: the token stays with the API
+        progress.write()
+
+        segments, identity = None, None
+        if source["ranges"] and source["size"]:
+            identity = {"url": url, "size": source["size"], "etag": source["etag"]}
+            segments = _load_segments(state_path, part_path, identity)
+            if segments is None:
+                size = source["size"]
+                count = DOWNLOAD_SEGMENTS if size >= DOWNLOAD_SEGMENT_MIN_BYTES else 1
+                bounds = [size * i // count for i in range(count + 1)]
+                segments = [[bounds[i], bounds[i + 1] - 1, 0] for i in range(count)]
+                with open(part_path, "wb") as f:
+                    f.truncate(size)
+            progress.reset(sum(segment[2] for segment in segments), source["size"])
+            if analysis and (len(segments) > 1 or segments[0][2]):
+                analysis = analysis.after_download() # Bytes out of order: analyzed once the file is complete
+
+        with ThreadPoolExecutor(max_workers=len(segments or [None])) as pool:
+            if segments:
+                futures = [pool.submit(_download_segment, source["url"], headers, part_path, segment, progress, priority, analysis)
+                           for segment in segments]
+            else:
+                futures = [pool.submit(_download_stream, source["url"], headers, part_path, progress, priority, analysis)]
+            while wait(futures, timeout=PROGRESS_INTERVAL).not_done:
+                if segments:
+                    _save_segments(state_path, identity, segments)
+                progress.write() # Also while no data flows (the GUI detects stalls)
+        if segments:
+            _save_segments(state_path, identity, segments)
+        results = [future.result() for future in futures] # Raises the error of a failed segment (the .part is kept)
+        size = source["size"] if segments else results[0]
+
+        if segments and not _segments_complete(segments, size):
+            done = sum(segment[2] for segment in segments)
+            raise OSError(f"Incomplete download: {done} of {size} bytes.") # The .part and its state stay for a resume
+        if size is not None and os.path.getsize(part_path) != size:
+            raise OSError(f"Incomplete download: {os.path.getsize(part_path)} of {size} bytes.")
+        os.replace(part_path, output_path)
+        if os.path.exists(state_path): os.remove(state_path)
+        result = {"status": "success", "path": output_path}
+        if analysis:
+            info = analysis.finish(output_path)
+            if info:
+                store_analysis(output_path, info)
+                result["analysis"] = analysis_summary(info)
+        progress.write("done", result)
+        return result
     except Exception as e:
+        result = {"status": "error", "message": str(e)}
+        progress.write("error", result)
+        return result
+
+def download_original(sound_id, download_path, access_token, progress_path=None, client=()):
+    """Downloads the original file of a sound into `download_path` (OAuth2).
+
+    client = (client_id, client_secret, refresh_token) lets an expired access token
+    be refreshed on the way (see run_with_user_token).
+    """
+    used_tokens = []
+    def fetch_details(token):
+        used_tokens.append(token)
+        return get_sound_details_oauth(sound_id, token)
+    details = run_with_user_token(fetch_details, access_token, *client)
+    if "error" in details:
+        DownloadProgress(progress_path).write("error", details)
+        return details
+    original_filename = f"{details['name']}.{details['type']}"
+    safe_filename = "".join(c for c in original_filename if c.isalnum() or c in '._-').rstrip()
+    full_path = os.path.join(download_path, safe_filename)
+    result = download_file(details['download'], full_path, used_tokens[-1], progress_path, analyze=True)
+    if result.get("status") == "success":
+        index_sounds([details], local_path=result["path"], analysis=result.get("analysis"))
+    if "tokens" in details and isinstance(result, dict):
+        result = dict(result, tokens=details["tokens"])
+    return result
+
+def run_in_background(function, *args):
+    """Runs a function after the reply, on a thread of the daemon (which stays up meanwhile)."""
+    _daemon.request_started()
+    def run():
+        try:
+            function(*args)
+        finally:
+            _daemon.request_finished()
+    threading.Thread(target=run, daemon=True).start()
+
+# --- PREVIEW CACHE ---
+
+class PreviewCache:
+    """Local copies of preview files, evicted least-recently-used first beyond `max_bytes`.
+
+    A preview URL always serves the same file, so the file is stored under the
+    SHA-256 of its URL. Concurrent requests for one URL (a prefetch and a click)
+    download it once: the later ones wait for the first.
+    """
+
+    def __init__(self, cache_dir=PREVIEW_CACHE_DIR, max_bytes=PREVIEW_CACHE_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.inflight = {} # URL: threading.Event set when its download ended
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _entry_path(self, url):
+        import hashlib
+        from urllib.parse import urlparse
+        extension = os.path.splitext(urlparse(url).path)[1] or ".mp3"
+        return os.path.join(self.cache_dir, hashlib.sha256(url.encode("utf-8")).hexdigest() + extension)
+
+    def get(self, url):
+        """Returns the cached file of `url`, or None."""
+        path = self._entry_path(url)
+        try:
+            os.utime(path) # LRU: refresh the access time
+        except OSError:
+            return None
+        return path
+
+    def fetch(self, url):
+        """Returns ({"status": "success", "path": ...} or an error dict, cached)."""
+        path = self.get(url)
+        if path:
+            return {"status": "success", "path": path}, True
+        with self.lock:
+            event = self.inflight.get(url)
+            owner = event is None
+            if owner:
+                event = self.inflight[url] = threading.Event()
+        if not owner:
+            event.wait(60)
+            path = self.get(url)
+            if path:
+                return {"status": "success", "path": path}, True
+        try:
+            path = self._entry_path(url)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            result = download_file(url, tmp_path)
+            if result.get("status") != "success":
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                return result, False
+            os.replace(tmp_path, path)
+            self.evict()
+            return {"status": "success", "path": path}, False
+        finally:
+            if owner:
+                with self.lock:
+                    self.inflight.pop(url, None)
+                event.set()
+
+    def evict(self):
+        evict_lru(self.cache_dir, self.max_bytes)
+
+def get_preview_cache():
+    global _preview_cache
+    with _session_lock:
+        if _preview_cache is None:
+            _preview_cache = PreviewCache()
+        return _preview_cache
+
+def download_preview(url, output_path):
+    """Copies the preview to `output_path`, from the preview cache (downloading it first if needed)."""
+    import shutil
+    result, cached = get_preview_cache().fetch(url)
+    if result.get("status") != "success":
+        return result
+    try:
+        directory = os.path.dirname(output_path)
+        if directory and not os.path.exists(directory): os.makedirs(directory)
+        if os.path.exists(output_path): os.remove(output_path)
+        try:
+            os.link(result["path"], output_path) # Same volume: no copy, and eviction keeps the link
+        except OSError:
+            shutil.copyfile(result["path"], output_path)
+    except OSError as e:
         return {"status": "error", "message": str(e)}
+    cache_path = result["path"]
+    result = {"status": "success", "path": output_path, "cached": cached}
+    if ANALYZE_DOWNLOADS and _daemon is not None: # A one-shot audition does not pay for opening the index (see get_analysis)
+        info = load_analysis(cache_path)
+        if info:
+            result["analysis"] = analysis_summary(info)
+        else:
+            run_in_background(analyze_preview, cache_path, None) # Ready for the next audition; the reply does not wait
+    return result
 
-# --- MAIN EXECUTION BLOCK ---
+def prefetch_previews(urls, wait=False, sound_ids=None):
+    """Downloads previews into the cache on the prefetch thread pool, then analyzes them.
 
-if __name__ == "__main__":
+    `sound_ids` maps URLs to their sound, whose loudness then goes to the SoundIndex.
+
+    Returns the counts {"cached", "downloaded", "failed"} when `wait` is set,
+    otherwise returns at once.
+    """
+    global _prefetch_pool
+    from concurrent.futures import ThreadPoolExecutor
+    cache = get_preview_cache()
+    with _session_lock:
+        if _prefetch_pool is None:
+            _prefetch_pool = ThreadPoolExecutor(max_workers=PREFETCH_WORKERS, thread_name_prefix="prefetch")
+    def fetch(url):
+        with request_priority(PRIORITY_BACKGROUND):
+            result, cached = cache.fetch(url)
+        if ANALYZE_DOWNLOADS and result.get("status") == "success":
+            analyze_preview(result["path"], sound_ids.get(url))
+        return result, cached
+    sound_ids = sound_ids or {}
+    futures = [_prefetch_pool.submit(fetch, url) for url in dict.fromkeys(urls)]
+    if not wait:
+        return None
+    counts = {"cached": 0, "downloaded": 0, "failed": 0}
+    for future in futures:
+        result, cached = future.result()
+        if result.get("status") != "success":
+            counts["failed"] += 1
+        else:
+            counts["cached" if cached else "downloaded"] += 1
+    return counts
+
+def preview_urls(result_obj):
+    """The PREFETCH_QUALITY preview URLs of a search / similar / favorites result: {url: sound ID}."""
+    sounds = result_obj.get("results") if isinstance(result_obj, dict) else None
+    return {sound["previews"][PREFETCH_QUALITY]: sound.get("id") for sound in sounds or []
+            if isinstance(sound.get("previews"), dict) and sound["previews"].get(PREFETCH_QUALITY)}
+
+# --- AUDIO ANALYSIS ---
+
+def _analysis_modules():
+    """(numpy, scipy.signal), or None when they are not installed: downloads are then not analyzed."""
+    try:
+        import numpy
+        from scipy import signal
+    except ImportError:
+        return None
+    return numpy, signal
+
+def _k_weighting_sos(samplerate):
+    """The two K-weighting biquads of ITU-R BS.1770 (high shelf, high pass) for `samplerate`, as SOS rows.
+
+    Bilinear transforms of the analog filters behind the standard's 48 kHz
+    coefficients, which they reproduce at 48 kHz.
+    """
+    import math
+    # High shelf: +4 dB above about 1.7 kHz
+    k = math.tan(math.pi * 1681.974450955533 / samplerate)
+    q, high_gain = 0.7071752369554196, 10 ** (3.999843853973347 / 20)
+    band_gain = high_gain ** 0.4996667741545416
+    a0 = 1 + k / q + k * k
+    shelf = [(high_gain + band_gain * k / q + k * k) / a0, 2 * (k * k - high_gain) / a0, (high_gain - band_gain * k / q + k * k) / a0,
+             1.0, 2 * (k * k - 1) / a0, (1 - k / q + k * k) / a0]
+    # High pass at 38 Hz
+    k = math.tan(math.pi * 38.13547087602444 / samplerate)
+    q = 0.5003270373238773
+    a0 = 1 + k / q + k * k
+    high_pass = [1.0, -2.0, 1.0, 1.0, 2 * (k * k - 1) / a0, (1 - k / q + k * k) / a0]
+    return [shelf, high_pass]
+
+def _channel_weights(channels):
+    """BS.1770 channel weights: surround channels of a 5.0 / 5.1 layout count 1.41, the LFE not at all."""
+    weights = [1.0] * channels
+    if channels == 5:
+        weights[3:] = [1.41, 1.41]
+    elif channels == 6:
+        weights[3:] = [0.0, 1.41, 1.41]
+    return weights
+
+class AudioAnalysis:
+    """Peak envelope, integrated loudness and true peak of a signal fed block by block.
+
+    add() takes float blocks (frames, channels) of any length: the filter states,
+    the partial envelope point and the partial 100 ms loudness step are carried
+    over, so the result does not depend on the block boundaries. Loudness is
+    ITU-R BS.1770-4 (K-weighted, 400 ms blocks, absolute and relative gating);
+    a sound shorter than one block is measured as a whole. True peak is the
+    peak of the signal oversampled 4x.
+    """
+
+    TRUE_PEAK_TAPS = 48 # Interpolation filter (12 taps per phase)
+    TRUE_PEAK_CHUNK = 8192 # Frames per matrix product of the interpolation (bounds its temporary arrays)
+
+    def __init__(self, samplerate, channels):
+        np, signal = _analysis_modules()
+        self.np, self.signal = np, signal
+        self.samplerate, self.channels = samplerate, channels
+        self.frames = 0
+        self.sample_peak = 0.0
+        self.true_peak = 0.0
+        self.k_sos = np.array(_k_weighting_sos(samplerate))
+        self.k_state = np.zeros((len(self.k_sos), 2, channels))
+        interpolator = signal.firwin(self.TRUE_PEAK_TAPS, 0.25) * 4 # Low pass at the original Nyquist, gain of the zero stuffing
+        # The 4 phases as one (taps, 4) matrix, reversed: a window of the input times it gives the 4 interpolated samples
+        self.tp_kernel = np.array([interpolator[phase::4] for phase in range(4)])[:, ::-1].T.copy()
+        self.tp_history = np.zeros((len(self.tp_kernel) - 1, channels))
+        self.step_frames = max(1, round(samplerate * 0.1)) # Gating blocks are 4 steps, overlapping by 3
+        self.step_pending = np.zeros((0, channels))
+        self.step_energies = []
+        self.total_energy = np.zeros(channels)
+        self.peak_frames = max(1, round(samplerate / ANALYSIS_PEAK_RATE))
+        self.peak_pending = np.zeros((0, channels))
+        self.peaks_min, self.peaks_max = [], []
+
+    def _segments(self, pending, block, size):
+        """Splits pending + block into full segments (count, size, channels) and the remainder."""
+        data = self.np.concatenate([pending, block]) if len(pending) else block
+        count = len(data) // size
+        return data[:count * size].reshape(count, size, self.channels), data[count * size:]
+
+    def add(self, block):
+        np, signal = self.np, self.signal
+        block = np.asarray(block, dtype=np.float64).reshape(-1, self.channels)
+        if not len(block):
+            return
+        self.frames += len(block)
+        self.sample_peak = max(self.sample_peak, float(np.abs(block).max()))
+        from numpy.lib.stride_tricks import sliding_window_view
+        taps = len(self.tp_kernel)
+        history_block = np.concatenate([self.tp_history, block])
+        for start in range(0, len(block), self.TRUE_PEAK_CHUNK):
+            windows = sliding_window_view(history_block[start:start + self.TRUE_PEAK_CHUNK + taps - 1], taps, axis=0)
+            self.true_peak = max(self.true_peak, float(np.abs(windows @ self.tp_kernel).max()))
+        self.tp_history = history_block[-(taps - 1):]
+
+        weighted, self.k_state = signal.sosfilt(self.k_sos, block, axis=0, zi=self.k_state)
+        squared = weighted * weighted
+        self.total_energy += squared.sum(axis=0)
+        steps, self.step_pending = self._segments(self.step_pending, squared, self.step_frames)
+        if len(steps):
+            self.step_energies.append(steps.mean(axis=1))
+
+        points, self.peak_pending = self._segments(self.peak_pending, block, self.peak_frames)
+        if len(points):
+            self.peaks_min.append(points.min(axis=(1, 2)))
+            self.peaks_max.append(points.max(axis=(1, 2)))
+
+    def _loudness(self):
+        np = self.np
+        weights = np.array(_channel_weights(self.channels))
+        steps = np.concatenate(self.step_energies) if self.step_energies else np.zeros((0, self.channels))
+        if len(steps) >= 4:
+            blocks = (steps[:-3] + steps[1:-2] + steps[2:-1] + steps[3:]) / 4 # 400 ms, every 100 ms
+        else:
+            blocks = (self.total_energy / max(self.frames, 1))[np.newaxis] # Shorter than one block: the whole sound
+        energies = blocks @ weights
+        with np.errstate(divide="ignore"):
+            levels = -0.691 + 10 * np.log10(energies)
+        gated = levels > -70.0
+        if not gated.any():
+            return None # Silence
+        relative_gate = -0.691 + 10 * np.log10(energies[gated].mean()) - 10.0
+        gated &= levels > relative_gate
+        return -0.691 + 10 * np.log10(energies[gated].mean())
+
+    def result(self):
+        """{"duration", "samplerate", "channels", "loudness" (LUFS), "true_peak" (dBTP), "sample_peak" (dBFS),
+        "peak_rate" (points per second), "peaks": [minima, maxima]}; levels are None for silence."""
+        np = self.np
+        peaks_min, peaks_max = list(self.peaks_min), list(self.peaks_max)
+        if len(self.peak_pending):
+            peaks_min.append(self.peak_pending.min(keepdims=True).reshape(1))
+            peaks_max.append(self.peak_pending.max(keepdims=True).reshape(1))
+        def decibels(value):
+            return round(20 * float(np.log10(value)), 2) if value > 0 else None
+        loudness = self._loudness()
+        return {
+            "duration": round(self.frames / self.samplerate, 3),
+            "samplerate": self.samplerate,
+            "channels": self.channels,
+            "loudness": round(float(loudness), 2) if loudness is not None else None,
+            "true_peak": decibels(max(self.true_peak, self.sample_peak)),
+            "sample_peak": decibels(self.sample_peak),
+            "peak_rate": round(self.samplerate / self.peak_frames, 3),
+            "peaks": [np.round(np.concatenate(peaks), 4).tolist() if peaks else [] for peaks in (peaks_min, peaks_max)],
+        }
+
+class WavStreamDecoder:
+    """Decodes a WAV file (PCM 8/16/24/32 bit, float 32/64) from its bytes, as they arrive.
+
+    feed(data) returns the samples completed by `data` as floats (frames, channels),
+    or None. `format` is (samplerate, channels) once the header is read. `failed`
+    is set for anything else than a plain WAV file, `done` after the data chunk.
+    """
+
+    def __init__(self, np):
+        self.np = np
+        self.buffer = bytearray()
+        self.state = "riff" # riff, chunk, fmt, skip, data, end
+        self.needed = 12
+        self.format = None
+        self.encoding = None # (kind, bytes per sample)
+        self.remaining = 0 # Bytes left in the current chunk
+        self.failed = False
+
+    @property
+    def done(self):
+        return self.state == "end"
+
+    def _parse_fmt(self, header):
+        if len(header) < 16:
+            self.failed = True
+            return
+        tag, channels, samplerate = int.from_bytes(header[0:2], "little"), int.from_bytes(header[2:4], "little"), int.from_bytes(header[4:8], "little")
+        bits = int.from_bytes(header[14:16], "little")
+        if tag == 0xFFFE and len(header) >= 26:
+            tag = int.from_bytes(header[24:26], "little") # WAVE_FORMAT_EXTENSIBLE: the subformat
+        kinds = {(1, 8): "u8", (1, 16): "<i2", (1, 24): "i24", (1, 32): "<i4", (3, 32): "<f4", (3, 64): "<f8"}
+        if (tag, bits) not in kinds or not channels or not samplerate:
+            self.failed = True
+            return
+        self.format = (samplerate, channels)
+        self.encoding = (kinds[(tag, bits)], bits // 8)
+
+    def _decode(self, data):
+        np = self.np
+        kind, width = self.encoding
+        if kind == "u8":
+            return (np.frombuffer(data, np.uint8).astype(np.float32) - 128) / 128
+        if kind == "i24":
+            raw = np.frombuffer(data, np.uint8).reshape(-1, 3).astype(np.int32)
+            values = raw[:, 0] | (raw[:, 1] << 8) | (raw[:, 2] << 16)
+            return ((values ^ 0x800000) - 0x800000).astype(np.float32) / 8388608
+        values = np.frombuffer(data, kind)
+        if kind[1] == "i":
+            return values.astype(np.float32) / float(2 ** (8 * width - 1))
+        return values
+
+    def feed(self, data):
+        if self.failed or self.done:
+            return None
+        self.buffer += data
+        while not self.failed:
+            if self.state == "data":
+                frame_bytes = self.encoding[1] * self.format[1]
+                usable = min(len(self.buffer), self.remaining)
+                usable -= usable % frame_bytes
+                samples = None
+                if usable:
+                    samples = self._decode(bytes(self.buffer[:usable])).reshape(-1, self.format[1])
+                    del self.buffer[:usable]
+                    self.remaining -= usable
+                if self.remaining < frame_bytes:
+                    self.state = "end"
+                return samples
+            if self.state == "skip":
+                skipped = min(len(self.buffer), self.remaining)
+                del self.buffer[:skipped]
+                self.remaining -= skipped
+                if self.remaining:
+                    return None
+                self.state, self.needed = "chunk", 8
+                continue
+            if self.state == "end" or len(self.buffer) < self.needed:
+                return None
+            header = bytes(self.buffer[:self.needed])
+            del self.buffer[:self.needed]
+            if self.state == "riff":
+                if header[0:4] != b"RIFF" or header[8:12] != b"WAVE":
+                    self.failed = True
+                self.state, self.needed = "chunk", 8
+            elif self.state == "chunk":
+                chunk_id, size = header[0:4], int.from_bytes(header[4:8], "little")
+                if chunk_id == b"fmt ":
+                    self.state, self.needed, self.remaining = "fmt", size, size % 2 # The fmt chunk, then its pad byte
+                elif chunk_id == b"data":
+                    if self.format is None:
+                        self.failed = True
+                    self.state, self.remaining = "data", size if size not in (0, 0xFFFFFFFF) else float("inf") # 0 / -1: written while streaming
+                else:
+                    self.state, self.remaining = "skip", size + size % 2
+            elif self.state == "fmt":
+                self._parse_fmt(header)
+                self.state = "skip" # The pad byte, if any
+        return None
+
+class DownloadAnalysis:
+    """Analysis of a file while it is downloaded: WAV bytes are decoded and analyzed
+    as they arrive; other files (or bytes that came out of order) are read by
+    finish() once the download is complete.
+    """
+
+    def __init__(self, streaming=True):
+        self.streaming = streaming
+        self.reset()
+
+    def reset(self):
+        """The download starts again from byte 0."""
+        np = _analysis_modules()[0]
+        self.decoder = WavStreamDecoder(np) if self.streaming else None
+        self.analysis = None
+
+    def after_download(self):
+        """This download arrives out of order: returns an analysis that only runs in finish()."""
+        return DownloadAnalysis(streaming=False)
+
+    def feed(self, data):
+        if self.decoder is None or self.decoder.failed:
+            return
+        try:
+            samples = self.decoder.feed(data)
+            if self.analysis is None and self.decoder.format:
+                self.analysis = AudioAnalysis(*self.decoder.format)
+            if samples is not None:
+                self.analysis.add(samples)
+        except Exception: # Never fails the download: the file is analyzed in finish() instead
+            self.decoder.failed = True
+
+    def finish(self, path):
+        """The analysis of the downloaded file at `path` (see AudioAnalysis.result), or None."""
+        if self.decoder is not None and not self.decoder.failed and self.analysis is not None:
+            return dict(self.analysis.result(), streamed=True)
+        return analyze_file(path)
+
+def analyze_file(path):
+    """Analyzes a finished file: WAV directly, other formats through soundfile. None when it cannot be read."""
+    modules = _analysis_modules()
+    if not modules:
+        return None
+    decoder, analysis = WavStreamDecoder(modules[0]), None
+    try:
+        with open(path, "rb") as f:
+            while not (decoder.failed or decoder.done):
+                data = f.read(1024 * 1024)
+                if not data:
+                    break
+                samples = decoder.feed(data)
+                if analysis is None and decoder.format:
+                    analysis = AudioAnalysis(*decoder.format)
+                if samples is not None:
+                    analysis.add(samples)
+        if not decoder.failed and analysis is not None:
+            return dict(analysis.result(), streamed=False)
+        import soundfile
+        with soundfile.SoundFile(path) as f:
+            analysis = AudioAnalysis(f.samplerate, f.channels)
+            for block in f.blocks(ANALYSIS_BLOCK_FRAMES, dtype="float32", always_2d=True):
+                analysis.add(block)
+        return dict(analysis.result(), streamed=False)
+    except (ImportError, OSError, RuntimeError, ValueError) as e: # soundfile's LibsndfileError is a RuntimeError
+        print(f"Could not analyze {path}: {e}", file=sys.stderr)
+        return None
+
+def analysis_summary(info):
+    """The analysis without its peak envelope (which stays in the SoundIndex)."""
+    return {key: value for key, value in info.items() if key != "peaks"}
+
+def store_analysis(path, info, sound_id=None):
+    """Keeps the analysis of the file at `path` (and the loudness of `sound_id`) in the SoundIndex."""
+    if not SOUND_INDEX_ENABLED:
+        return
+    import sqlite3
+    try:
+        index = get_sound_index()
+        index.put_analysis(path, info)
+        if sound_id is not None:
+            index.set_levels(sound_id, info)
+    except (sqlite3.Error, OSError) as e:
+        print(f"Analysis not stored: {e}", file=sys.stderr)
+
+def load_analysis(path):
+    """The stored analysis of the file at `path` if it is still the same file, or None."""
+    if not SOUND_INDEX_ENABLED:
+        return None
+    import sqlite3
+    try:
+        return get_sound_index().get_analysis(path)
+    except (sqlite3.Error, OSError):
+        return None
+
+def analyze_preview(path, sound_id):
+    """Analyzes a cached preview once (prefetch, or after the first audition in the daemon)."""
+    if load_analysis(path) or not _analysis_modules():
+        return
+    info = analyze_file(path)
+    if info:
+        store_analysis(path, info, sound_id)
+
+# --- LOCAL SOUND INDEX ---
+
+class SoundIndex:
+    """Every sound the helper has handled, in a SQLite database with a full-text index.
+
+    The sounds of search / similar / favorites results are recorded as they pass
+    through run_mode, a downloaded original also gets its local path. local_search
+    answers from this database alone: offline, in milliseconds. Name, tags and
+    username are indexed by FTS5; an SQLite built without FTS5 falls back to LIKE.
+    """
+
+    SCHEMA_VERSION = 2
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS sounds (
+            id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL DEFAULT '',
+            tags TEXT NOT NULL DEFAULT '',
+            username TEXT NOT NULL DEFAULT '',
+            license TEXT NOT NULL DEFAULT '',
+            category TEXT NOT NULL DEFAULT '',
+            duration REAL,
+            num_downloads INTEGER,
+            local_path TEXT,
+            sound TEXT NOT NULL,
+            seen REAL NOT NULL,
+            loudness REAL,
+            true_peak REAL
+        );
+        CREATE INDEX IF NOT EXISTS sounds_seen ON sounds (seen);
+        CREATE TABLE IF NOT EXISTS analysis (
+            path TEXT PRIMARY KEY,
+            size INTEGER NOT NULL,
+            inode INTEGER NOT NULL,
+            analysis TEXT NOT NULL
+        );
+    """
+    FTS_SCHEMA = """
+        CREATE VIRTUAL TABLE IF NOT EXISTS sounds_fts USING fts5(
+            name, tags, username, content='sounds', content_rowid='id', tokenize='unicode61 remove_diacritics 2');
+        CREATE TRIGGER IF NOT EXISTS sounds_fts_insert AFTER INSERT ON sounds BEGIN
+            INSERT INTO sounds_fts (rowid, name, tags, username) VALUES (new.id, new.name, new.tags, new.username);
+        END;
+        CREATE TRIGGER IF NOT EXISTS sounds_fts_delete AFTER DELETE ON sounds BEGIN
+            INSERT INTO sounds_fts (sounds_fts, rowid, name, tags, username) VALUES ('delete', old.id, old.name, old.tags, old.username);
+        END;
+        CREATE TRIGGER IF NOT EXISTS sounds_fts_update AFTER UPDATE OF name, tags, username ON sounds BEGIN
+            INSERT INTO sounds_fts (sounds_fts, rowid, name, tags, username) VALUES ('delete', old.id, old.name, old.tags, old.username);
+            INSERT INTO sounds_fts (rowid, name, tags, username) VALUES (new.id, new.name, new.tags, new.username);
+        END;
+    """
+    ORDER_BY = {
+        "downloads_desc": "num_downloads DESC",
+        "duration_asc": "duration ASC",
+        "duration_desc": "duration DESC",
+        "loudness_asc": "loudness IS NULL, loudness ASC", # Not measured yet: last
+        "loudness_desc": "loudness IS NULL, loudness DESC",
+    }
+
+    def __init__(self, path=SOUND_INDEX_FILE):
+        import sqlite3
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, timeout=5, check_same_thread=False) # Shared by the daemon's threads, under self.lock
+        self.db.execute("PRAGMA journal_mode=WAL") # Readers are not blocked by the recording of a result page
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.fts = bool(self.db.execute("SELECT count(*) FROM sqlite_master WHERE name = 'sounds_fts'").fetchone()[0])
+        if self.db.execute("PRAGMA user_version").fetchone()[0] != self.SCHEMA_VERSION:
+            with self.db:
+                self.db.executescript(self.SCHEMA)
+                columns = {row[1] for row in self.db.execute("PRAGMA table_info(sounds)")}
+                for column in ("loudness", "true_peak"): # Added in version 2
+                    if column not in columns:
+                        self.db.execute(f"ALTER TABLE sounds ADD COLUMN {column} REAL")
+                try:
+                    self.db.executescript(self.FTS_SCHEMA)
+                    self.db.execute("INSERT INTO sounds_fts (sounds_fts) VALUES ('rebuild')")
+                    self.fts = True
+                except sqlite3.OperationalError:
+                    self.fts = False # No FTS5 in this SQLite
+                self.db.execute(f"PRAGMA user_version = {self.SCHEMA_VERSION}")
+
+    def record(self, sounds, local_path=None):
+        """Inserts or updates sounds (API result dicts); `local_path` is set on all of them."""
+        fields = SEARCH_FIELDS.split(",")
+        seen = time.time()
+        rows = []
+        for sound in sounds:
+            if not isinstance(sound, dict) or sound.get("id") is None:
+                continue
+            tags = sound.get("tags") or []
+            rows.append((
+                int(sound["id"]), sound.get("name") or "", " ".join(tags) if isinstance(tags, list) else str(tags),
+                sound.get("username") or "", sound.get("license") or "", sound.get("category") or "",
+                sound.get("duration"), sound.get("num_downloads"), local_path,
+                json.dumps({key: sound[key] for key in fields if key in sound}), seen,
+            ))
+        if not rows:
+            return 0
+        with self.lock, self.db:
+            self.db.executemany("""
+                INSERT INTO sounds (id, name, tags, username, license, category, duration, num_downloads, local_path, sound, seen)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (id) DO UPDATE SET
+                    name = excluded.name, tags = excluded.tags, username = excluded.username,
+                    license = excluded.license, category = excluded.category, duration = excluded.duration,
+                    num_downloads = excluded.num_downloads, sound = excluded.sound, seen = excluded.seen,
+                    local_path = coalesce(excluded.local_path, local_path)
+            """, rows)
+        return len(rows)
+
+    def search(self, query, cc0_only=False, max_duration=0.0, tags="", category="", page=1, sort_by="", page_size=SEARCH_PAGE_SIZE):
+        """A search / get_similar shaped result for the recorded sounds, with the filters of search_freesound."""
+        words = query.split()
+        tables, where, args = "sounds", [], []
+        if words and self.fts:
+            # Every word is a quoted prefix ("wat"* finds water): user input cannot break the MATCH syntax
+            tables = "sounds JOIN sounds_fts ON sounds_fts.rowid = sounds.id"
+            where.append("sounds_fts MATCH ?")
+            args.append(" ".join('"' + word.replace('"', '""') + '"*' for word in words))
+        else:
+            for word in words:
+                where.append(r"(name LIKE ? ESCAPE '\' OR tags LIKE ? ESCAPE '\' OR username LIKE ? ESCAPE '\')")
+                args.extend([f"%{_like_escape(word)}%"] * 3)
+        if cc0_only:
+            where.append("license LIKE '%publicdomain/zero/%'")
+        if max_duration > 0:
+            where.append("duration <= ?")
+            args.append(max_duration)
+        for tag in [t.strip() for t in tags.split(',') if t.strip()]:
+            where.append(r"(' ' || lower(tags) || ' ') LIKE ? ESCAPE '\'")
+            args.append(f"% {_like_escape(tag)} %")
+        if category and category.lower() != "any":
+            where.append("category = ? COLLATE NOCASE")
+            args.append(category)
+
+        where_sql = f" WHERE {' AND '.join(where)}" if where else ""
+        relevance = "bm25(sounds_fts, 10.0, 5.0, 1.0)" if words and self.fts else "seen DESC" # Name > tags > username
+        order_sql = self.ORDER_BY.get(sort_by, relevance)
+        offset = (max(page, 1) - 1) * page_size
+        with self.lock:
+            count = self.db.execute(f"SELECT count(*) FROM {tables}{where_sql}", args).fetchone()[0]
+            rows = self.db.execute(
+                f"SELECT sounds.sound, sounds.local_path, sounds.loudness, sounds.true_peak FROM {tables}{where_sql} "
+                f"ORDER BY {order_sql}, sounds.id LIMIT ? OFFSET ?",
+                args + [page_size, offset]).fetchall()
+
+        results = []
+        for sound_json, local_path, loudness, true_peak in rows:
+            sound = json.loads(sound_json)
+            if local_path and os.path.exists(local_path):
+                sound["local_path"] = local_path
+            if loudness is not None:
+                sound["loudness"], sound["true_peak"] = loudness, true_peak
+            results.append(sound)
+        return {
+            "count": count,
+            "results": results,
+            "next": page + 1 if offset + len(results) < count else None,
+            "previous": page - 1 if page > 1 else None,
+            "source": "local",
+        }
+
+    def levels(self, sound_ids):
+        """{sound ID: (loudness, true peak)} of the given sounds that were measured."""
+        ids = [int(sound_id) for sound_id in sound_ids]
+        with self.lock:
+            rows = self.db.execute(
+                f"SELECT id, loudness, true_peak FROM sounds WHERE loudness IS NOT NULL AND id IN ({','.join('?' * len(ids))})",
+                ids).fetchall() if ids else []
+        return {row[0]: row[1:] for row in rows}
+
+    def put_analysis(self, path, info):
+        """Stores the analysis of a file.
+
+        It is valid while the path holds the same file (inode) of the same size; not
+        the mtime, which the caches touch to mark entries as recently used.
+        """
+        stat = os.stat(path)
+        with self.lock, self.db:
+            self.db.execute("INSERT OR REPLACE INTO analysis (path, size, inode, analysis) VALUES (?, ?, ?, ?)",
+                            (os.path.abspath(path), stat.st_size, stat.st_ino, json.dumps(info)))
+
+    def set_levels(self, sound_id, info):
+        """Loudness and true peak of a recorded sound, from the analysis of its preview or original."""
+        with self.lock, self.db:
+            self.db.execute("UPDATE sounds SET loudness = ?, true_peak = ? WHERE id = ?",
+                            (info.get("loudness"), info.get("true_peak"), int(sound_id)))
+
+    def get_analysis(self, path):
+        stat = os.stat(path)
+        with self.lock:
+            row = self.db.execute("SELECT size, inode, analysis FROM analysis WHERE path = ?", (os.path.abspath(path),)).fetchone()
+        if row is None or row[0] != stat.st_size or row[1] != stat.st_ino:
+            return None
+        return json.loads(row[2])
+
+def _like_escape(text):
+    return text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+def get_sound_index():
+    global _sound_index
+    with _session_lock:
+        if _sound_index is None:
+            _sound_index = SoundIndex()
+        return _sound_index
+
+def result_sounds(result_obj):
+    """The sounds of a search / similar / favorites / batch_search result."""
+    if not isinstance(result_obj, dict):
+        return []
+    if "searches" in result_obj:
+        return [sound for search in result_obj["searches"] for sound in search.get("results") or []]
+    return result_obj.get("results") or []
+
+def index_sounds(sounds, local_path=None, analysis=None):
+    """Records sounds in the SoundIndex and adds "loudness" / "true_peak" to those measured before.
+
+    `analysis` is the one of the file at `local_path` (downloads). The index is a
+    convenience: its errors never fail a mode.
+    """
+    if not SOUND_INDEX_ENABLED or not sounds:
+        return
+    import sqlite3
+    try:
+        index = get_sound_index()
+        index.record(sounds, local_path)
+        if analysis:
+            for sound in sounds:
+                index.set_levels(sound["id"], analysis)
+        levels = index.levels(sound["id"] for sound in sounds if isinstance(sound, dict) and sound.get("id") is not None)
+        for sound in sounds:
+            if isinstance(sound, dict) and sound.get("id") in levels:
+                sound["loudness"], sound["true_peak"] = levels[sound["id"]]
+    except (sqlite3.Error, OSError) as e:
+        print(f"Sound index not updated: {e}", file=sys.stderr)
+
+def local_search(query, cc0_only=False, max_duration=0.0, tags="", category="", page=1, sort_by=""):
+    """search_freesound over the SoundIndex: no API key, no network."""
+    import sqlite3
+    try:
+        return get_sound_index().search(query, cc0_only, max_duration, tags, category, page, sort_by)
+    except (sqlite3.Error, OSError) as e:
+        return {"error": f"Local sound index unavailable: {e}"}
+
+# --- MODES (one-shot command line and daemon) ---
+
+def run_mode(argv):
+    """Runs one mode (argv = [mode, arg1, ...]) and returns the result object for the Lua GUI."""
     final_result_obj = {}
     try:
-        if len(sys.argv) < 2:
+        if len(argv) < 1:
             final_result_obj = {"error": "Insufficient arguments provided to Python script."}
         else:
-            mode = sys.argv[1]
+            mode = argv[0]
             
             if mode == "authorize":
-                client_id, client_secret = sys.argv[2], sys.argv[3]
-                auth_result = start_authorization(client_id)
-                if "code" in auth_result:
-                    final_result_obj = get_access_token(client_id, client_secret, auth_result["code"])
+                client_id, client_secret = argv[1], argv[2]
+                # A stored login that is still valid (or can be refreshed) needs no browser
+                entry = get_token_store().get(client_id, client_secret)
+                if "error" not in entry:
+                    final_result_obj = {"status": "success", "tokens": {"access_token": entry["access_token"], "refresh_token": entry["refresh_token"]}}
                 else:
-                    final_result_obj = auth_result
+                    auth_result = start_authorization(client_id)
+                    if "code" in auth_result:
+                        final_result_obj = get_access_token(client_id, client_secret, auth_result["code"])
+                    else:
+                        final_result_obj = auth_result
+
+            elif mode == "logout":
+                get_token_store().clear()
+                final_result_obj = {"status": "success"}
 
             elif mode == "get_user":
-                final_result_obj = get_user_info(sys.argv[2])
+                # Optional CLIENT_ID CLIENT_SECRET REFRESH_TOKEN: the token is refreshed when expired
+                final_result_obj = run_with_user_token(get_user_info, argv[1], *argv[2:5])
 
             elif mode == "search":
-                api_key, query, filter_cc0, max_duration, tags, category, page, sort_by = sys.argv[2:11]
-                final_result_obj = search_freesound(api_key, query, filter_cc0.lower() == 'true', float(max_duration), tags if tags != "NONE" else "", category, int(page), sort_by)
+                api_key, query, filter_cc0, max_duration, tags, category, page, sort_by = argv[1:10]
+                search_args = (query, filter_cc0.lower() == 'true', float(max_duration), tags if tags != "NONE" else "", category, int(page), sort_by)
+                final_result_obj = search_freesound(api_key, *search_args)
+                if final_result_obj.get("offline") and SOUND_INDEX_ENABLED:
+                    # No network: the sounds already seen are better than an error
+                    local_result = local_search(*search_args)
+                    if local_result.get("count"):
+                        final_result_obj = dict(local_result, offline_error=final_result_obj["error"])
+
+            elif mode == "local_search":
+                query, filter_cc0, max_duration, tags, category, page, sort_by = argv[1:8]
+                final_result_obj = local_search(query, filter_cc0.lower() == 'true', float(max_duration), tags if tags != "NONE" else "", category, int(page), sort_by)
+
+            elif mode == "batch_search":
+                # Every argument after the filters is one query
+                api_key, filter_cc0, max_duration, tags, category, sort_by = argv[1:7]
+                final_result_obj = batch_search(api_key, argv[7:], filter_cc0.lower() == 'true', float(max_duration), tags if tags != "NONE" else "", category, sort_by)
 
             elif mode == "get_similar":
-                api_key, sound_id, page = sys.argv[2], sys.argv[3], sys.argv[4]
+                api_key, sound_id, page = argv[1], argv[2], argv[3]
                 final_result_obj = get_similar_sounds(api_key, sound_id, int(page))
 
             elif mode == "get_favorites_details":
-                api_key, ids_string = sys.argv[2], sys.argv[3]
-                sound_ids = [sid.strip() for sid in ids_string.split(',') if sid.strip()]
-                
-                # OPTIMIZED: Fetch all sounds in one request using a filter
-                if sound_ids:
-                    id_filter = " OR ".join([f"id:{sid}" for sid in sound_ids])
-                    # Use the main search function with an empty query and the ID filter
-                    fav_results = search_freesound(api_key, query="", extra_filters=id_filter)
-                    # The API might not return results in the same order as the IDs, so we re-order them
-                    if "results" in fav_results:
-                        sounds_by_id = {sound["id"]: sound for sound in fav_results["results"]}
-                        sorted_results = [sounds_by_id[int(sid)] for sid in sound_ids if int(sid) in sounds_by_id]
-                        fav_results["results"] = sorted_results
-                        fav_results["count"] = len(sorted_results)
-
-                    final_result_obj = fav_results
-                else:
-                    final_result_obj = {"count": 0, "results": [], "next": None, "previous": None}
-
+                api_key, ids_string = argv[1], argv[2]
+                final_result_obj = get_favorites_details(api_key, ids_string.split(','))
 
             elif mode == "download_preview":
-                final_result_obj = download_file(sys.argv[2], sys.argv[3])
+                final_result_obj = download_preview(argv[1], argv[2])
+
+            elif mode == "prefetch_previews":
+                urls = [url.strip() for url in argv[1].split(',') if url.strip()]
+                final_result_obj = dict(status="success", **prefetch_previews(urls, wait=True))
+
+            elif mode == "get_analysis":
+                # Peak envelope, loudness and true peak of an audio file (stored, or measured now)
+                info = load_analysis(argv[1])
+                if info is None:
+                    if not _analysis_modules():
+                        info = {"error": "The analysis needs numpy and scipy."}
+                    else:
+                        info = analyze_file(argv[1]) or {"error": f"Could not analyze '{argv[1]}'."}
+                        if "error" not in info:
+                            store_analysis(argv[1], info)
+                final_result_obj = info if "error" in info else {"status": "success", "analysis": info}
 
             elif mode == "download_original":
-                sound_id, download_path, access_token = sys.argv[2], sys.argv[3], sys.argv[4]
-                details = get_sound_details_oauth(sound_id, access_token)
-                if "error" in details:
-                    final_result_obj = details
+                # Optional CLIENT_ID CLIENT_SECRET REFRESH_TOKEN, as for get_user
+                sound_id, download_path, access_token = argv[1], argv[2], argv[3]
+                final_result_obj = download_original(sound_id, download_path, access_token, client=argv[4:7])
+
+            elif mode == "download_original_async":
+                # Daemon: returns at once, the GUI polls the progress file for the result
+                sound_id, download_path, access_token = argv[1], argv[2], argv[3]
+                if _daemon is None:
+                    final_result_obj = download_original(sound_id, download_path, access_token, client=argv[4:7])
                 else:
-                    original_filename = f"{details['name']}.{details['type']}"
-                    safe_filename = "".join(c for c in original_filename if c.isalnum() or c in '._-').rstrip()
-                    full_path = os.path.join(download_path, safe_filename)
-                    final_result_obj = download_file(details['download'], full_path, access_token)
+                    progress_path = os.path.join(STATE_DIR, "progress", f"original_{sound_id}.lua")
+                    DownloadProgress(progress_path).write()
+                    run_in_background(download_original, sound_id, download_path, access_token, progress_path, argv[4:7])
+                    final_result_obj = {"status": "started", "progress": progress_path}
             
             else:
                 final_result_obj = {"error": f"Invalid mode: '{mode}'."}
 
     except Exception as e:
+        import traceback
         tb_str = traceback.format_exc()
         final_result_obj = {"error": f"Unhandled Python exception: {str(e)}\n{tb_str}"}
-    
-    print("return " + python_to_lua(final_result_obj), end='')
 
+    if argv and argv[0] in ("search", "batch_search", "get_similar", "get_favorites_details") and final_result_obj.get("source") != "local":
+        index_sounds(result_sounds(final_result_obj))
+
+    # The daemon outlives the reply: fetch the page's previews before the user clicks one
+    if PREFETCH_PREVIEWS and _daemon is not None and argv and argv[0] in ("search", "get_similar", "get_favorites_details"):
+        urls = preview_urls(final_result_obj)
+        prefetch_previews(list(urls), sound_ids=urls)
+    return final_result_obj
+
+# --- DAEMON (long-lived process, keeps the session and its connections open) ---
+
+def _make_daemon_server(daemon):
+    """A threading TCP server on a free local port; its connections go to daemon.handle() (socketserver is imported here)."""
+    import socketserver
+
+    class DaemonRequestHandler(socketserver.StreamRequestHandler):
+        def handle(self):
+            daemon.handle(self.rfile, self.wfile)
+
+    class DaemonServer(socketserver.ThreadingTCPServer):
+        daemon_threads = True
+        allow_reuse_address = True
+
+    return DaemonServer(("127.0.0.1", 0), DaemonRequestHandler)
+
+class FreesoundDaemon:
+    """Serves the modes over a local TCP socket until it has been idle for `idle_timeout` seconds.
+
+    The port, pid and a random token are written to DAEMON_STATE_FILE; the daemon
+    removes it when it exits.
+    """
+
+    def __init__(self, idle_timeout=DAEMON_IDLE_TIMEOUT):
+        self.idle_timeout = idle_timeout
+        import secrets
+        self.token = secrets.token_hex(16)
+        self.active_requests = 0
+        self.last_activity = time.time()
+        self.lock = threading.Lock()
+        self.server = _make_daemon_server(self)
+
+    def handle(self, rfile, wfile):
+        """One connection = one JSON line {"token", "op", "args", "fields"} and one JSON reply line."""
+        def reply(message):
+            try:
+                wfile.write((json.dumps(message) + "\n").encode("utf-8"))
+            except OSError:
+                pass # The client is gone
+
+        try:
+            request = json.loads(rfile.readline().decode("utf-8"))
+        except ValueError:
+            return
+        if not isinstance(request, dict) or request.get("token") != self.token:
+            reply({"error": "Invalid daemon token."})
+            return
+
+        op = request.get("op")
+        if op == "ping":
+            reply({"status": "ok", "pid": os.getpid()})
+        elif op == "run":
+            self.request_started()
+            try:
+                result = run_mode([str(arg) for arg in request.get("args", [])])
+                if request.get("fields"):
+                    result = project_results(result, parse_fields(request["fields"]))
+            finally:
+                self.request_finished()
+            reply({"result": result})
+        elif op == "stop":
+            reply({"status": "ok"})
+            self.stop()
+        else:
+            reply({"error": f"Invalid daemon operation: '{op}'."})
+
+    def request_started(self):
+        with self.lock:
+            self.active_requests += 1
+            self.last_activity = time.time()
+
+    def request_finished(self):
+        with self.lock:
+            self.active_requests -= 1
+            self.last_activity = time.time()
+
+    def stop(self):
+        threading.Thread(target=self.server.shutdown, daemon=True).start()
+
+    def _watch_idle(self):
+        while True:
+            time.sleep(1.0)
+            with self.lock:
+                idle = self.active_requests == 0 and time.time() - self.last_activity > self.idle_timeout
+            if idle:
+                self.stop()
+                return
+
+    def serve(self):
+        os.makedirs(STATE_DIR, exist_ok=True)
+        state = {"port": self.server.server_address[1], "pid": os.getpid(), "token": self.token}
+        tmp_path = f"{DAEMON_STATE_FILE}.{os.getpid()}.tmp"
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600) # Owner-only: the token drives run/download
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+        os.replace(tmp_path, DAEMON_STATE_FILE)
+        get_session() # Pay the `requests` import before the first request
+        threading.Thread(target=self._watch_idle, daemon=True).start()
+        try:
+            self.server.serve_forever(poll_interval=0.5)
+        finally:
+            try:
+                with open(DAEMON_STATE_FILE, "r", encoding="utf-8") as f:
+                    if json.load(f).get("pid") == os.getpid():
+                        os.remove(DAEMON_STATE_FILE)
+            except (OSError, ValueError):
+                pass
+            self.server.server_close()
+
+def serve_main(argv):
+    idle_timeout = DAEMON_IDLE_TIMEOUT
+    if len(argv) >= 2 and argv[0] == "--idle-timeout":
+        idle_timeout = float(argv[1])
+    global _daemon
+    _daemon = FreesoundDaemon(idle_timeout)
+    _daemon.serve()
+
+# --- DAEMON CLIENT ---
+
+def read_daemon_state():
+    """Reads the state file written by a running daemon, or returns None."""
+    try:
+        with open(DAEMON_STATE_FILE, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def connect_daemon(state, timeout=0.5):
+    """Returns a socket connected to the daemon, or None."""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM) # Not create_connection(): getaddrinfo() loads the idna codec
+    try:
+        sock.settimeout(timeout)
+        sock.connect(("127.0.0.1", int(state["port"])))
+        return sock
+    except (OSError, ValueError, KeyError, TypeError):
+        sock.close()
+        return None
+
+def daemon_exchange(sock, state, message):
+    """Sends one request on a connected socket and returns the reply (dict), or None."""
+    try:
+        with sock:
+            sock.sendall((json.dumps(dict(message, token=state.get("token"))) + "\n").encode("utf-8"))
+            reply = sock.makefile("rb").readline()
+        return json.loads(reply.decode("utf-8")) if reply else None
+    except (OSError, ValueError):
+        return None
+
+def ping_daemon(state):
+    sock = connect_daemon(state) if state else None
+    reply = daemon_exchange(sock, state, {"op": "ping"}) if sock else None
+    return bool(reply and reply.get("status") == "ok")
+
+def start_daemon():
+    """Starts `serve` in the background, detached from this process's console and pipes.
+
+    The daemon must not inherit stdout: the GUI's io.popen() reads until every
+    writer of the pipe is gone.
+    """
+    import subprocess
+    options = {"stdin": subprocess.DEVNULL, "stdout": subprocess.DEVNULL, "stderr": subprocess.DEVNULL, "close_fds": True}
+    if sys.platform == "win32":
+        options["creationflags"] = subprocess.DETACHED_PROCESS | subprocess.CREATE_NEW_PROCESS_GROUP | subprocess.CREATE_NO_WINDOW
+    else:
+        options["start_new_session"] = True
+    subprocess.Popen([sys.executable, os.path.abspath(__file__), "serve"], **options)
+
+def run_through_daemon(argv, fields=None):
+    """Runs one mode in the daemon, starting it if needed (`fields`: see project_results()).
+
+    Returns the result object, or None when no daemon could be reached (the caller
+    then runs the mode itself).
+    """
+    state = read_daemon_state()
+    if not ping_daemon(state):
+        start_daemon()
+        deadline = time.time() + DAEMON_START_TIMEOUT
+        state = None
+        while state is None and time.time() < deadline:
+            time.sleep(0.05)
+            candidate = read_daemon_state()
+            if ping_daemon(candidate):
+                state = candidate
+        if state is None:
+            return None
+
+    sock = connect_daemon(state)
+    if sock is None:
+        return None
+    sock.settimeout(None) # Downloads and the OAuth login take as long as they take
+    reply = daemon_exchange(sock, state, {"op": "run", "args": argv, "fields": fields})
+    if reply is None or "result" not in reply:
+        # The request may have been started: do not run it a second time
+        return {"error": (reply or {}).get("error", "Lost connection to the Freesound daemon.")}
+    return reply["result"]
+
+# --- STARTUP PROFILING ---
+
+class ImportTimer:
+    """--profile-startup: measures the imports done while installed (outermost import statements only)."""
+
+    def __init__(self):
+        self.seconds = 0.0
+        self.depth = 0
+        self.modules_before = set(sys.modules)
+
+    def install(self):
+        import builtins
+        original = builtins.__import__
+
+        def timed_import(*args, **kwargs):
+            if self.depth:
+                return original(*args, **kwargs)
+            self.depth += 1
+            start = time.perf_counter()
+            try:
+                return original(*args, **kwargs)
+            finally:
+                self.seconds += time.perf_counter() - start
+                self.depth -= 1
+        builtins.__import__ = timed_import
+
+    def new_modules(self):
+        """Top-level packages imported since the timer was created."""
+        return sorted({name.split(".")[0] for name in set(sys.modules) - self.modules_before if not name.startswith("_")})
+
+def report_startup(mode, use_daemon, module_seconds, import_timer, mode_seconds, output_seconds):
+    """Writes one "profile-startup {json}" line to stderr (stdout carries the result)."""
+    report = {
+        "mode": mode,
+        "daemon": use_daemon,
+        "module_ms": round(module_seconds * 1000, 2), # This file's top-level imports and definitions
+        "mode_imports_ms": round(import_timer.seconds * 1000, 2), # Imports done by the mode itself
+        "mode_ms": round(mode_seconds * 1000, 2), # The mode, its imports included
+        "output_ms": round(output_seconds * 1000, 2),
+        "total_ms": round((time.perf_counter() - _MODULE_START) * 1000, 2),
+        "modules": import_timer.new_modules(),
+    }
+    sys.stderr.write("profile-startup " + json.dumps(report) + "\n")
+
+# --- MAIN EXECUTION BLOCK ---
+
+def main(argv):
+    """Command line entry point (see the usage at the top of this file)."""
+    module_seconds = time.perf_counter() - _MODULE_START
+    args = list(argv)
+    if args and args[0] == "serve":
+        serve_main(args[1:])
+        return
+
+    use_daemon, fields, out_path, profile = False, None, None, False
+    while args and args[0] in ("--daemon", "--fields", "--out-file", "--profile-startup"):
+        option = args.pop(0)
+        if option == "--daemon":
+            use_daemon = True
+        elif option == "--profile-startup":
+            profile = True
+        elif args:
+            value = args.pop(0)
+            if option == "--fields":
+                fields = value
+            else:
+                out_path = value
+
+    import_timer = ImportTimer()
+    if profile:
+        import_timer.install()
+    mode_start = time.perf_counter()
+    final_result_obj = None
+    if use_daemon:
+        final_result_obj = run_through_daemon(args, fields)
+    if final_result_obj is None:
+        final_result_obj = run_mode(args)
+        if fields:
+            final_result_obj = project_results(final_result_obj, parse_fields(fields))
+
+    output_start = time.perf_counter()
+    write_result(final_result_obj, out_path)
+    if profile:
+        report_startup(args[0] if args else None, use_daemon, module_seconds, import_timer,
+                       output_start - mode_start, time.perf_counter() - output_start)
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
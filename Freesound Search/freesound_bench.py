@@ -0,0 +1,333 @@
+# @noindex
+# FREESOUND HELPER BENCHMARK (runs outside REAPER, in any Python 3)
+# DESCRIPTION: Micro-benchmarks of Hosi_Freesound_Logic_Pro.py.
+#
+# Usage:
+#   python freesound_bench.py serializer [--sounds 25,150,1000] [--repeat 5] [--output FILE]
+#     Builds synthetic result payloads (search pages, a batch_search with several pages),
+#     serializes them with the previous python_to_lua() (kept below as the reference) and
+#     with the current write_lua() / python_to_lua(), and checks that the outputs match
+#     byte for byte (exit code 1 otherwise). Also reports the size of the payload trimmed
+#     with the GUI's --fields list.
+#
+#   python freesound_bench.py startup [--runs 10] [--scenarios client,search,...]
+#                                     [--budget NAME=MS ...] [--script FILE] [--output FILE]
+#     Cold start of the common modes: each run is a new process started like the GUI does,
+#     with --profile-startup, in a throwaway home folder. The API is never reached: the rate limiter is paused, so the API
+#     modes stop right after their imports; previews come from a local HTTP server.
+#     Cold start = process wall time minus the mode's own work (its imports are included),
+#     i.e. interpreter, this script's load, the mode's imports and the output. Overhead =
+#     cold start minus a bare "python -c pass" on the same machine; its median is checked
+#     against STARTUP_BUDGETS_MS (exit code 1 when over). --script measures another copy of
+#     the helper (e.g. a previous release); without --profile-startup support, the whole
+#     process counts as cold start.
+
+import argparse
+import http.server
+import io
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import Hosi_Freesound_Logic_Pro as logic
+
+GUI_FIELDS = "id,name,license,duration,num_downloads,url,previews.preview-hq-mp3" # As in the Lua GUI
+LOGIC_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "Hosi_Freesound_Logic_Pro.py")
+# How the Lua GUI starts the helper: imported (cached bytecode), then main(argv)
+LAUNCHER = ("import sys, importlib.util as u; s = u.spec_from_file_location('hosi_freesound_helper', sys.argv.pop(1)); "
+            "m = sys.modules[s.name] = u.module_from_spec(s); s.loader.exec_module(m); m.main(sys.argv[1:])")
+
+# Median cold start allowed per scenario, in ms above a bare interpreter start: the GUI
+# blocks on these processes. The one-shot API modes are dominated by the `requests`
+# import; the --daemon client, the GUI's default, must stay close to a bare interpreter.
+STARTUP_BUDGETS_MS = {
+    "client": 30, # --daemon search: forwards to a running daemon
+    "search": 200,
+    "get_similar": 200,
+    "get_favorites_details": 200,
+    "download_preview": 250, # Not cached: downloads from the local server
+    "download_preview_cached": 30, # Served from the preview cache: `requests` is not imported
+}
+
+# --- REFERENCE: python_to_lua() before the streaming serializer ---
+
+def reference_escape_lua_string(s):
+    if not isinstance(s, str):
+        s = str(s)
+    s = s.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n').replace('\r', '\\r')
+    s = ''.join(c if c.isprintable() else f'\\{ord(c)}' for c in s)
+    return s
+
+def reference_python_to_lua(obj):
+    if obj is None: return "nil"
+    if isinstance(obj, bool): return str(obj).lower()
+    if isinstance(obj, (int, float)): return str(obj)
+    if isinstance(obj, str): return f'"{reference_escape_lua_string(obj)}"'
+    if isinstance(obj, list): return "{" + ", ".join(reference_python_to_lua(item) for item in obj) + "}"
+    if isinstance(obj, dict):
+        items = [f'["{reference_escape_lua_string(k)}"] = {reference_python_to_lua(v)}' for k, v in obj.items()]
+        return "{" + ", ".join(items) + "}"
+    return f'"{reference_escape_lua_string(str(obj))}"'
+
+# --- PAYLOADS ---
+
+WORDS = ["rain", "metal", "door", "kick", "field-recording", "ambience", "foley", "whoosh", "café",
+         "glass", "synth", "drone", "vocal", "impact", "wind", "crowd", "water", "forest", "Ünïcode"]
+ODD_NAMES = ['Say "hello"', "line one\nline two", "tab\tseparated", "back\\slash", "nbsp\xa0here",
+             "zero\x00byte", "sep\u2028arator", "snowman \u2603", "emoji \U0001F50A"]
+
+def synthetic_sound(rng, sound_id):
+    name = " ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 5)))
+    if rng.random() < 0.1:
+        name += " " + rng.choice(ODD_NAMES)
+    base = f"https://cdn.freesound.org/previews/{sound_id // 1000}/{sound_id}_{rng.randint(1000, 99999)}"
+    return {
+        "id": sound_id,
+        "name": name + ".wav",
+        "previews": {
+            "preview-hq-mp3": base + "-hq.mp3",
+            "preview-hq-ogg": base + "-hq.ogg",
+            "preview-lq-mp3": base + "-lq.mp3",
+            "preview-lq-ogg": base + "-lq.ogg",
+        },
+        "username": rng.choice(["InspectorJ", "klankbeeld", "Robinhood76", "user_" + str(rng.randint(1, 9999))]),
+        "duration": round(rng.uniform(0.1, 600), 6),
+        "url": f"https://freesound.org/people/someone/sounds/{sound_id}/",
+        "license": rng.choice(["http://creativecommons.org/publicdomain/zero/1.0/",
+                               "https://creativecommons.org/licenses/by/4.0/",
+                               "http://creativecommons.org/licenses/by-nc/3.0/"]),
+        "tags": [rng.choice(WORDS) for _ in range(rng.randint(0, 30))],
+        "num_downloads": rng.randint(0, 500000),
+    }
+
+def search_payload(rng, count):
+    return {"count": count * 40, "next": "https://freesound.org/apiv2/search/text/?page=2", "previous": None,
+            "results": [synthetic_sound(rng, rng.randint(1, 900000)) for _ in range(count)],
+            "cache": {"status": "miss", "age": 0, "hits": 3, "misses": 9}}
+
+def batch_payload(rng, count):
+    per_query = max(1, count // 8)
+    searches = [dict(search_payload(rng, per_query), query=f"query {i}") for i in range(8)]
+    for search in searches:
+        del search["previous"], search["cache"]
+    return {"count": len(searches), "failed": 0, "searches": searches}
+
+# --- SERIALIZER BENCHMARK ---
+
+def best_time(function, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def write_to_file(obj, path):
+    logic.write_result(obj, path)
+
+def bench_payload(name, obj, repeat, scratch):
+    reference = reference_python_to_lua(obj)
+    current = logic.python_to_lua(obj)
+    streamed = io.StringIO()
+    logic.write_lua(obj, streamed.write)
+    out_path = os.path.join(scratch, "result.lua")
+    write_to_file(obj, out_path)
+    with open(out_path, "r", encoding="utf-8", newline="") as f:
+        from_file = f.read()
+    match = reference == current == streamed.getvalue() and from_file == "return " + reference
+
+    trimmed = logic.python_to_lua(logic.project_results(obj, logic.parse_fields(GUI_FIELDS)))
+    timings = {
+        "reference_ms": best_time(lambda: reference_python_to_lua(obj), repeat) * 1000,
+        "python_to_lua_ms": best_time(lambda: logic.python_to_lua(obj), repeat) * 1000,
+        "write_lua_stringio_ms": best_time(lambda: logic.write_lua(obj, io.StringIO().write), repeat) * 1000,
+        "write_result_file_ms": best_time(lambda: write_to_file(obj, out_path), repeat) * 1000,
+        "project_fields_ms": best_time(lambda: logic.project_results(obj, logic.parse_fields(GUI_FIELDS)), repeat) * 1000,
+    }
+    result = {"payload": name, "bytes": len(reference.encode("utf-8")), "trimmed_bytes": len(trimmed.encode("utf-8")),
+              "match": match}
+    result.update({key: round(value, 3) for key, value in timings.items()})
+    result["speedup"] = round(timings["reference_ms"] / timings["python_to_lua_ms"], 2)
+    return result
+
+def serializer_main(argv):
+    parser = argparse.ArgumentParser(description="Old vs new Lua serializer of Hosi_Freesound_Logic_Pro.py")
+    parser.add_argument("--sounds", type=lambda text: [int(v) for v in text.split(",") if v.strip()],
+                        default=[25, 150, 1000], help="Sounds per payload (comma-separated)")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per measure (the best one is kept)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", type=str, default=None, help="Result file (JSON)")
+    args = parser.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    results = []
+    with tempfile.TemporaryDirectory(prefix="freesound_bench_") as scratch:
+        for count in args.sounds:
+            for name, obj in ((f"search_{count}", search_payload(rng, count)), (f"batch_{count}", batch_payload(rng, count))):
+                result = bench_payload(name, obj, args.repeat, scratch)
+                results.append(result)
+                print(f"{name:>12}: {result['bytes'] / 1024:8.1f} KB (trimmed {result['trimmed_bytes'] / 1024:7.1f} KB)"
+                      f"  reference {result['reference_ms']:8.2f} ms  new {result['python_to_lua_ms']:7.2f} ms"
+                      f"  file {result['write_result_file_ms']:7.2f} ms  x{result['speedup']:<5}"
+                      f"  {'identical' if result['match'] else 'MISMATCH'}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"python": sys.version.split()[0], "results": results}, f, indent=2)
+    return 0 if all(result["match"] for result in results) else 1
+
+# --- COLD START BENCHMARK ---
+
+class QuietHandler(http.server.SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+def start_file_server(folder):
+    """Serves `folder` on a free local port (daemon thread); returns its base URL."""
+    handler = lambda *args, **kwargs: QuietHandler(*args, directory=folder, **kwargs)
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_address[1]}/"
+
+def startup_scenarios(base_url, scratch):
+    """name: (helper arguments, run index -> arguments of that run)."""
+    search = ["search", "KEY", "rain", "false", "0", "NONE", "any", "1", ""]
+    preview = os.path.join(scratch, "preview.mp3")
+    return {
+        "client": lambda run: ["--daemon"] + search,
+        "search": lambda run: search,
+        "get_similar": lambda run: ["get_similar", "KEY", "1234", "1"],
+        "get_favorites_details": lambda run: ["get_favorites_details", "KEY", ",".join(str(i) for i in range(1, 80))],
+        "download_preview": lambda run: ["download_preview", f"{base_url}preview.mp3?run={run}", preview],
+        "download_preview_cached": lambda run: ["download_preview", f"{base_url}preview.mp3", preview],
+    }
+
+def helper_command(script, out_path):
+    """Command line of a helper run, with the options of this benchmark that `script` knows (older releases lack some)."""
+    with open(script, "r", encoding="utf-8") as f:
+        source = f.read()
+    if "\ndef main(argv):" in source:
+        options = [sys.executable, "-c", LAUNCHER, script]
+    else:
+        options = [sys.executable, script]
+    if "--profile-startup" in source:
+        options.append("--profile-startup")
+    if "--out-file" in source:
+        options += ["--out-file", out_path]
+    return options
+
+def run_helper(command, env):
+    """Runs the helper once; returns (wall seconds, profile dict or None)."""
+    start = time.perf_counter()
+    process = subprocess.run(command, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, timeout=60)
+    wall = time.perf_counter() - start
+    profile = None
+    for line in process.stderr.decode("utf-8", "replace").splitlines():
+        if line.startswith("profile-startup "):
+            profile = json.loads(line[len("profile-startup "):])
+    return wall, profile
+
+def stop_daemon(state_dir):
+    try:
+        with open(os.path.join(state_dir, "daemon.json"), "r", encoding="utf-8") as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return
+    sock = logic.connect_daemon(state)
+    if sock:
+        logic.daemon_exchange(sock, state, {"op": "stop"})
+
+def parse_budget(text):
+    name, _, value = text.partition("=")
+    return name.strip(), float(value)
+
+def startup_main(argv):
+    parser = argparse.ArgumentParser(description="Cold start of Hosi_Freesound_Logic_Pro.py per mode")
+    parser.add_argument("--runs", type=int, default=10, help="Processes per scenario")
+    parser.add_argument("--scenarios", type=lambda text: [v.strip() for v in text.split(",") if v.strip()],
+                        default=list(STARTUP_BUDGETS_MS), help="Comma-separated scenario names")
+    parser.add_argument("--budget", type=parse_budget, action="append", default=[], metavar="NAME=MS",
+                        help="Overrides the budget of a scenario")
+    parser.add_argument("--script", type=str, default=LOGIC_SCRIPT, help="Helper script to measure")
+    parser.add_argument("--output", type=str, default=None, help="Result file (JSON)")
+    args = parser.parse_args(argv)
+    budgets = dict(STARTUP_BUDGETS_MS, **dict(args.budget))
+
+    with tempfile.TemporaryDirectory(prefix="freesound_startup_") as scratch:
+        home = os.path.join(scratch, "home")
+        state_dir = os.path.join(home, ".hosi_freesound")
+        os.makedirs(state_dir)
+        with open(os.path.join(state_dir, "rate.json"), "w", encoding="utf-8") as f:
+            json.dump({"paused_until": time.time() + 24 * 3600}, f) # API modes fail fast, after their imports
+        www = os.path.join(scratch, "www")
+        os.makedirs(www)
+        with open(os.path.join(www, "preview.mp3"), "wb") as f:
+            f.write(os.urandom(200 * 1024))
+        base_url = start_file_server(www)
+        env = dict(os.environ, HOME=home, USERPROFILE=home, PYTHONDONTWRITEBYTECODE="1")
+        env.pop("PYTHONSTARTUP", None)
+        out_path = os.path.join(scratch, "result.lua")
+        scenarios = startup_scenarios(base_url, scratch)
+        command = helper_command(args.script, out_path)
+        interpreter_ms = statistics.median(run_helper([sys.executable, "-c", "pass"], env)[0] * 1000 for _ in range(args.runs))
+        print(f"{'interpreter':>24}: {interpreter_ms:7.1f} ms (python -c pass)")
+
+        results = []
+        try:
+            for name in args.scenarios:
+                if name not in scenarios:
+                    print(f"Unknown scenario '{name}' (known: {', '.join(scenarios)})")
+                    return 2
+                run_helper(command + scenarios[name](-1), env) # Warm-up: daemon, OS file cache, preview cache
+                samples = []
+                for run in range(args.runs):
+                    wall, profile = run_helper(command + scenarios[name](run), env)
+                    work = (profile["mode_ms"] - profile["mode_imports_ms"]) / 1000 if profile else 0.0
+                    samples.append({"cold_start_ms": (wall - work) * 1000, "wall_ms": wall * 1000, "profile": profile})
+                profiled = [s["profile"] for s in samples if s["profile"]]
+                cold = sorted(s["cold_start_ms"] for s in samples)
+                result = {
+                    "scenario": name,
+                    "overhead_ms": round(statistics.median(cold) - interpreter_ms, 2),
+                    "cold_start_ms": round(statistics.median(cold), 2),
+                    "cold_start_p90_ms": round(cold[min(len(cold) - 1, int(len(cold) * 0.9))], 2),
+                    "wall_ms": round(statistics.median(s["wall_ms"] for s in samples), 2),
+                    "module_ms": round(statistics.median(p["module_ms"] for p in profiled), 2) if profiled else None,
+                    "mode_imports_ms": round(statistics.median(p["mode_imports_ms"] for p in profiled), 2) if profiled else None,
+                    "modules": profiled[-1]["modules"] if profiled else None,
+                    "budget_ms": budgets.get(name),
+                }
+                result["within_budget"] = result["budget_ms"] is None or result["overhead_ms"] <= result["budget_ms"]
+                results.append(result)
+                print(f"{name:>24}: cold start {result['cold_start_ms']:7.1f} ms (p90 {result['cold_start_p90_ms']:7.1f})"
+                      f"  overhead {result['overhead_ms']:6.1f} ms"
+                      f"  module {result['module_ms'] if profiled else float('nan'):6.1f} ms"
+                      f"  mode imports {result['mode_imports_ms'] if profiled else float('nan'):6.1f} ms"
+                      f"  budget {result['budget_ms']} ms  {'ok' if result['within_budget'] else 'OVER BUDGET'}")
+        finally:
+            stop_daemon(state_dir)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"python": sys.version.split()[0], "script": os.path.abspath(args.script), "runs": args.runs,
+                       "interpreter_ms": round(interpreter_ms, 2), "results": results}, f, indent=2)
+    return 0 if all(result["within_budget"] for result in results) else 1
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    commands = {"serializer": serializer_main, "startup": startup_main}
+    if not argv or argv[0] not in commands:
+        print(f"Usage: python freesound_bench.py {{{','.join(commands)}}} [OPTIONS]  (see --help of each)")
+        return 2
+    return commands[argv[0]](argv[1:])
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,707 @@
+# @noindex
+# FREESOUND HELPER TESTS (run outside REAPER, in any Python 3)
+# DESCRIPTION: Unit tests of Hosi_Freesound_Logic_Pro.py. The API is never reached:
+# files come from a local HTTP server, API calls are replaced by stand-ins, and every
+# cache, index and token file lives in a throwaway folder.
+#
+# Usage:
+#   python -m unittest test_freesound_logic (from this folder)
+#   Tests that need numpy and scipy are skipped without them.
+
+import functools
+import http.server
+import json
+import os
+import random
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import Hosi_Freesound_Logic_Pro as logic
+
+def setUpModule():
+    logic.get_session() # Binds the module's lazily imported `requests`
+
+
+class TempDirTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp(prefix="freesound_test_")
+        self.addCleanup(shutil.rmtree, self.tmp, ignore_errors=True)
+
+    def patch(self, target, name, value):
+        patcher = mock.patch.object(target, name, value)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+
+class FakeResponse:
+    """The parts of a requests.Response the helper reads."""
+
+    def __init__(self, status_code=200, headers=None, body=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+        self.body = body
+        self.closed = False
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            response = logic.requests.models.Response()
+            response.status_code = self.status_code
+            response._content = json.dumps(self.body).encode("utf-8")
+            raise logic.requests.exceptions.HTTPError(f"{self.status_code} Error", response=response)
+
+    def json(self):
+        return self.body
+
+    def close(self):
+        self.closed = True
+
+
+# --- RESPONSE CACHE ---
+
+class ResponseCacheTest(TempDirTestCase):
+    def make_cache(self, ttl=60, max_bytes=1024 * 1024):
+        return logic.ResponseCache(cache_dir=self.tmp, ttl=ttl, max_bytes=max_bytes)
+
+    def test_miss_then_hit(self):
+        cache = self.make_cache()
+        fetch = mock.Mock(return_value={"results": [1]})
+        key = logic.ResponseCache.make_key("search", {"query": "rain"})
+        first = cache.fetch(key, fetch)
+        second = cache.fetch(key, fetch)
+        self.assertEqual(fetch.call_count, 1)
+        self.assertEqual(first["cache"]["status"], "miss")
+        self.assertEqual(second["cache"]["status"], "hit")
+        self.assertEqual(second["results"], [1])
+        self.assertEqual((second["cache"]["hits"], second["cache"]["misses"]), (1, 1))
+
+    def test_key_ignores_parameter_order(self):
+        self.assertEqual(logic.ResponseCache.make_key("search", {"a": 1, "b": 2}),
+                         logic.ResponseCache.make_key("search", {"b": 2, "a": 1}))
+        self.assertNotEqual(logic.ResponseCache.make_key("search", {"page": 1}),
+                            logic.ResponseCache.make_key("search", {"page": 2}))
+
+    def test_expired_entry_is_fetched_again(self):
+        cache = self.make_cache(ttl=60)
+        key = logic.ResponseCache.make_key("search", {"query": "rain"})
+        cache.put(key, {"results": ["old"]})
+        with mock.patch.object(logic.time, "time", return_value=time.time() + 61):
+            result = cache.fetch(key, lambda: {"results": ["new"]})
+        self.assertEqual(result["cache"]["status"], "miss")
+        self.assertEqual(result["results"], ["new"])
+        self.assertEqual(cache.get(key)[0], {"results": ["new"]})
+
+    def test_errors_are_not_stored(self):
+        cache = self.make_cache()
+        key = logic.ResponseCache.make_key("search", {"query": "rain"})
+        cache.fetch(key, lambda: {"error": "API Error 500: oops"})
+        self.assertEqual(cache.get(key), (None, None))
+
+    def test_least_recently_used_is_evicted(self):
+        cache = self.make_cache()
+        keys = [logic.ResponseCache.make_key("search", {"page": page}) for page in range(3)]
+        for age, key in zip((300, 200, 100), keys):
+            cache.put(key, {"results": ["x" * 100]})
+            os.utime(cache._entry_path(key), (time.time() - age, time.time() - age))
+        cache.get(keys[0]) # Read: the oldest entry becomes the most recently used
+        entry_size = os.path.getsize(cache._entry_path(keys[0]))
+        cache.max_bytes = 3 * entry_size + 50 # Room for 3 entries (their sizes vary by a few bytes), not 4
+        cache.put(logic.ResponseCache.make_key("search", {"page": 3}), {"results": ["x" * 100]})
+        self.assertIsNotNone(cache.get(keys[0])[0])
+        self.assertEqual(cache.get(keys[1]), (None, None))
+        self.assertIsNotNone(cache.get(keys[2])[0])
+
+    def test_equivalent_searches_share_an_entry_but_are_sent_as_typed(self):
+        self.patch(logic, "_response_cache", self.make_cache())
+        sent = []
+        def api_request(method, url, **kwargs):
+            sent.append(kwargs["params"])
+            return FakeResponse(body={"count": 0, "results": []})
+        self.patch(logic, "api_request", api_request)
+        first = logic.search_freesound("key", "Rain  Drops", tags="Water, rain")
+        second = logic.search_freesound("key", "rain drops", tags="rain,water")
+        self.assertEqual((first["cache"]["status"], second["cache"]["status"]), ("miss", "hit"))
+        self.assertEqual(len(sent), 1)
+        self.assertEqual(sent[0]["query"], "Rain  Drops")
+        self.assertEqual(sent[0]["filter"], 'tag:"Water" tag:"rain"')
+
+    def test_client_errors_are_reported_by_status(self):
+        self.patch(logic, "_response_cache", self.make_cache())
+        self.patch(logic, "api_request", lambda *args, **kwargs: FakeResponse(401, body={"detail": "no"}))
+        self.assertEqual(logic.get_similar_sounds("key", 1)["error"], "Invalid API Key. Please check your key.")
+        self.patch(logic, "api_request", lambda *args, **kwargs: FakeResponse(404, body={"detail": "gone"}))
+        self.assertTrue(logic.get_similar_sounds("key", 2)["error"].startswith("API Error 404:"))
+
+
+# --- LOCAL HTTP SERVER ---
+
+class FileHandler(http.server.BaseHTTPRequestHandler):
+    """Serves server.files ({path: bytes}) with Range support; logs (path, Range header) in server.requests."""
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def _file(self):
+        data = self.server.files.get(self.path)
+        if data is None:
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+        return data
+
+    def do_HEAD(self):
+        data = self._file()
+        if data is None:
+            return
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(data)))
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("ETag", self.server.etag)
+        self.end_headers()
+
+    def do_GET(self):
+        spec = self.headers.get("Range", "")
+        self.server.requests.append((self.path, spec))
+        data = self._file()
+        if data is None:
+            return
+        if not spec:
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+            return
+        first, _, last = spec[len("bytes="):].partition("-")
+        first, last = int(first), int(last) if last else len(data) - 1
+        self.send_response(206)
+        self.send_header("Content-Length", str(last - first + 1))
+        self.send_header("Content-Range", f"bytes {first}-{last}/{len(data)}")
+        self.end_headers()
+        self.wfile.write(data[first:last + 1])
+
+
+class ServerTestCase(TempDirTestCase):
+    def setUp(self):
+        super().setUp()
+        self.server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), FileHandler)
+        self.server.daemon_threads = True
+        self.server.files = {}
+        self.server.etag = '"v1"'
+        self.server.requests = []
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+    def url(self, path):
+        return f"http://127.0.0.1:{self.server.server_address[1]}{path}"
+
+
+# --- PREVIEW CACHE ---
+
+class PreviewCacheTest(ServerTestCase):
+    def setUp(self):
+        super().setUp()
+        for name in ("a", "b", "c"):
+            self.server.files[f"/{name}.mp3"] = name.encode("ascii") * 1000
+        self.cache = logic.PreviewCache(cache_dir=os.path.join(self.tmp, "previews"), max_bytes=2500)
+
+    def test_fetch_once_then_from_cache(self):
+        result, cached = self.cache.fetch(self.url("/a.mp3"))
+        self.assertEqual((result["status"], cached), ("success", False))
+        with open(result["path"], "rb") as f:
+            self.assertEqual(f.read(), self.server.files["/a.mp3"])
+        self.assertEqual(self.cache.fetch(self.url("/a.mp3")), ({"status": "success", "path": result["path"]}, True))
+        self.assertEqual(len(self.server.requests), 1)
+
+    def test_least_recently_used_is_evicted(self):
+        for age, name in zip((300, 200), ("a", "b")):
+            path = self.cache.fetch(self.url(f"/{name}.mp3"))[0]["path"]
+            os.utime(path, (time.time() - age, time.time() - age))
+        self.cache.get(self.url("/a.mp3")) # a is now more recent than b
+        self.cache.fetch(self.url("/c.mp3")) # 3000 bytes > 2500: one preview has to go
+        self.assertIsNotNone(self.cache.get(self.url("/a.mp3")))
+        self.assertIsNone(self.cache.get(self.url("/b.mp3")))
+        self.assertIsNotNone(self.cache.get(self.url("/c.mp3")))
+
+    def test_failed_download_is_not_cached(self):
+        result, cached = self.cache.fetch(self.url("/missing.mp3"))
+        self.assertEqual(result["status"], "error")
+        self.assertIsNone(self.cache.get(self.url("/missing.mp3")))
+        self.assertEqual(os.listdir(self.cache.cache_dir), [])
+
+    def test_prefetch_previews(self):
+        self.patch(logic, "_preview_cache", self.cache)
+        self.patch(logic, "_prefetch_pool", None)
+        self.patch(logic, "ANALYZE_DOWNLOADS", False)
+        self.addCleanup(lambda: logic._prefetch_pool and logic._prefetch_pool.shutdown())
+        urls = [self.url("/a.mp3"), self.url("/b.mp3"), self.url("/a.mp3"), self.url("/missing.mp3")]
+        self.assertEqual(logic.prefetch_previews(urls, wait=True), {"cached": 0, "downloaded": 2, "failed": 1})
+        self.assertEqual(logic.prefetch_previews(urls[:2], wait=True), {"cached": 2, "downloaded": 0, "failed": 0})
+        self.assertEqual(sorted(path for path, _ in self.server.requests), ["/a.mp3", "/b.mp3", "/missing.mp3"])
+
+    def test_preview_urls(self):
+        result = {"results": [{"id": 1, "previews": {logic.PREFETCH_QUALITY: "one.mp3"}}, {"id": 2, "previews": {}}, {"id": 3}]}
+        self.assertEqual(logic.preview_urls(result), {"one.mp3": 1})
+
+
+# --- SEGMENTED DOWNLOADS ---
+
+class SegmentedDownloadTest(ServerTestCase):
+    SIZE = 64 * 1024
+
+    def setUp(self):
+        super().setUp()
+        self.data = os.urandom(self.SIZE)
+        self.server.files["/sound.wav"] = self.data
+        self.source = self.url("/sound.wav")
+        self.output = os.path.join(self.tmp, "sound.wav")
+        self.part = self.output + ".part"
+        self.state = self.part + ".json"
+        self.identity = {"url": self.source, "size": self.SIZE, "etag": '"v1"'}
+        self.patch(logic, "DOWNLOAD_SEGMENT_MIN_BYTES", 16 * 1024) # Several segments
+
+    def interrupted_download(self, done):
+        """A .part file and state as left by a download stopped after `done` bytes of the first segment."""
+        with open(self.part, "wb") as f:
+            f.write(self.data[:done])
+            f.truncate(self.SIZE)
+        segments = [[0, self.SIZE // 2 - 1, done], [self.SIZE // 2, self.SIZE - 1, 0]]
+        logic._save_segments(self.state, self.identity, segments)
+        return segments
+
+    def read_output(self):
+        with open(self.output, "rb") as f:
+            return f.read()
+
+    def ranges(self):
+        return [spec for _, spec in self.server.requests]
+
+    def test_segments_state_round_trip(self):
+        segments = self.interrupted_download(1000)
+        self.assertEqual(logic._load_segments(self.state, self.part, self.identity), segments)
+        self.assertIsNone(logic._load_segments(self.state, self.part, dict(self.identity, etag='"v2"')))
+        with open(self.part, "r+b") as f:
+            f.truncate(self.SIZE - 1)
+        self.assertIsNone(logic._load_segments(self.state, self.part, self.identity))
+        self.assertIsNone(logic._load_segments(self.state + ".missing", self.part, self.identity))
+
+    def test_segments_complete(self):
+        size = 100
+        self.assertTrue(logic._segments_complete([[50, 99, 50], [0, 49, 50]], size))
+        self.assertFalse(logic._segments_complete([[0, 49, 50], [50, 99, 49]], size)) # Short segment
+        self.assertFalse(logic._segments_complete([[0, 49, 50], [60, 99, 40]], size)) # Gap
+        self.assertFalse(logic._segments_complete([[0, 49, 50]], size)) # Short of the end
+
+    def test_download_in_segments(self):
+        result = logic.download_file(self.source, self.output)
+        self.assertEqual(result["status"], "success")
+        self.assertEqual(self.read_output(), self.data)
+        self.assertEqual(len(self.ranges()), logic.DOWNLOAD_SEGMENTS)
+        self.assertFalse(os.path.exists(self.part) or os.path.exists(self.state))
+
+    def test_resume_fetches_only_missing_bytes(self):
+        self.interrupted_download(1000)
+        result = logic.download_file(self.source, self.output)
+        self.assertEqual(result["status"], "success")
+        self.assertEqual(self.read_output(), self.data)
+        self.assertEqual(sorted(self.ranges()), [f"bytes=1000-{self.SIZE // 2 - 1}", f"bytes={self.SIZE // 2}-{self.SIZE - 1}"])
+        self.assertFalse(os.path.exists(self.state))
+
+    def test_changed_file_starts_over(self):
+        self.interrupted_download(1000)
+        self.server.etag = '"v2"'
+        result = logic.download_file(self.source, self.output)
+        self.assertEqual(result["status"], "success")
+        self.assertEqual(self.read_output(), self.data)
+        self.assertIn("bytes=0-16383", self.ranges())
+
+    def test_incomplete_segments_keep_the_part_file(self):
+        # A segment that ends without its bytes: the preallocated .part has the right size anyway
+        with mock.patch.object(logic, "_download_segment", lambda url, headers, part_path, segment, *args: None):
+            result = logic.download_file(self.source, self.output)
+        self.assertEqual(result["status"], "error")
+        self.assertIn("Incomplete download: 0 of", result["message"])
+        self.assertFalse(os.path.exists(self.output))
+        self.assertEqual(os.path.getsize(self.part), self.SIZE)
+        self.assertTrue(os.path.exists(self.state))
+
+
+# --- FAVORITES ---
+
+class FavoritesTest(TempDirTestCase):
+    GONE = 4 # Deleted from Freesound: absent from its answers
+
+    def setUp(self):
+        super().setUp()
+        self.patch(logic, "SoundCache", functools.partial(logic.SoundCache, os.path.join(self.tmp, "sounds")))
+        self.patch(logic, "FAVORITES_CHUNK_SIZE", 2)
+        self.searches = []
+        self.patch(logic, "search_freesound", self.search_freesound)
+
+    def search_freesound(self, api_key, query="", extra_filters=None, page_size=None, **kwargs):
+        ids = [int(sound_id) for sound_id in re.findall(r"id:(\d+)", extra_filters)]
+        self.searches.append(ids)
+        sounds = [{"id": sound_id, "name": f"sound {sound_id}"} for sound_id in ids if sound_id != self.GONE]
+        return {"count": len(sounds), "results": sounds[::-1]} # Freesound's own order
+
+    def test_order_of_the_ids_and_cache(self):
+        ids = ["5", "1", "4", "3", "2", "1"]
+        result = logic.get_favorites_details("key", ids)
+        self.assertEqual([sound["id"] for sound in result["results"]], [5, 1, 3, 2])
+        self.assertEqual(result["cache"], {"hits": 0, "misses": 5})
+        self.assertEqual(sorted(len(chunk) for chunk in self.searches), [1, 2, 2])
+
+        self.searches.clear()
+        result = logic.get_favorites_details("key", ids + ["6"])
+        self.assertEqual([sound["id"] for sound in result["results"]], [5, 1, 3, 2, 6])
+        self.assertEqual(result["cache"], {"hits": 5, "misses": 1}) # The deleted sound is remembered too
+        self.assertEqual(self.searches, [[6]])
+
+    def test_expired_entries_are_fetched_again(self):
+        logic.get_favorites_details("key", [1, 2])
+        self.searches.clear()
+        with mock.patch.object(logic.time, "time", return_value=time.time() + logic.SOUND_CACHE_TTL + 1):
+            result = logic.get_favorites_details("key", [1, 2])
+        self.assertEqual(result["cache"], {"hits": 0, "misses": 2})
+        self.assertEqual(self.searches, [[1, 2]])
+
+    def test_failed_chunk_drops_only_its_sounds(self):
+        def search_freesound(api_key, query="", extra_filters=None, **kwargs):
+            if "id:3" in extra_filters:
+                return {"error": "API Error 500: oops"}
+            return self.search_freesound(api_key, query, extra_filters, **kwargs)
+        self.patch(logic, "search_freesound", search_freesound)
+        result = logic.get_favorites_details("key", [1, 2, 3, 5])
+        self.assertEqual([sound["id"] for sound in result["results"]], [1, 2])
+        self.assertEqual(result["failed"], 2)
+
+
+# --- REQUEST SCHEDULER ---
+
+class RequestSchedulerTest(TempDirTestCase):
+    def make_scheduler(self, responses):
+        scheduler = logic.RequestScheduler(state_path=os.path.join(self.tmp, "rate.json"))
+        session = mock.Mock()
+        session.request.side_effect = responses
+        self.patch(logic, "get_session", mock.Mock(return_value=session))
+        return scheduler, session
+
+    def test_api_requests_take_tokens_and_save_them(self):
+        scheduler, session = self.make_scheduler([FakeResponse(200)] * 2)
+        scheduler.request("GET", logic.API_ROOT + "search/text/")
+        scheduler.request("GET", "https://cdn.freesound.org/previews/1.mp3") # Not counted
+        self.assertEqual(session.request.call_count, 2)
+        self.assertAlmostEqual(scheduler.buckets[0].tokens, logic.API_RATE_PER_MINUTE - 1, delta=0.1)
+        with open(scheduler.state_path, "r", encoding="utf-8") as f:
+            state = json.load(f)
+        self.assertAlmostEqual(state["day"][0], logic.API_RATE_PER_DAY - 1, delta=0.1)
+        # A new process starts from the saved levels
+        self.assertAlmostEqual(logic.RequestScheduler(scheduler.state_path).buckets[1].tokens,
+                               logic.API_RATE_PER_DAY - 1, delta=0.1)
+
+    def test_throttled_request_is_retried_after_pause(self):
+        throttled = FakeResponse(429, {"Retry-After": "0"})
+        scheduler, session = self.make_scheduler([throttled, FakeResponse(200)])
+        response = scheduler.request("GET", logic.API_ROOT + "search/text/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(session.request.call_count, 2)
+        self.assertTrue(throttled.closed)
+
+    def test_long_retry_after_is_returned_and_pauses_the_api(self):
+        scheduler, session = self.make_scheduler([FakeResponse(429, {"Retry-After": "3600"})])
+        response = scheduler.request("GET", logic.API_ROOT + "search/text/")
+        self.assertEqual(response.status_code, 429)
+        self.assertGreater(scheduler.paused_until, time.time() + 3500)
+        with self.assertRaises(logic.requests.exceptions.RetryError):
+            scheduler.request("GET", logic.API_ROOT + "search/text/")
+        self.assertEqual(session.request.call_count, 1)
+
+    def test_retry_after_http_date(self):
+        from email.utils import formatdate
+        delay = logic.RequestScheduler._retry_after(FakeResponse(429, {"Retry-After": formatdate(time.time() + 10, usegmt=True)}))
+        self.assertAlmostEqual(delay, 10, delta=1.5)
+        self.assertIsNone(logic.RequestScheduler._retry_after(FakeResponse(429)))
+
+    def test_waiting_requests_are_granted_by_priority(self):
+        scheduler, _ = self.make_scheduler([])
+        scheduler.buckets[0] = logic.TokenBucket(1, 0.2, tokens=0) # One token every 200 ms
+        order = []
+        def acquire(priority):
+            scheduler._acquire(priority)
+            order.append(priority)
+        background = threading.Thread(target=acquire, args=(logic.PRIORITY_BACKGROUND,))
+        background.start()
+        time.sleep(0.05) # Queued first
+        interactive = threading.Thread(target=acquire, args=(logic.PRIORITY_INTERACTIVE,))
+        interactive.start()
+        background.join(5)
+        interactive.join(5)
+        self.assertEqual(order, [logic.PRIORITY_INTERACTIVE, logic.PRIORITY_BACKGROUND])
+
+    def test_rate_limited_search_does_not_fall_back_to_local_results(self):
+        self.patch(logic, "RESPONSE_CACHE_TTL", 0)
+        def api_request(*args, **kwargs):
+            raise logic.requests.exceptions.RetryError("Freesound rate limit reached, retry in 42 s.")
+        self.patch(logic, "api_request", api_request)
+        local_search = mock.Mock(return_value={"count": 1, "results": [{"id": 1}]})
+        self.patch(logic, "local_search", local_search)
+        result = logic.run_mode(["search", "key", "rain", "false", "0", "NONE", "any", "1", ""])
+        self.assertEqual(result, {"error": "Freesound rate limit reached, retry in 42 s.", "rate_limited": True})
+        local_search.assert_not_called()
+
+
+# --- SERIALIZER AND FIELD PROJECTION ---
+
+class SerializerTest(TempDirTestCase):
+    def test_same_text_as_the_reference_serializer(self):
+        import freesound_bench
+        rng = random.Random(7)
+        payloads = [freesound_bench.search_payload(rng, 25), freesound_bench.batch_payload(rng, 40),
+                    {"error": 'quote " backslash \\ newline \n tab \t bell \a nul \0', "none": None, "flag": False,
+                     "float": 0.1, "line separator": "\u2028"}]
+        for payload in payloads:
+            self.assertEqual(logic.python_to_lua(payload), freesound_bench.reference_python_to_lua(payload))
+
+    def test_write_result_to_file(self):
+        path = os.path.join(self.tmp, "result.lua")
+        logic.write_result({"status": "success", "count": 2}, path)
+        with open(path, "r", encoding="utf-8") as f:
+            self.assertEqual(f.read(), 'return {["status"] = "success", ["count"] = 2}')
+        self.assertEqual(os.listdir(self.tmp), ["result.lua"])
+
+
+class ProjectResultsTest(unittest.TestCase):
+    SOUND = {"id": 1, "name": "Rain", "license": "CC0", "tags": ["rain", "field"],
+             "previews": {"preview-hq-mp3": "hq.mp3", "preview-lq-mp3": "lq.mp3"}}
+
+    def test_parse_fields(self):
+        self.assertEqual(logic.parse_fields("id,name,previews.preview-hq-mp3"),
+                         {"id": None, "name": None, "previews": {"preview-hq-mp3": None}})
+
+    def test_parse_fields_ignores_blanks(self):
+        self.assertEqual(logic.parse_fields(" id , ,previews.preview-hq-mp3,"),
+                         {"id": None, "previews": {"preview-hq-mp3": None}})
+
+    def test_project_results_trims_sounds_only(self):
+        obj = {"count": 2, "next": None, "results": [self.SOUND, {"id": 2, "name": "Wind"}]}
+        projected = logic.project_results(obj, logic.parse_fields("id,previews.preview-hq-mp3"))
+        self.assertEqual(projected, {"count": 2, "next": None,
+                                     "results": [{"id": 1, "previews": {"preview-hq-mp3": "hq.mp3"}}, {"id": 2}]})
+        self.assertIn("preview-lq-mp3", self.SOUND["previews"]) # The input is left alone
+
+    def test_project_results_nested_pages(self):
+        # batch_search: one result page per query
+        obj = {"count": 2, "failed": 1, "searches": [{"query": "rain", "count": 1, "results": [self.SOUND], "next": None},
+                                                     {"query": "wind", "error": "API Error 500: oops"}]}
+        projected = logic.project_results(obj, logic.parse_fields("name"))
+        self.assertEqual(projected["searches"][0], {"query": "rain", "count": 1, "results": [{"name": "Rain"}], "next": None})
+        self.assertEqual(projected["searches"][1], obj["searches"][1])
+
+    def test_project_results_errors_pass_through(self):
+        error = {"error": "API Error 500: oops"}
+        self.assertEqual(logic.project_results(error, logic.parse_fields("id")), error)
+
+
+# --- STARTUP PROFILE ---
+
+LOGIC_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "Hosi_Freesound_Logic_Pro.py")
+
+
+class ProfileStartupTest(TempDirTestCase):
+    def test_report_shape(self):
+        # A mode that needs no network, in a throwaway home folder
+        env = dict(os.environ, HOME=self.tmp, USERPROFILE=self.tmp)
+        command = [sys.executable, LOGIC_SCRIPT, "--profile-startup", "local_search", "rain", "false", "0", "NONE", "any", "1", ""]
+        process = subprocess.run(command, env=env, capture_output=True, text=True, timeout=60)
+        self.assertEqual(process.returncode, 0, process.stderr)
+        self.assertTrue(process.stdout.startswith("return {"))
+        lines = [line for line in process.stderr.splitlines() if line.startswith("profile-startup ")]
+        self.assertEqual(len(lines), 1)
+        report = json.loads(lines[0][len("profile-startup "):])
+        self.assertEqual(set(report), {"mode", "daemon", "module_ms", "mode_imports_ms", "mode_ms", "output_ms", "total_ms", "modules"})
+        self.assertEqual((report["mode"], report["daemon"]), ("local_search", False))
+        for key in ("module_ms", "mode_imports_ms", "mode_ms", "output_ms"):
+            self.assertGreaterEqual(report[key], 0)
+            self.assertLessEqual(report[key], report["total_ms"])
+        self.assertIn("sqlite3", report["modules"])
+        self.assertNotIn("requests", report["modules"]) # The local index needs no HTTP
+
+    def test_no_report_without_the_option(self):
+        env = dict(os.environ, HOME=self.tmp, USERPROFILE=self.tmp)
+        command = [sys.executable, LOGIC_SCRIPT, "local_search", "rain", "false", "0", "NONE", "any", "1", ""]
+        process = subprocess.run(command, env=env, capture_output=True, text=True, timeout=60)
+        self.assertNotIn("profile-startup", process.stderr)
+
+
+# --- OAUTH2 TOKEN STORE ---
+
+class TokenStoreTest(TempDirTestCase):
+    def setUp(self):
+        super().setUp()
+        self.store = logic.TokenStore(path=os.path.join(self.tmp, "tokens.json"))
+        self.patch(logic, "_token_store", self.store)
+        self.refreshes = []
+        self.refresh_response = FakeResponse(body={"access_token": "new", "refresh_token": "r2", "expires_in": 3600})
+        self.patch(logic, "api_request", self.api_request)
+
+    def api_request(self, method, url, data=None, **kwargs):
+        self.refreshes.append(data)
+        return self.refresh_response
+
+    def test_save_and_get(self):
+        self.store.save("client", {"access_token": "a1", "refresh_token": "r1", "expires_in": 3600})
+        entry = self.store.get("client", "secret")
+        self.assertEqual((entry["access_token"], entry["refresh_token"]), ("a1", "r1"))
+        self.assertNotIn("refreshed", entry)
+        self.assertEqual(self.refreshes, [])
+        self.assertEqual(self.store.get("other client", "secret"), {"error": "Not logged in."})
+        if os.name == "posix":
+            self.assertEqual(os.stat(self.store.path).st_mode & 0o777, 0o600)
+
+    def test_save_without_refresh_token_keeps_the_stored_one(self):
+        self.store.save("client", {"access_token": "a1", "refresh_token": "r1"})
+        entry = self.store.save("client", {"access_token": "a2", "expires_in": 3600})
+        self.assertEqual((entry["access_token"], entry["refresh_token"]), ("a2", "r1"))
+        self.assertEqual(self.store.load()["refresh_token"], "r1")
+
+    def test_expired_token_is_refreshed(self):
+        self.store.save("client", {"access_token": "a1", "refresh_token": "r1", "expires_in": logic.TOKEN_REFRESH_MARGIN - 1})
+        entry = self.store.get("client", "secret")
+        self.assertEqual((entry["access_token"], entry["refresh_token"], entry["refreshed"]), ("new", "r2", True))
+        self.assertEqual(self.refreshes[0]["grant_type"], "refresh_token")
+        self.assertEqual(self.refreshes[0]["refresh_token"], "r1")
+        self.assertEqual(self.store.load()["access_token"], "new")
+
+    def test_refused_refresh_token_logs_out(self):
+        self.store.save("client", {"access_token": "a1", "refresh_token": "r1", "expires_in": 1})
+        self.refresh_response = FakeResponse(400, body={"error": "invalid_grant"})
+        self.assertEqual(self.store.get("client", "secret"), {"error": "Session expired. Please log in again."})
+        self.assertFalse(os.path.exists(self.store.path))
+
+    def test_401_refreshes_and_retries(self):
+        self.store.save("client", {"access_token": "a1", "refresh_token": "r1", "expires_in": 3600})
+        used = []
+        def call(token):
+            used.append(token)
+            return {"status_code": 401} if token == "a1" else {"username": "someone"}
+        result = logic.run_with_user_token(call, "a1", "client", "secret")
+        self.assertEqual(used, ["a1", "new"])
+        self.assertEqual(result, {"username": "someone", "tokens": {"access_token": "new", "refresh_token": "r2"}})
+
+    def test_authorization_code_exchange(self):
+        self.refresh_response = FakeResponse(body={"access_token": "a1", "expires_in": 3600}) # No refresh token
+        self.store.seed("client", "a0", "r0")
+        result = logic.get_access_token("client", "secret", "code")
+        self.assertEqual(result["tokens"]["refresh_token"], "r0")
+        self.refresh_response = FakeResponse(400, body={"error": "invalid_grant"})
+        self.assertEqual(logic.get_access_token("client", "secret", "code")["status_code"], 400)
+
+
+# --- LOCAL SOUND INDEX ---
+
+class SoundIndexTest(TempDirTestCase):
+    CC0 = "http://creativecommons.org/publicdomain/zero/1.0/"
+    BY = "https://creativecommons.org/licenses/by/4.0/"
+    SOUNDS = [
+        {"id": 1, "name": "Heavy rain", "tags": ["rain", "water"], "license": CC0, "duration": 5.0, "username": "a"},
+        {"id": 2, "name": "Rain on a roof", "tags": ["rain", "roof"], "license": BY, "duration": 30.0, "username": "b"},
+        {"id": 3, "name": "Wind", "tags": ["wind", "field-recording"], "license": CC0, "duration": 2.0, "username": "c"},
+    ]
+
+    def setUp(self):
+        super().setUp()
+        self.index = logic.SoundIndex(os.path.join(self.tmp, "library.db"))
+        self.addCleanup(self.index.db.close)
+        self.patch(logic, "_sound_index", self.index)
+        logic.index_sounds([dict(sound) for sound in self.SOUNDS])
+
+    def ids(self, *args, **kwargs):
+        result = logic.local_search(*args, **kwargs)
+        self.assertEqual(result["source"], "local")
+        return sorted(sound["id"] for sound in result["results"])
+
+    def test_words_and_prefixes(self):
+        self.assertEqual(self.ids("rain"), [1, 2])
+        self.assertEqual(self.ids("rai"), [1, 2])
+        self.assertEqual(self.ids("heavy rain"), [1])
+        self.assertEqual(self.ids('"roof'), [2]) # Quotes are plain text: they cannot break the MATCH syntax
+        self.assertEqual(self.ids(""), [1, 2, 3])
+
+    def test_filters(self):
+        self.assertEqual(self.ids("rain", cc0_only=True), [1])
+        self.assertEqual(self.ids("", max_duration=10.0), [1, 3])
+        self.assertEqual(self.ids("", tags="rain, roof"), [2])
+        self.assertEqual(self.ids("", tags="field"), []) # Whole tags only
+        self.assertEqual(self.ids("", tags="field-recording"), [3])
+
+    def test_update_keeps_the_local_path(self):
+        path = os.path.join(self.tmp, "Wind.wav")
+        with open(path, "wb") as f:
+            f.write(b"RIFF")
+        logic.index_sounds([dict(self.SOUNDS[2])], local_path=path)
+        logic.index_sounds([dict(self.SOUNDS[2], name="Strong wind")]) # Seen again in a search
+        (sound,) = logic.local_search("strong")["results"]
+        self.assertEqual((sound["id"], sound["local_path"]), (3, path))
+
+    def test_sort_and_pages(self):
+        result = logic.local_search("", sort_by="duration_desc")
+        self.assertEqual([sound["id"] for sound in result["results"]], [2, 1, 3])
+        first = self.index.search("", sort_by="duration_asc", page=1, page_size=2)
+        second = self.index.search("", sort_by="duration_asc", page=2, page_size=2)
+        self.assertEqual([s["id"] for s in first["results"] + second["results"]], [3, 1, 2])
+        self.assertEqual((first["next"], second["next"], second["previous"]), (2, None, 1))
+
+
+# --- AUDIO ANALYSIS ---
+
+@unittest.skipUnless(logic._analysis_modules(), "needs numpy and scipy")
+class LoudnessTest(unittest.TestCase):
+    def sine(self, samplerate, seconds=10.0, frequency=997.0):
+        np = logic._analysis_modules()[0]
+        return np.sin(2 * np.pi * frequency * np.arange(int(samplerate * seconds)) / samplerate)
+
+    def test_reference_sine(self):
+        # BS.1770-4: a 0 dBFS 997 Hz sine in one channel reads -3.01 LUFS
+        for samplerate in (48000, 44100):
+            analysis = logic.AudioAnalysis(samplerate, 1)
+            analysis.add(self.sine(samplerate))
+            result = analysis.result()
+            self.assertAlmostEqual(result["loudness"], -3.01, delta=0.01, msg=samplerate)
+            self.assertAlmostEqual(result["sample_peak"], 0.0, delta=0.01)
+
+    def test_reference_sine_in_one_channel_of_two(self):
+        np = logic._analysis_modules()[0]
+        sine = self.sine(48000)
+        analysis = logic.AudioAnalysis(48000, 2)
+        analysis.add(np.stack([sine, np.zeros_like(sine)], axis=1))
+        self.assertAlmostEqual(analysis.result()["loudness"], -3.01, delta=0.01)
+
+    def test_block_boundaries_do_not_matter(self):
+        sine = self.sine(48000, seconds=3.0) * 0.5
+        whole = logic.AudioAnalysis(48000, 1)
+        whole.add(sine)
+        pieces = logic.AudioAnalysis(48000, 1)
+        for start in range(0, len(sine), 12345):
+            pieces.add(sine[start:start + 12345])
+        self.assertEqual(whole.result(), pieces.result())
+
+    def test_silence(self):
+        np = logic._analysis_modules()[0]
+        analysis = logic.AudioAnalysis(48000, 1)
+        analysis.add(np.zeros(48000))
+        result = analysis.result()
+        self.assertIsNone(result["loudness"])
+        self.assertIsNone(result["true_peak"])
+
+
+if __name__ == "__main__":
+    unittest.main()